@@ -0,0 +1,163 @@
+import os
+import sys
+import csv
+import json
+import time
+import random
+import difflib
+import argparse
+import tempfile
+
+from docx2markdown_native import docx_to_markdown, UnsupportedDocxError
+from docx2markdown2 import pandoc_docx_to_markdown
+
+
+def sample_docx_files(index_csv, docx_folder, sample_size, seed=0):
+    """
+    从index_to_filename.csv中随机抽取存在的docx文件。
+
+    参数:
+    index_csv (str): 索引到文件名映射的CSV。
+    docx_folder (str): docx文件夹。
+    sample_size (int): 抽样数量。
+    seed (int): 随机种子。
+
+    返回:
+    docx_files (list): docx文件路径列表。
+    """
+    with open(index_csv, 'r', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        docx_files = [os.path.join(docx_folder, row['new_filename']) for row in reader]
+
+    docx_files = [docx_file for docx_file in docx_files if os.path.exists(docx_file)]
+    random.Random(seed).shuffle(docx_files)
+    return docx_files[:sample_size]
+
+
+def benchmark(docx_files, convert):
+    """
+    依次转换所有文件并计时。
+
+    参数:
+    docx_files (list): docx文件路径列表。
+    convert (callable): 转换函数，参数为 (docx_file, image_folder)。
+
+    返回:
+    result (dict): 文件数、成功数、不支持数、失败数、耗时和每秒文件数。
+    """
+    converted_count = 0
+    unsupported_count = 0
+    failed_count = 0
+
+    with tempfile.TemporaryDirectory() as image_folder:
+        start_time = time.perf_counter()
+        for docx_file in docx_files:
+            try:
+                convert(docx_file, image_folder)
+                converted_count += 1
+            except UnsupportedDocxError:
+                unsupported_count += 1
+            except Exception:
+                failed_count += 1
+        elapsed = time.perf_counter() - start_time
+
+    return {
+        "files": len(docx_files),
+        "converted": converted_count,
+        "unsupported": unsupported_count,
+        "failed": failed_count,
+        "seconds": elapsed,
+        "files_per_second": converted_count / elapsed if elapsed else 0.0,
+    }
+
+
+def markdown_lines(markdown):
+    """
+    比较时忽略行尾空白和结尾的空行。
+    """
+    return [line.rstrip() for line in markdown.rstrip().splitlines()]
+
+
+def compare_outputs(docx_file, image_folder):
+    """
+    分别用python-docx和pandoc转换同一个文件，返回两者的差异。
+
+    参数:
+    docx_file (str): docx文件路径。
+    image_folder (str): 图片保存目录，两种方式使用同一个目录，图片链接才能一致。
+
+    返回:
+    diff (list or None): unified diff的行，输出一致时为空列表；快速转换不支持这个文件时为None。
+    """
+    try:
+        native_output = docx_to_markdown(docx_file, image_folder)
+    except UnsupportedDocxError:
+        return None
+    pandoc_output = pandoc_docx_to_markdown(docx_file, image_folder)
+    return list(difflib.unified_diff(markdown_lines(pandoc_output), markdown_lines(native_output), "pandoc", "native", lineterm=""))
+
+
+def parity(docx_files, max_diff_lines=40):
+    """
+    检查快速转换的输出和pandoc是否一致，只比较快速转换支持的文件。
+
+    参数:
+    docx_files (list): docx文件路径列表。
+    max_diff_lines (int): 每个不一致的文件最多保留的diff行数。
+
+    返回:
+    result (dict): 文件数、比较数、一致数、不支持数、失败数，以及不一致的文件和diff。
+    """
+    result = {"files": len(docx_files), "compared": 0, "identical": 0, "unsupported": 0, "failed": 0, "different": []}
+    with tempfile.TemporaryDirectory() as image_folder:
+        for docx_file in docx_files:
+            try:
+                diff = compare_outputs(docx_file, image_folder)
+            except Exception:
+                result["failed"] += 1
+                continue
+            if diff is None:
+                result["unsupported"] += 1
+                continue
+            result["compared"] += 1
+            if diff:
+                result["different"].append({"file": docx_file, "diff": diff[:max_diff_lines]})
+            else:
+                result["identical"] += 1
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="比较python-docx快速转换和pandoc转换的速度，或者检查两者的输出是否一致")
+    parser.add_argument('--index_csv', default='data/index_to_filename.csv', type=str, help="索引到文件名映射的CSV")
+    parser.add_argument('--docx_dir', default='/www/dataset/MNBVC/docx_math', type=str, help="docx文件夹")
+    parser.add_argument('--sample', default=200, type=int, help="抽样文件数量")
+    parser.add_argument('--seed', default=0, type=int, help="随机种子")
+    parser.add_argument('--parity', action='store_true', help="不比较速度，检查快速转换的输出和pandoc是否一致，有不一致的文件时以非零状态退出")
+
+    args = parser.parse_args()
+
+    docx_files = sample_docx_files(args.index_csv, args.docx_dir, args.sample, args.seed)
+    if not docx_files:
+        raise ValueError('没有找到可以转换的docx文件')
+
+    if args.parity:
+        result = parity(docx_files)
+        for different in result["different"]:
+            print(different["file"])
+            print("\n".join(different["diff"]))
+        print(f"一致 {result['identical']}/{result['compared']} 个文件，"
+              f"不支持 {result['unsupported']}，失败 {result['failed']}")
+        print(json.dumps({key: value for key, value in result.items() if key != "different"}, ensure_ascii=False))
+        sys.exit(1 if result["different"] else 0)
+
+    results = {
+        "native": benchmark(docx_files, docx_to_markdown),
+        "pandoc": benchmark(docx_files, pandoc_docx_to_markdown),
+    }
+
+    for name, result in results.items():
+        print(f"{name}: {result['converted']}/{result['files']} 个文件，"
+              f"不支持 {result['unsupported']}，失败 {result['failed']}，"
+              f"{result['files_per_second']:.1f} 个文件/秒")
+    print(json.dumps(results, ensure_ascii=False))
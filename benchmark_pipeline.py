@@ -0,0 +1,311 @@
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import zipfile
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import importlib
+import subprocess
+import contextlib
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+from synthetic_corpus import generate_corpus
+
+
+STAGES = ["unzip", "convert_native", "convert_pandoc", "preprocess", "tokenize", "classify", "keywords", "split"]
+
+
+def read_markdown(corpus_dir):
+    file_paths = sorted(glob.glob(os.path.join(corpus_dir, "markdown", "*.md")), key=lambda path: int(os.path.basename(path)[:-3]))
+    texts = []
+    for file_path in file_paths:
+        with open(file_path, "r", encoding="utf-8") as file:
+            texts.append(file.read())
+    return file_paths, texts
+
+
+def text_bytes(texts):
+    return sum(len(text.encode("utf-8")) for text in texts)
+
+
+def bench_unzip(corpus_dir, work_dir):
+    import zip2
+    from synthetic_corpus import ZIP_FILENAME_ENCODING
+
+    zip_file_path = os.path.join(corpus_dir, "corpus.zip")
+    with zipfile.ZipFile(zip_file_path) as zf:
+        infos = [info for info in zf.infolist() if not info.is_dir()]
+
+    lock = threading.Lock()
+    start_time = time.perf_counter()
+    # 和pipeline.py的unzip阶段一样解码文件名
+    for info in infos:
+        zip2.decode_member_name(info, ZIP_FILENAME_ENCODING)
+    with zip2.ThreadLocalZipFile(zip_file_path) as zip_files, ThreadPoolExecutor(max_workers=5) as executor:
+        futures = [executor.submit(zip2.extract_member, zip_files, info, os.path.join(work_dir, f"{index}.docx"), lock)
+                   for index, info in enumerate(infos)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start_time
+    return len(infos), sum(info.file_size for info in infos), elapsed
+
+
+def bench_convert(corpus_dir, work_dir, convert):
+    # 计时包括所有尝试过的文件，速度也按所有文件计算，失败（包括快速转换不支持）的文件数单独返回，
+    # 这样native和pandoc、以及和之前的结果之间都可以直接比较
+    docx_files = sorted(glob.glob(os.path.join(corpus_dir, "docx", "*.docx")))
+    failed_count = 0
+    last_error = None
+    start_time = time.perf_counter()
+    for docx_file in docx_files:
+        try:
+            convert(docx_file, work_dir)
+        except Exception as error:
+            failed_count += 1
+            last_error = error
+    elapsed = time.perf_counter() - start_time
+    if failed_count == len(docx_files):
+        raise RuntimeError(f"所有文件都转换失败：{last_error!r}")
+    return len(docx_files), sum(os.path.getsize(docx_file) for docx_file in docx_files), elapsed, failed_count
+
+
+def bench_convert_native(corpus_dir, work_dir):
+    from docx2markdown_native import docx_to_markdown
+    return bench_convert(corpus_dir, work_dir, docx_to_markdown)
+
+
+def bench_convert_pandoc(corpus_dir, work_dir):
+    from docx2markdown2 import pandoc_docx_to_markdown
+    return bench_convert(corpus_dir, work_dir, pandoc_docx_to_markdown)
+
+
+def bench_preprocess(corpus_dir, work_dir):
+    from paper_markdown_text_classifier import one_text_pre_process
+
+    _, texts = read_markdown(corpus_dir)
+    start_time = time.perf_counter()
+    for text in texts:
+        one_text_pre_process(text)
+    elapsed = time.perf_counter() - start_time
+    return len(texts), text_bytes(texts), elapsed
+
+
+def bench_tokenize(corpus_dir, work_dir):
+    import jieba
+    from paper_markdown_text_classifier import one_text_pre_process, chinese_tokenizer
+
+    _, texts = read_markdown(corpus_dir)
+    texts = [one_text_pre_process(text) for text in texts]
+    # 不把词典加载的时间算进去
+    jieba.initialize()
+
+    start_time = time.perf_counter()
+    for text in texts:
+        chinese_tokenizer(text)
+    elapsed = time.perf_counter() - start_time
+    return len(texts), text_bytes(texts), elapsed
+
+
+def bench_classify(corpus_dir, work_dir):
+    import jieba
+    from paper_markdown_text_classifier import one_text_pre_process, predict_with_threshold
+    from hashing_classifier import make_model, partial_fit_model
+
+    with open(os.path.join(corpus_dir, "index.csv"), "r", encoding="utf-8") as file:
+        labels = [int(row["label"]) for row in csv.DictReader(file)]
+    _, texts = read_markdown(corpus_dir)
+    texts = [one_text_pre_process(text) for text in texts]
+    jieba.initialize()
+
+    # 离线运行，在合成语料上训练一个小模型，只计时预测部分（包括分词和特征提取）
+    model = partial_fit_model(make_model(n_features=2 ** 18), [(texts, labels)])
+
+    start_time = time.perf_counter()
+    predict_with_threshold(model, texts)
+    elapsed = time.perf_counter() - start_time
+    return len(texts), text_bytes(texts), elapsed
+
+
+def bench_keywords(corpus_dir, work_dir):
+    check_answers = importlib.import_module("判断是否有答案")
+
+    file_paths = sorted(glob.glob(os.path.join(corpus_dir, "markdown", "*.md")))
+    start_time = time.perf_counter()
+    for file_path in file_paths:
+        check_answers.check_keywords_in_file(file_path, check_answers.keywords)
+    elapsed = time.perf_counter() - start_time
+    return len(file_paths), sum(os.path.getsize(file_path) for file_path in file_paths), elapsed
+
+
+def bench_split(corpus_dir, work_dir):
+    split_papers = importlib.import_module("有答案试卷切分-对齐")
+
+    file_paths = sorted(glob.glob(os.path.join(corpus_dir, "markdown", "*.md")))
+    start_time = time.perf_counter()
+    for file_path in file_paths:
+        split_papers.process_file(file_path)
+    elapsed = time.perf_counter() - start_time
+    return len(file_paths), sum(os.path.getsize(file_path) for file_path in file_paths), elapsed
+
+
+BENCHMARKS = {
+    "unzip": bench_unzip,
+    "convert_native": bench_convert_native,
+    "convert_pandoc": bench_convert_pandoc,
+    "preprocess": bench_preprocess,
+    "tokenize": bench_tokenize,
+    "classify": bench_classify,
+    "keywords": bench_keywords,
+    "split": bench_split,
+}
+
+
+def peak_rss():
+    # VmHWM是当前进程自己的峰值内存；ru_maxrss在exec之后还会保留fork出来时父进程的值
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_in_child(stage, corpus_dir, queue):
+    # 在单独的进程中运行，峰值内存只包含这个阶段
+    try:
+        with tempfile.TemporaryDirectory() as work_dir, open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            measurement = BENCHMARKS[stage](corpus_dir, work_dir)
+        # (文件数, 字节数, 耗时)，转换阶段还有失败的文件数
+        files, total_bytes, elapsed = measurement[:3]
+        queue.put({
+            "files": files,
+            "failed": measurement[3] if len(measurement) > 3 else 0,
+            "bytes": total_bytes,
+            "seconds": elapsed,
+            "files_per_second": files / elapsed if elapsed else 0.0,
+            "mb_per_second": total_bytes / 1024 ** 2 / elapsed if elapsed else 0.0,
+            "peak_rss_mb": peak_rss() / 1024 ** 2,
+        })
+    except Exception as error:
+        queue.put({"error": f"{type(error).__name__}: {error}"})
+
+
+def run_benchmark(stage, corpus_dir):
+    """
+    在新进程（spawn）中运行一个阶段的性能测试。
+
+    参数:
+    stage (str): 阶段名称，见 STAGES。
+    corpus_dir (str): synthetic_corpus.py 生成的语料目录。
+
+    返回:
+    result (dict): files、failed、bytes、seconds、files_per_second、mb_per_second、peak_rss_mb，
+        速度按所有尝试过的文件计算，failed为其中失败的文件数；整个阶段失败时为 {"error": 错误信息}。
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=run_in_child, args=(stage, corpus_dir, queue))
+    process.start()
+    try:
+        result = queue.get()
+    finally:
+        process.join()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results, baseline, tolerance=0.2):
+    """
+    和之前保存的结果比较，找出变慢或者内存占用变大的阶段。
+
+    参数:
+    results (dict): 本次的结果。
+    baseline (dict): 之前的结果。
+    tolerance (float): 允许的相对变化。
+
+    返回:
+    regressions (list): 描述每个退化的字符串。
+    """
+    regressions = []
+    for stage, result in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous or "error" in previous or "error" in result:
+            continue
+        if result["files_per_second"] < previous["files_per_second"] * (1 - tolerance):
+            regressions.append(f"{stage}: {previous['files_per_second']:.1f} -> {result['files_per_second']:.1f} 个文件/秒")
+        if result["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{stage}: 峰值内存 {previous['peak_rss_mb']:.1f} -> {result['peak_rss_mb']:.1f} MB")
+        if result.get("failed", 0) > previous.get("failed", 0):
+            regressions.append(f"{stage}: 失败 {previous.get('failed', 0)} -> {result['failed']} 个文件")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在合成语料上测试每个阶段的速度和内存，不需要联网")
+    parser.add_argument('--corpus_dir', default=None, type=str, help="synthetic_corpus.py生成的语料目录，默认在临时目录中生成")
+    parser.add_argument('--files', default=200, type=int, help="生成语料时的文件数量")
+    parser.add_argument('--seed', default=0, type=int, help="生成语料时的随机种子")
+    parser.add_argument('--stages', default=",".join(STAGES), type=str, help="要测试的阶段，用逗号分隔")
+    parser.add_argument('--output', default=None, type=str, help="把结果保存为json")
+    parser.add_argument('--baseline', default=None, type=str, help="之前保存的结果，用于比较")
+    parser.add_argument('--tolerance', default=0.2, type=float, help="和baseline比较时允许的相对变化")
+
+    args = parser.parse_args()
+
+    stages = [stage for stage in args.stages.split(",") if stage]
+    unknown_stages = set(stages) - set(STAGES)
+    if unknown_stages:
+        raise ValueError(f"未知的阶段：{', '.join(sorted(unknown_stages))}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus_dir = args.corpus_dir or temp_dir
+        if not os.path.exists(os.path.join(corpus_dir, "index.csv")):
+            generate_corpus(corpus_dir, files=args.files, seed=args.seed)
+        with open(os.path.join(corpus_dir, "corpus.json"), "r", encoding="utf-8") as file:
+            corpus = json.load(file)
+
+        results = {
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "corpus": corpus,
+            "stages": {},
+        }
+        for stage in stages:
+            result = run_benchmark(stage, corpus_dir)
+            results["stages"][stage] = result
+            if "error" in result:
+                print(f"{stage}: 失败 {result['error']}", file=sys.stderr)
+            else:
+                print(f"{stage}: {result['files_per_second']:.1f} 个文件/秒，{result['mb_per_second']:.2f} MB/秒，"
+                      f"失败 {result['failed']}/{result['files']}，峰值内存 {result['peak_rss_mb']:.1f} MB", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False))
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            regressions = compare_results(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"性能退化 {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
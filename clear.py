@@ -1,10 +1,11 @@
 import os
 import docx
-import docx2txt
+from docx_record import load_record
 
 def read_document(file_path, file_extension):
     if file_extension == ".docx":
-        text = docx2txt.process(file_path)
+        # 和docx2txt一样包括页眉、页脚、表格和文本框中的文字
+        text = "\n".join(paragraph["text"] for paragraph in load_record(file_path)["paragraphs"])
     elif file_extension == ".doc":
         doc = docx.Document(file_path)
         text = "\n".join([para.text for para in doc.paragraphs])
@@ -23,5 +24,6 @@ def process_directory(directory_path):
             else:
                 print(f"Skipping unsupported file format: {file_path}")
 
-directory_path = "/www/dataset/MNBVC/docx_math"
-process_directory(directory_path)
+if __name__ == "__main__":
+    directory_path = "/www/dataset/MNBVC/docx_math"
+    process_directory(directory_path)
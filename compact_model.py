@@ -0,0 +1,206 @@
+import os
+import glob
+import json
+import hashlib
+import argparse
+
+import numpy as np
+
+# 导出时反序列化模型需要 __main__.chinese_tokenizer（模型在notebook中训练，分词函数按 __main__ 中的名字保存）
+from paper_markdown_text_classifier import chinese_tokenizer, one_text_pre_process
+
+
+HASHES_FILE = "hashes.npy"
+COEF_FILE = "coef.npy"
+META_FILE = "meta.json"
+
+
+def term_hash(term):
+    """
+    计算n-gram的64位哈希值。
+
+    参数:
+    term (str): n-gram，多个词之间用空格连接，和CountVectorizer的词表一致。
+
+    返回:
+    hash (int): 64位哈希值。
+    """
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def word_ngrams(tokens, min_n, max_n):
+    """
+    生成n-gram，和CountVectorizer(analyzer='word')的结果相同。
+
+    参数:
+    tokens (list): 分词结果。
+    min_n (int): 最小n。
+    max_n (int): 最大n。
+
+    返回:
+    generator: n-gram字符串。
+    """
+    if max_n == 1:
+        yield from tokens
+        return
+
+    if min_n == 1:
+        yield from tokens
+        min_n = 2
+
+    token_count = len(tokens)
+    for n in range(min_n, min(max_n + 1, token_count + 1)):
+        for i in range(token_count - n + 1):
+            yield " ".join(tokens[i:i + n])
+
+
+def export_model(model, output_dir):
+    """
+    把CountVectorizer + LogisticRegression的pipeline导出为紧凑格式：
+    按哈希值排序的词表哈希数组、对应的系数数组（都可以用mmap读取）和一个记录参数的json。
+
+    参数:
+    model (sklearn.pipeline.Pipeline): 训练好的模型。
+    output_dir (str): 输出目录。
+    """
+    vectorizer = model.steps[0][1]
+    classifier = model.steps[-1][1]
+
+    if vectorizer.analyzer != "word" or vectorizer.stop_words is not None or vectorizer.strip_accents is not None:
+        raise ValueError('只支持analyzer="word"并且没有stop_words和strip_accents的CountVectorizer')
+    if vectorizer.preprocessor is not None:
+        raise ValueError('不支持自定义preprocessor')
+    if len(classifier.classes_) != 2:
+        raise ValueError('只支持二分类模型')
+
+    terms = list(vectorizer.vocabulary_.keys())
+    columns = np.fromiter(vectorizer.vocabulary_.values(), dtype=np.int64, count=len(terms))
+    hashes = np.fromiter((term_hash(term) for term in terms), dtype=np.uint64, count=len(terms))
+
+    order = np.argsort(hashes, kind="stable")
+    hashes = hashes[order]
+    if np.any(hashes[1:] == hashes[:-1]):
+        raise ValueError('词表中存在哈希冲突')
+    coef = np.ascontiguousarray(classifier.coef_[0][columns[order]], dtype=np.float64)
+
+    # 和LogisticRegression.predict_proba一致：二分类默认用sigmoid，multinomial时相当于sigmoid(2 * decision)
+    multinomial = getattr(classifier, "multi_class", "auto") == "multinomial" and classifier.solver != "liblinear"
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, HASHES_FILE), hashes)
+    np.save(os.path.join(output_dir, COEF_FILE), coef)
+    with open(os.path.join(output_dir, META_FILE), "w", encoding="utf-8") as file:
+        json.dump({
+            "intercept": float(classifier.intercept_[0]),
+            "ngram_range": list(vectorizer.ngram_range),
+            "lowercase": bool(vectorizer.lowercase),
+            "binary": bool(vectorizer.binary),
+            "multinomial": bool(multinomial),
+            "classes": [int(label) for label in classifier.classes_],
+        }, file)
+
+
+class CompactTextClassifier:
+    """
+    紧凑格式的文本分类模型。词表和系数通过mmap只读加载，多个进程共享同一份物理内存，加载时间和模型大小无关。
+
+    predict_proba的结果和原来的pipeline一致，可以直接传给predict_with_threshold。
+    """
+
+    def __init__(self, model_dir, tokenizer=chinese_tokenizer):
+        """
+        参数:
+        model_dir (str): export_model的输出目录。
+        tokenizer (callable): 分词函数，默认为chinese_tokenizer。
+        """
+        with open(os.path.join(model_dir, META_FILE), "r", encoding="utf-8") as file:
+            meta = json.load(file)
+
+        self.hashes = np.load(os.path.join(model_dir, HASHES_FILE), mmap_mode="r")
+        self.coef = np.load(os.path.join(model_dir, COEF_FILE), mmap_mode="r")
+        self.intercept = meta["intercept"]
+        self.ngram_range = tuple(meta["ngram_range"])
+        self.lowercase = meta["lowercase"]
+        self.binary = meta["binary"]
+        self.multinomial = meta["multinomial"]
+        self.classes_ = np.array(meta["classes"])
+        self.tokenizer = tokenizer
+
+    def decision_function(self, texts):
+        """
+        计算每个文本的线性得分。
+
+        参数:
+        texts (list): 文本列表。
+
+        返回:
+        scores (np.ndarray): 得分。
+        """
+        scores = np.empty(len(texts), dtype=np.float64)
+        for index, text in enumerate(texts):
+            if self.lowercase:
+                text = text.lower()
+            tokens = self.tokenizer(text)
+            term_hashes = np.fromiter((term_hash(term) for term in word_ngrams(tokens, *self.ngram_range)), dtype=np.uint64)
+
+            positions = np.searchsorted(self.hashes, term_hashes)
+            positions[positions == len(self.hashes)] = 0
+            positions = positions[self.hashes[positions] == term_hashes]
+            if self.binary:
+                positions = np.unique(positions)
+            else:
+                positions = np.sort(positions)
+
+            scores[index] = self.coef[positions].sum() + self.intercept
+        return scores
+
+    def predict_proba(self, texts):
+        """
+        计算每个文本属于每个类别的概率。
+
+        参数:
+        texts (list): 文本列表。
+
+        返回:
+        probabilities (np.ndarray): 形状为 (文本数, 2) 的概率。
+        """
+        scores = self.decision_function(texts)
+        if self.multinomial:
+            scores = scores * 2
+        positive = 1.0 / (1.0 + np.exp(-scores))
+        return np.vstack([1 - positive, positive]).T
+
+
+def check_scores(model, compact_model, texts):
+    """
+    比较原模型和紧凑模型的predict_proba。
+
+    返回:
+    max_difference (float): 正类概率的最大绝对误差。
+    """
+    expected = model.predict_proba(texts)[:, 1]
+    actual = compact_model.predict_proba(texts)[:, 1]
+    return float(np.max(np.abs(expected - actual))) if len(texts) else 0.0
+
+
+if __name__ == "__main__":
+    import joblib
+
+    parser = argparse.ArgumentParser(description="把joblib保存的TextClassifier导出为可以mmap加载的紧凑格式")
+    parser.add_argument('--model', default="TextClassifier.pkl", type=str, help="joblib保存的模型")
+    parser.add_argument('--output_dir', default="TextClassifier-compact", type=str, help="输出目录")
+    parser.add_argument('--check_dir', default=None, type=str, help="用这个目录下的markdown文件比较两个模型的得分")
+
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    export_model(model, args.output_dir)
+    print(f"导出完成：{args.output_dir}")
+
+    if args.check_dir:
+        texts = []
+        for file_path in sorted(glob.glob(os.path.join(args.check_dir, "*.md"))):
+            with open(file_path, "r", encoding="utf-8") as file:
+                texts.append(one_text_pre_process(file.read()))
+        difference = check_scores(model, CompactTextClassifier(args.output_dir), texts)
+        print(f"{len(texts)} 个文件，正类概率最大误差 {difference:.3e}")
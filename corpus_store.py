@@ -0,0 +1,242 @@
+import os
+import sys
+import csv
+import glob
+import json
+import argparse
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from paper_markdown_text_classifier import one_text_pre_process, detect_language
+
+
+# 语料库的列：
+# id: 文件标识（例如 12.docx），original_filename: zip中的原始文件名，markdown: 转换得到的markdown，
+# text: one_text_pre_process预处理后的文本，language: detect_language的结果，score: 分类模型的试卷概率，
+# is_paper: 文件名中是否含有试卷关键字，has_answers: 是否含有答案，label: 训练数据的标签（1为试卷，0为其他）
+# 没有的值为null
+SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("original_filename", pa.string()),
+    ("markdown", pa.large_string()),
+    ("text", pa.large_string()),
+    ("language", pa.string()),
+    ("score", pa.float32()),
+    ("is_paper", pa.bool_()),
+    ("has_answers", pa.bool_()),
+    ("label", pa.int8()),
+])
+
+COLUMNS = SCHEMA.names
+
+
+def make_row(id, markdown, original_filename=None, score=None, is_paper=None, has_answers=None, label=None):
+    """
+    由markdown生成一行，预处理和语言检测只在写入时做一次。
+    """
+    # 在预处理后的文字上检测语言，图片链接等markdown标记不影响结果
+    text = one_text_pre_process(markdown)
+    return {
+        "id": id,
+        "original_filename": original_filename,
+        "markdown": markdown,
+        "text": text,
+        "language": detect_language(text),
+        "score": score,
+        "is_paper": is_paper,
+        "has_answers": has_answers,
+        "label": label,
+    }
+
+
+class CorpusWriter:
+    """
+    把行按row group写入Parquet语料库，内存中最多只有一个row group。
+
+    先写 path.tmp，close时再替换为path，写入中断时不会留下不完整的语料库。
+    """
+
+    def __init__(self, path, row_group_size=1000, compression="zstd"):
+        """
+        参数:
+        path (str): 语料库文件路径。
+        row_group_size (int): 每个row group的行数。
+        compression (str): 压缩方式，默认为zstd。
+        """
+        self.path = path
+        self.row_group_size = row_group_size
+        self.rows = []
+        self.count = 0
+        self.writer = pq.ParquetWriter(path + ".tmp", SCHEMA, compression=compression)
+
+    def write(self, row):
+        """
+        写入一行，缺少的列为null。
+        """
+        self.rows.append(row)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(pa.Table.from_pylist(self.rows, schema=SCHEMA), row_group_size=self.row_group_size)
+            self.count += len(self.rows)
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.writer.close()
+            os.remove(self.path + ".tmp")
+        return False
+
+
+def read_corpus(path, columns=None, filters=None):
+    """
+    用内存映射读取语料库中需要的列。
+
+    参数:
+    path (str): 语料库文件路径。
+    columns (list): 需要读取的列，默认为所有列。
+    filters: pyarrow.parquet.read_table的过滤条件，例如 [("is_paper", "=", True)]。
+
+    返回:
+    table (pyarrow.Table): 读取的表。
+    """
+    return pq.read_table(path, columns=columns, filters=filters, memory_map=True)
+
+
+def iter_corpus(path, columns=None, batch_size=1000):
+    """
+    按批顺序读取语料库，逐行返回字典，内存中只有一批数据。
+
+    参数:
+    path (str): 语料库文件路径。
+    columns (list): 需要读取的列，默认为所有列。
+    batch_size (int): 每批的行数。
+
+    返回:
+    generator: 每行的字典。
+    """
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        yield from batch.to_pylist()
+
+
+def read_keys(csv_file):
+    """
+    读取CSV中所有行的第二列（new_filename），文件不存在时返回空集合。
+    """
+    if not os.path.exists(csv_file):
+        return set()
+    with open(csv_file, "r", encoding="utf-8") as file:
+        return {row[1] for row in csv.reader(file) if len(row) > 1}
+
+
+def read_scores(scores_file):
+    """
+    读取paper_markdown_text_classifier.py服务模式输出的JSON lines（每行 {"results": [{"file", "score", ...}]}），
+    返回 文件名 -> 概率，出错的请求跳过。
+    """
+    scores = {}
+    with open(scores_file, "r", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            for result in record.get("results", []):
+                scores[os.path.basename(result["file"])] = result["score"]
+    return scores
+
+
+def iter_pipeline_rows(index_csv, markdown_dir, work_dir, scores_file=None):
+    """
+    按index_to_filename.csv的顺序读取pipeline.py的结果：markdown文件、rows_with_keywords.csv和rows_with_answers.csv，
+    没有转换成markdown的文件跳过。
+
+    返回:
+    generator: 语料库的行。
+    """
+    papers = read_keys(os.path.join(work_dir, "rows_with_keywords.csv"))
+    with_answers = read_keys(os.path.join(work_dir, "rows_with_answers.csv"))
+    without_answers = read_keys(os.path.join(work_dir, "rows_without_answers.csv"))
+    scores = read_scores(scores_file) if scores_file else {}
+
+    with open(index_csv, "r", encoding="utf-8") as file:
+        for row in csv.reader(file):
+            if len(row) < 2 or row == ["original_filename", "new_filename"]:
+                continue
+            original_filename, key = row[0], row[1]
+            markdown_path = os.path.join(markdown_dir, key.replace(".docx", ".md"))
+            if not os.path.exists(markdown_path):
+                continue
+            with open(markdown_path, "r", encoding="utf-8") as markdown_file:
+                markdown = markdown_file.read()
+
+            # 只有判断过是否有答案的文件（关键字过滤后的试卷）才有这一列
+            has_answers = None
+            if key in with_answers:
+                has_answers = True
+            elif key in without_answers:
+                has_answers = False
+            yield make_row(key, markdown, original_filename, score=scores.get(key), is_paper=key in papers, has_answers=has_answers)
+
+
+def iter_labeled_rows(positive_dir, negative_dir):
+    """
+    读取两个目录下的markdown作为训练数据，试卷的标签为1，其他为0。
+
+    返回:
+    generator: 语料库的行。
+    """
+    for directory, label in ((positive_dir, 1), (negative_dir, 0)):
+        for markdown_path in sorted(glob.glob(os.path.join(directory, "*.md"))):
+            with open(markdown_path, "r", encoding="utf-8") as file:
+                yield make_row(os.path.basename(markdown_path), file.read(), label=label)
+
+
+def write_corpus(path, rows, row_group_size=1000):
+    """
+    把行写入语料库。
+
+    返回:
+    count (int): 写入的行数。
+    """
+    with CorpusWriter(path, row_group_size) as writer:
+        for row in rows:
+            writer.write(row)
+    return writer.count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把markdown和各阶段的结果写入一个Parquet语料库，后续按列读取")
+    parser.add_argument('--output', required=True, type=str, help="语料库文件路径，例如 corpus.parquet")
+    parser.add_argument('--index_csv', default=None, type=str, help="index_to_filename.csv，从pipeline.py的结果生成")
+    parser.add_argument('--markdown_dir', default='/www/dataset/MNBVC/clear_data', type=str, help="markdown文件夹")
+    parser.add_argument('--work_dir', default='.', type=str, help="pipeline.py的work_dir（rows_with_keywords.csv等所在的目录）")
+    parser.add_argument('--scores', default=None, type=str, help="分类模型服务模式（--serve）输出的预测结果")
+    parser.add_argument('--positive_dir', default=None, type=str, help="试卷的markdown目录，和--negative_dir一起生成训练数据")
+    parser.add_argument('--negative_dir', default=None, type=str, help="其他文档的markdown目录")
+    parser.add_argument('--row_group_size', default=1000, type=int, help="每个row group的行数")
+
+    args = parser.parse_args()
+
+    if args.positive_dir and args.negative_dir:
+        rows = iter_labeled_rows(args.positive_dir, args.negative_dir)
+    elif args.index_csv:
+        rows = iter_pipeline_rows(args.index_csv, args.markdown_dir, args.work_dir, args.scores)
+    else:
+        parser.error('需要--index_csv，或者--positive_dir和--negative_dir')
+
+    count = write_corpus(args.output, rows, args.row_group_size)
+    print(f"写入 {count} 行到 {args.output}", file=sys.stderr)
@@ -1,59 +1,267 @@
 import os
+import json
+import argparse
+import time
+import threading
+import shutil
+import subprocess
 import concurrent.futures
+from contextlib import contextmanager
 import pypandoc
+from docx2markdown_native import docx_to_markdown, UnsupportedDocxError
+from media_store import MediaStore
+from docx_record import DocxRecordCache
+from profiling import profiler, add_profile_arguments, profile_from_args
+
+# 估计一个pandoc进程占用的内存：基础内存加上docx文件大小的若干倍
+PANDOC_BASE_MEMORY = 256 * 1024 ** 2
+PANDOC_MEMORY_PER_DOCX_BYTE = 40
+
+# 单个文件的默认超时时间（秒），超时后杀掉pandoc进程
+DEFAULT_TIMEOUT = 600
+
+def available_memory():
+    # 优先读取 /proc/meminfo 中的 MemAvailable，其他系统退回到空闲物理内存
+    try:
+        with open('/proc/meminfo', 'r') as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+class PandocScheduler:
+    """
+    限制同时运行的pandoc进程数量和它们预计占用的内存总量。
+
+    进程数量不超过CPU核数，内存预算默认为当前可用内存的80%。每个任务按docx大小估计内存，
+    预算不够时等待其他pandoc结束；只有一个任务在运行时总是放行，避免超大文件永远等待。
+    """
+    def __init__(self, max_processes=None, memory_budget=None):
+        self.max_processes = max_processes or os.cpu_count() or 1
+        if memory_budget is None:
+            memory = available_memory()
+            memory_budget = int(memory * 0.8) if memory else self.max_processes * PANDOC_BASE_MEMORY
+        self.memory_budget = memory_budget
+        self.condition = threading.Condition()
+        self.running = 0
+        self.waiting = 0
+        self.reserved_memory = 0
+
+    def estimate_memory(self, docx_size):
+        return PANDOC_BASE_MEMORY + docx_size * PANDOC_MEMORY_PER_DOCX_BYTE
+
+    @contextmanager
+    def slot(self, docx_size):
+        memory = self.estimate_memory(docx_size)
+        with self.condition:
+            self.waiting += 1
+            profiler.gauge("pandoc_waiting", self.waiting)
+            self.condition.wait_for(lambda: self.running == 0 or (
+                self.running < self.max_processes and self.reserved_memory + memory <= self.memory_budget))
+            self.waiting -= 1
+            self.running += 1
+            self.reserved_memory += memory
+            profiler.gauge("pandoc_waiting", self.waiting)
+            profiler.gauge("pandoc_running", self.running)
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.running -= 1
+                self.reserved_memory -= memory
+                profiler.gauge("pandoc_running", self.running)
+                self.condition.notify_all()
+
+class ThroughputReporter:
+    """
+    定期输出一行JSON格式的转换进度：已处理数、失败数、正在转换的文件数、文件/秒、MB/秒和预计剩余时间。
+    """
+    def __init__(self, total_files, total_bytes, interval=10):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.last_report_time = self.start_time
+        self.completed_files = 0
+        self.completed_bytes = 0
+        self.failed_files = []
+        self.in_flight = 0
+
+    def started(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def finished(self, docx_file, size, error=None):
+        with self.lock:
+            self.in_flight -= 1
+            self.completed_files += 1
+            self.completed_bytes += size
+            if error is not None:
+                self.failed_files.append((docx_file, error))
+            if time.time() - self.last_report_time >= self.interval:
+                self.report()
+
+    def snapshot(self):
+        elapsed = time.time() - self.start_time
+        files_per_second = self.completed_files / elapsed if elapsed else 0.0
+        remaining_files = self.total_files - self.completed_files
+        return {
+            "processed": self.completed_files,
+            "total": self.total_files,
+            "failed": len(self.failed_files),
+            "in_flight": self.in_flight,
+            "elapsed_seconds": round(elapsed, 1),
+            "files_per_second": round(files_per_second, 2),
+            "mb_per_second": round(self.completed_bytes / 1024 ** 2 / elapsed, 2) if elapsed else 0.0,
+            "eta_seconds": round(remaining_files / files_per_second, 1) if files_per_second else None,
+        }
+
+    def report(self, final=False):
+        self.last_report_time = time.time()
+        record = {"stage": "docx2markdown", "final": final}
+        record.update(self.snapshot())
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+
+def pandoc_docx_to_markdown(docx_file, image_folder, timeout=None, media_store=None):
+    # 配置Pandoc选项，将图片保存到指定的文件夹中
+    pandoc_options = [
+        f"--extract-media={image_folder}",
+        "--wrap=none",
+    ]
+
+    # 使用图片存储时，pandoc先把图片解压到单独的临时目录，避免不同文件的media/imageN.png互相覆盖
+    if media_store is not None:
+        extract_directory = media_store.extract_directory()
+        pandoc_options[0] = f"--extract-media={extract_directory}"
 
-def convert_docx_to_markdown(docx_file, markdown_folder, image_folder):
     try:
-        # 构建Markdown文件名
-        docx_filename = os.path.basename(docx_file)
-        markdown_filename = os.path.splitext(docx_filename)[0] + ".md"
-        markdown_file = os.path.join(markdown_folder, markdown_filename)
+        # 直接启动pandoc进程，超时后subprocess会杀掉它
+        command = [pypandoc.get_pandoc_path(), docx_file, '-f', 'docx', '-t', 'markdown'] + pandoc_options
+        with profiler.timer("pandoc", docx_file):
+            result = subprocess.run(command, capture_output=True, timeout=timeout)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.decode('utf-8', errors='replace').strip())
+        output = result.stdout.decode('utf-8')
+    except:
+        if media_store is not None:
+            shutil.rmtree(extract_directory, ignore_errors=True)
+        raise
 
-        # 创建图片文件夹
-        os.makedirs(image_folder, exist_ok=True)
+    if media_store is not None:
+        output = media_store.import_directory(extract_directory, output)
+    return output
 
-        # 配置Pandoc选项，将图片保存到指定的文件夹中
-        pandoc_options = [
-            f"--extract-media={image_folder}",
-            "--wrap=none",
-        ]
+def convert_docx_to_markdown(docx_file, markdown_folder, image_folder, native=False, scheduler=None, timeout=DEFAULT_TIMEOUT, record_cache=None):
+    # 转换失败时抛出异常，由调用方记录
+    # native: 先尝试python-docx快速转换，默认关闭，和pandoc的输出一致性用 benchmark_docx2markdown.py --parity 检查
+    # record_cache: DocxRecordCache，记录中已经知道含有不支持的内容时不再尝试python-docx，直接交给pandoc；
+    # 记录中没有格式和图片位置，可以快速转换的文档仍由python-docx再解析一次。记录同时留给后面的分类使用
+    # 构建Markdown文件名
+    docx_filename = os.path.basename(docx_file)
+    markdown_filename = os.path.splitext(docx_filename)[0] + ".md"
+    markdown_file = os.path.join(markdown_folder, markdown_filename)
 
-        # 使用pypandoc将.docx文件转换为Markdown，并使用外部图片链接
-        output = pypandoc.convert_file(docx_file, 'md', extra_args=pandoc_options)
+    # 创建图片文件夹，图片按内容哈希保存，相同的图片只保存一次
+    os.makedirs(image_folder, exist_ok=True)
+    media_store = MediaStore(image_folder)
 
-        # 将转换后的Markdown写入.md文件
-        with open(markdown_file, 'w', encoding='utf-8') as file:
-            file.write(output)
+    if native and record_cache is not None:
+        try:
+            record = record_cache.get_or_extract(docx_file)
+            native = not record["unsupported"] and not any(paragraph["table"] for paragraph in record["paragraphs"] if paragraph["part"] == "document")
+        except Exception:
+            pass
 
-        print(f"转换完成：{docx_file} -> {markdown_file}")
+    output = None
+    if native:
+        # 先在进程内直接转换，含有公式、OLE对象等不支持的内容时再交给pandoc
+        try:
+            with profiler.timer("python-docx", docx_file):
+                try:
+                    output = docx_to_markdown(docx_file, image_folder, media_store)
+                except UnsupportedDocxError:
+                    pass
+        except Exception:
+            # python-docx解析失败的文件pandoc有时也能转换，错误以pandoc的为准
+            pass
 
-    except Exception as e:
-        print(f"转换错误：{docx_file} -> {e}")
+    if output is None:
+        if scheduler is None:
+            output = pandoc_docx_to_markdown(docx_file, image_folder, timeout, media_store)
+        else:
+            with scheduler.slot(os.path.getsize(docx_file)):
+                output = pandoc_docx_to_markdown(docx_file, image_folder, timeout, media_store)
 
-def convert_docx_folder(docx_folder, markdown_folder, image_folder):
-    # 获取.docx文件列表
+    # 将转换后的Markdown写入.md文件
+    with open(markdown_file, 'w', encoding='utf-8') as file:
+        file.write(output)
+
+    return markdown_file
+
+def convert_docx_folder(docx_folder, markdown_folder, image_folder, native=False, max_processes=None, timeout=DEFAULT_TIMEOUT, report_interval=10, record_cache=None):
+    # 获取.docx文件列表，按文件大小从大到小排序，大文件先开始，减少最后等待单个大文件的时间
     docx_files = [file for file in os.listdir(docx_folder) if file.endswith(".docx")]
+    docx_sizes = {file: os.path.getsize(os.path.join(docx_folder, file)) for file in docx_files}
+    docx_files.sort(key=lambda file: docx_sizes[file], reverse=True)
+
+    os.makedirs(markdown_folder, exist_ok=True)
+    scheduler = PandocScheduler(max_processes)
+    reporter = ThroughputReporter(len(docx_files), sum(docx_sizes.values()), report_interval)
 
-    total_files = len(docx_files)
-    completed_files = 0
+    def convert(docx_path, size):
+        reporter.started()
+        try:
+            convert_docx_to_markdown(docx_path, markdown_folder, image_folder, native, scheduler, timeout, record_cache)
+        except subprocess.TimeoutExpired:
+            reporter.finished(docx_path, size, f"超时（{timeout}秒）")
+        except Exception as e:
+            reporter.finished(docx_path, size, str(e))
+        else:
+            reporter.finished(docx_path, size)
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
+    # 线程数等于pandoc进程上限，线程在整个转换过程中复用
+    with concurrent.futures.ThreadPoolExecutor(max_workers=scheduler.max_processes) as executor:
         # 提交任务给线程池进行并行处理
         futures = []
         for docx_file in docx_files:
             docx_path = os.path.join(docx_folder, docx_file)
-            future = executor.submit(convert_docx_to_markdown, docx_path, markdown_folder, image_folder)
-            futures.append(future)
+            futures.append(executor.submit(convert, docx_path, docx_sizes[docx_file]))
 
-        # 获取任务的进度
         for future in concurrent.futures.as_completed(futures):
-            completed_files += 1
-            print(f"进度：{completed_files}/{total_files}")
+            future.result()
+
+    reporter.report(final=True)
+    for docx_file, error in reporter.failed_files:
+        print(f"转换错误：{docx_file} -> {error}")
+
+    return reporter.failed_files
 
-# 调用函数进行转换
+if __name__ == "__main__":
+    # 调用函数进行转换
+    parser = argparse.ArgumentParser(description="把docx文件夹转换为markdown")
+    parser.add_argument('--docx_dir', default='/www/dataset/MNBVC/docx_math', type=str, help="docx文件夹")
+    parser.add_argument('--markdown_dir', default='/www/dataset/MNBVC/clear_data', type=str, help="存放.md文件的文件夹路径")
+    parser.add_argument('--image_dir', default='/www/dataset/MNBVC/image_folder', type=str, help="图片文件夹")
+    parser.add_argument('--record_cache', default=None, type=str, help="docx中间记录的缓存目录，和分类共用，默认不缓存")
+    parser.add_argument('--max_processes', default=None, type=int, help="同时运行的pandoc进程数量上限，默认为CPU核数")
+    parser.add_argument('--timeout', default=DEFAULT_TIMEOUT, type=int, help="单个文件pandoc转换的超时时间（秒）")
+    parser.add_argument('--native', action='store_true', help="先用python-docx快速转换只含文字和图片的文档，不支持的再交给pandoc，默认只用pandoc")
+    add_profile_arguments(parser)
 
-docx_folder = r'/www/dataset/MNBVC/docx_math' 
-markdown_folder = r'/www/dataset/MNBVC/clear_data'  # 存放.md文件的文件夹路径
-image_folder ="/www/dataset/MNBVC/image_folder"
-convert_docx_folder(docx_folder, markdown_folder, image_folder)
+    args = parser.parse_args()
+    if args.max_processes is not None and args.max_processes < 1:
+        parser.error('--max_processes必须大于0')
+    if args.timeout <= 0:
+        parser.error('--timeout必须大于0')
 
+    record_cache = DocxRecordCache(args.record_cache) if args.record_cache else None
+    with profile_from_args(args):
+        convert_docx_folder(args.docx_dir, args.markdown_dir, args.image_dir, native=args.native, max_processes=args.max_processes,
+                            timeout=args.timeout, record_cache=record_cache)
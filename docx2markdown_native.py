@@ -0,0 +1,278 @@
+import os
+import re
+
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml.ns import qn
+
+# 遇到这些元素时交给pandoc处理，和docx_record记录中的unsupported使用同一个集合
+from docx_record import UNSUPPORTED_TAGS
+
+
+# 1英寸对应的EMU
+EMU_PER_INCH = 914400
+
+# pandoc markdown中需要转义的字符
+MARKDOWN_ESCAPE_PATTERN = re.compile(r"([\\`*_\[\]<$^~])")
+
+# 只在行首有特殊含义的字符，"1. " 和 "- " 会被当成列表
+LINE_START_ESCAPE_PATTERN = re.compile(r"^(#|>|[+-](?= )|\d+\.(?= |$))")
+
+HEADING_STYLE_PATTERN = re.compile(r"^(?:Heading|标题)\s*([1-6])$")
+
+
+class UnsupportedDocxError(Exception):
+    """
+    文档中含有快速转换不支持的内容，需要使用pandoc转换。
+    """
+
+
+def show_float(value):
+    """
+    按Haskell show的格式输出浮点数，和pandoc写出的图片宽高一致。
+
+    参数:
+    value (float): 浮点数。
+
+    返回:
+    text (str): 格式化后的字符串。
+    """
+    if value == 0:
+        return "0.0"
+    if 0.1 <= abs(value) < 10 ** 7:
+        text = repr(value)
+        return text if "." in text else text + ".0"
+
+    mantissa, exponent = f"{value:.16e}".split("e")
+    mantissa = repr(float(mantissa))
+    return f"{mantissa}e{int(exponent)}"
+
+
+def escape_markdown(text):
+    """
+    转义markdown中的特殊字符。
+    """
+    return MARKDOWN_ESCAPE_PATTERN.sub(r"\\\1", text)
+
+
+def escape_line_start(text):
+    """
+    转义行首有特殊含义的字符，例如 "1." 转义为 "1\\."。
+    """
+    return LINE_START_ESCAPE_PATTERN.sub(lambda match: match.group(1)[:-1] + "\\" + match.group(1)[-1], text)
+
+
+def check_supported(element):
+    """
+    检查元素中是否含有不支持的内容。
+
+    参数:
+    element (lxml.etree._Element): docx中的xml元素。
+
+    异常:
+    UnsupportedDocxError: 含有不支持的内容。
+    """
+    for child in element.iter():
+        if child.tag in UNSUPPORTED_TAGS:
+            raise UnsupportedDocxError(child.tag)
+
+
+def run_format(run):
+    """
+    读取一个run的格式。
+
+    返回:
+    run_format (tuple): (粗体, 斜体, 下划线, 删除线, 上标/下标)
+    """
+    properties = run.find(qn("w:rPr"))
+    if properties is None:
+        return (False, False, False, False, None)
+
+    def enabled(tag):
+        child = properties.find(qn(tag))
+        if child is None:
+            return False
+        return child.get(qn("w:val"), "true") not in ("false", "0", "none")
+
+    vertical_align = properties.find(qn("w:vertAlign"))
+    vertical_align = None if vertical_align is None else vertical_align.get(qn("w:val"))
+    if vertical_align not in ("superscript", "subscript"):
+        vertical_align = None
+
+    return (enabled("w:b"), enabled("w:i"), enabled("w:u"), enabled("w:strike"), vertical_align)
+
+
+def wrap_format(text, format):
+    """
+    按格式给一段已转义的文本加上markdown标记，首尾空白放在标记外面。
+    """
+    bold, italic, underline, strike, vertical_align = format
+    stripped = text.strip(" ")
+    if not stripped:
+        return text
+
+    leading = " " if text.startswith(" ") else ""
+    trailing = " " if text.endswith(" ") else ""
+
+    if vertical_align is not None:
+        # 上下标中的空格需要转义
+        marker = "^" if vertical_align == "superscript" else "~"
+        stripped = marker + stripped.replace(" ", "\\ ") + marker
+    if strike:
+        stripped = f"~~{stripped}~~"
+    if underline:
+        stripped = f"[{stripped}]{{.underline}}"
+    if italic:
+        stripped = f"*{stripped}*"
+    if bold:
+        stripped = f"**{stripped}**"
+
+    return leading + stripped + trailing
+
+
+class NativeConverter:
+    """
+    使用python-docx把docx转换为pandoc风格的markdown，支持文字、粗体/斜体/下划线等格式和图片，含有表格的文档交给pandoc。
+    """
+
+    def __init__(self, docx_file, image_folder, media_store=None):
+        """
+        参数:
+        docx_file (str): docx文件路径。
+        image_folder (str): 图片保存目录，和pandoc的--extract-media相同，图片保存在image_folder/media下。
+        media_store (MediaStore): 图片存储，默认为None。设置后图片按内容哈希保存，不使用image_folder。
+        """
+        self.document = Document(docx_file)
+        self.image_folder = image_folder
+        self.media_store = media_store
+        self.images = {}
+
+    def convert(self):
+        """
+        转换整个文档。
+
+        返回:
+        markdown (str): markdown文本。
+
+        异常:
+        UnsupportedDocxError: 文档中含有不支持的内容。
+        """
+        body = self.document.element.body
+        check_supported(body)
+        # pandoc按列宽在grid table、simple table和pipe table之间选择，这里的输出做不到一致，表格都交给pandoc
+        if body.find(qn("w:tbl")) is not None:
+            raise UnsupportedDocxError("table")
+
+        blocks = []
+        for child in body.iterchildren(qn("w:p")):
+            block = self.convert_paragraph(child)
+            if block:
+                blocks.append(block)
+
+        self.save_images()
+        return "\n\n".join(blocks) + "\n" if blocks else ""
+
+    def convert_inline(self, paragraph):
+        """
+        转换段落中的文字和图片，相同格式的相邻run合并后再加标记。
+        """
+        segments = []
+        for run in paragraph.iter(qn("w:r")):
+            format = run_format(run)
+            for child in run.iterchildren():
+                if child.tag == qn("w:t"):
+                    segments.append((format, escape_markdown(child.text or "")))
+                elif child.tag == qn("w:tab"):
+                    segments.append((format, " "))
+                elif child.tag in (qn("w:br"), qn("w:cr")):
+                    segments.append((None, "\\\n"))
+                elif child.tag == qn("w:drawing"):
+                    segments.append((None, self.convert_drawing(child)))
+
+        merged = []
+        for format, text in segments:
+            if merged and merged[-1][0] == format and format is not None:
+                merged[-1] = (format, merged[-1][1] + text)
+            else:
+                merged.append((format, text))
+
+        parts = []
+        for format, text in merged:
+            if format is None:
+                parts.append(text)
+            else:
+                parts.append(wrap_format(re.sub(r"\s+", " ", text), format))
+
+        text = re.sub(r" +", " ", "".join(parts))
+        # 段落末尾的换行没有意义
+        text = re.sub(r"(?:\\\n)+$", "", text.strip(" "))
+        return escape_line_start(text.strip(" "))
+
+    def convert_paragraph(self, paragraph):
+        text = self.convert_inline(paragraph)
+        if not text:
+            return ""
+
+        style = paragraph.find(f"{qn('w:pPr')}/{qn('w:pStyle')}")
+        if style is not None:
+            style_name = self.style_name(style.get(qn("w:val")))
+            match = HEADING_STYLE_PATTERN.match(style_name or "")
+            if match:
+                return "#" * int(match.group(1)) + " " + text.replace("\\\n", " ")
+
+        return text
+
+    def style_name(self, style_id):
+        try:
+            return self.document.styles.get_by_id(style_id, WD_STYLE_TYPE.PARAGRAPH).name
+        except Exception:
+            return None
+
+    def convert_drawing(self, drawing):
+        """
+        转换图片为 ![](image_folder/media/imageN.png){width="..in" height="..in"}。
+        """
+        blip = next(drawing.iter(qn("a:blip")), None)
+        if blip is None or blip.get(qn("r:embed")) is None:
+            raise UnsupportedDocxError("drawing without image")
+
+        image_part = self.document.part.related_parts[blip.get(qn("r:embed"))]
+        media_name = os.path.basename(str(image_part.partname))
+        if self.media_store is not None:
+            image_path = self.media_store.put_bytes(image_part.blob, os.path.splitext(media_name)[1])
+        else:
+            image_path = os.path.join(self.image_folder, "media", media_name)
+            self.images[image_path] = image_part.blob
+
+        attributes = ""
+        extent = next(drawing.iter(qn("wp:extent")), None)
+        if extent is not None:
+            width = int(extent.get("cx")) / EMU_PER_INCH
+            height = int(extent.get("cy")) / EMU_PER_INCH
+            attributes = f'{{width="{show_float(width)}in" height="{show_float(height)}in"}}'
+
+        return f"![]({image_path}){attributes}"
+
+    def save_images(self):
+        for image_path, blob in self.images.items():
+            os.makedirs(os.path.dirname(image_path), exist_ok=True)
+            with open(image_path, "wb") as file:
+                file.write(blob)
+
+
+def docx_to_markdown(docx_file, image_folder, media_store=None):
+    """
+    不启动pandoc，直接在进程内把docx转换为markdown。
+
+    参数:
+    docx_file (str): docx文件路径。
+    image_folder (str): 图片保存目录。
+    media_store (MediaStore): 图片存储，默认为None。
+
+    返回:
+    markdown (str): markdown文本。
+
+    异常:
+    UnsupportedDocxError: 文档中含有不支持的内容（公式、OLE对象、表格等），需要使用pandoc转换。
+    """
+    return NativeConverter(docx_file, image_folder, media_store).convert()
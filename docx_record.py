@@ -0,0 +1,275 @@
+import os
+import re
+import json
+import hashlib
+import zipfile
+import tempfile
+import posixpath
+from xml.etree import ElementTree
+
+
+# 记录格式的版本，格式变化时旧的缓存自动失效
+RECORD_VERSION = 2
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+RELATIONSHIPS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+OFFICE_DOCUMENT_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+
+HEADER_PART = re.compile(r"word/header[0-9]*\.xml$")
+FOOTER_PART = re.compile(r"word/footer[0-9]*\.xml$")
+
+# 快速转换（docx2markdown_native.py）不支持的元素，遇到时交给pandoc处理：
+# 公式、OLE对象（MathType等）、VML图片、文本框、域代码、脚注、批注、超链接、列表、合并单元格
+UNSUPPORTED_TAGS = {
+    "{http://schemas.openxmlformats.org/officeDocument/2006/math}oMath",
+    "{http://schemas.openxmlformats.org/officeDocument/2006/math}oMathPara",
+    MC + "AlternateContent",
+    W + "object",
+    W + "pict",
+    W + "txbxContent",
+    W + "fldSimple",
+    W + "fldChar",
+    W + "instrText",
+    W + "footnoteReference",
+    W + "endnoteReference",
+    W + "commentReference",
+    W + "hyperlink",
+    W + "numPr",
+    W + "gridSpan",
+    W + "vMerge",
+    W + "sdt",
+    W + "sym",
+}
+
+
+def run_text(run):
+    """
+    一个w:r的文字，和python-docx的Run.text一致：w:tab、w:ptab为制表符，w:br（换行）、w:cr为换行，
+    分页、分栏的w:br为空，w:noBreakHyphen为"-"。
+    """
+    parts = []
+    for child in run:
+        tag = child.tag
+        if tag == W + "t":
+            parts.append(child.text or "")
+        elif tag == W + "tab" or tag == W + "ptab":
+            parts.append("\t")
+        elif tag == W + "br":
+            if child.get(W + "type", "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif tag == W + "cr":
+            parts.append("\n")
+        elif tag == W + "noBreakHyphen":
+            parts.append("-")
+    return "".join(parts)
+
+
+def paragraph_text(paragraph):
+    """
+    一个w:p的文字，和python-docx的Paragraph.text一致：只包括直接的w:r和w:hyperlink中的w:r。
+    """
+    parts = []
+    for child in paragraph:
+        if child.tag == W + "r":
+            parts.append(run_text(child))
+        elif child.tag == W + "hyperlink":
+            parts.extend(run_text(run) for run in child if run.tag == W + "r")
+    return "".join(parts)
+
+
+def paragraph_style(paragraph):
+    properties = paragraph.find(W + "pPr")
+    style = properties.find(W + "pStyle") if properties is not None else None
+    return style.get(W + "val") if style is not None else None
+
+
+def main_document_part(zf):
+    """
+    从 _rels/.rels 中找到正文的xml路径，一般为 word/document.xml。
+    """
+    try:
+        with zf.open("_rels/.rels") as file:
+            for relationship in ElementTree.parse(file).getroot().iter(RELATIONSHIPS + "Relationship"):
+                if relationship.get("Type") == OFFICE_DOCUMENT_TYPE:
+                    return posixpath.normpath(relationship.get("Target").lstrip("/"))
+    except KeyError:
+        pass
+    return "word/document.xml"
+
+
+def part_paragraphs(file, part, unsupported=None):
+    """
+    流式读取一个xml部件（正文、页眉或页脚）中的所有段落。
+
+    mc:AlternateContent 中的 mc:Fallback 是旧版Word使用的备用内容，和前面的 mc:Choice 重复
+    （例如文本框），有 mc:Choice 时跳过其中的段落。
+
+    参数:
+    file (file): 打开的xml文件。
+    part (str): 部件类型，"document"、"header" 或 "footer"。
+    unsupported (set): 收集快速转换不支持的元素，默认为None不收集。
+
+    返回:
+    paragraphs (list): 段落记录。
+    """
+    paragraphs = []
+    # 顶层元素的深度：正文为 w:document > w:body > 元素，页眉、页脚为 w:hdr/w:ftr > 元素
+    top_depth = 2 if part == "document" else 1
+    table_depth = 0
+    depth = 0
+    # 每层 mc:AlternateContent 是否已经出现 mc:Choice
+    alternate_content = []
+    fallback_depth = 0
+    for event, element in ElementTree.iterparse(file, events=("start", "end")):
+        tag = element.tag
+        if event == "start":
+            depth += 1
+            if unsupported is not None and tag in UNSUPPORTED_TAGS:
+                unsupported.add(tag)
+            if tag == W + "tbl":
+                table_depth += 1
+            elif tag == MC + "AlternateContent":
+                alternate_content.append(False)
+            elif tag == MC + "Choice" and alternate_content:
+                alternate_content[-1] = True
+            elif tag == MC + "Fallback" and (fallback_depth or (alternate_content and alternate_content[-1])):
+                fallback_depth += 1
+            continue
+
+        depth -= 1
+        if tag == W + "p":
+            if not fallback_depth:
+                paragraphs.append({
+                    "text": paragraph_text(element),
+                    "style": paragraph_style(element),
+                    # w:document > w:body > w:p
+                    "body": part == "document" and depth == top_depth,
+                    "table": table_depth > 0,
+                    "part": part,
+                })
+        elif tag == W + "tbl":
+            table_depth -= 1
+        elif tag == MC + "AlternateContent":
+            alternate_content.pop()
+        elif tag == MC + "Fallback" and fallback_depth:
+            fallback_depth -= 1
+
+        # 每个顶层元素处理完后释放，内存不随文档长度增长
+        if depth == top_depth:
+            element.clear()
+    return paragraphs
+
+
+def extract_record(docx_file):
+    """
+    从zip中流式读取docx的xml（iterparse），得到后续各阶段共用的中间记录。
+
+    参数:
+    docx_file (str): docx文件路径。
+
+    返回:
+    record (dict):
+        text: 和extract_text_from_docx相同的纯文本（正文中每个段落的文字后加一个空格），
+        paragraphs: 所有段落（包括表格和文本框中的段落）的 {"text", "style", "body", "table", "part"}，
+            顺序和docx2txt相同：页眉、正文、页脚，
+            body表示段落直接位于正文中，table表示段落在表格中，part为段落所在的部件（header、document、footer），
+        media: word/media 下的图片 {"name", "size"}，
+        unsupported: 正文中出现的快速转换不支持的元素。
+    """
+    with zipfile.ZipFile(docx_file) as zf:
+        names = zf.namelist()
+        media = [{"name": info.filename, "size": info.file_size}
+                 for info in zf.infolist() if info.filename.startswith("word/media/") and not info.is_dir()]
+
+        # 页眉、页脚和docx2txt一样按zip中的顺序读取 word/header*.xml、word/footer*.xml
+        paragraphs = []
+        for name in names:
+            if HEADER_PART.match(name):
+                with zf.open(name) as file:
+                    paragraphs.extend(part_paragraphs(file, "header"))
+
+        unsupported = set()
+        with zf.open(main_document_part(zf)) as document:
+            paragraphs.extend(part_paragraphs(document, "document", unsupported))
+
+        for name in names:
+            if FOOTER_PART.match(name):
+                with zf.open(name) as file:
+                    paragraphs.extend(part_paragraphs(file, "footer"))
+
+    return {
+        "version": RECORD_VERSION,
+        "text": "".join(paragraph["text"] + " " for paragraph in paragraphs if paragraph["body"]),
+        "paragraphs": paragraphs,
+        "media": media,
+        "unsupported": sorted(unsupported),
+    }
+
+
+class DocxRecordCache:
+    """
+    按文件路径、大小和修改时间缓存extract_record的结果，文件变化后自动重新解析。
+
+    每个记录保存为 root/哈希前两位/哈希.json，先写临时文件再os.replace，多个进程可以共用同一个目录。
+    """
+
+    def __init__(self, root):
+        """
+        参数:
+        root (str): 缓存目录。
+        """
+        self.root = root
+
+    def record_path(self, docx_file):
+        stat = os.stat(docx_file)
+        key = f"{os.path.abspath(docx_file)}\0{stat.st_size}\0{stat.st_mtime_ns}\0{RECORD_VERSION}"
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=20).hexdigest()
+        return os.path.join(self.root, digest[:2], digest + ".json")
+
+    def get(self, docx_file):
+        """
+        读取缓存的记录，不存在时返回None。
+        """
+        try:
+            with open(self.record_path(docx_file), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, docx_file, record):
+        """
+        保存记录。
+        """
+        record_path = self.record_path(docx_file)
+        os.makedirs(os.path.dirname(record_path), exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(record_path), suffix=".tmp")
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+            json.dump(record, file, ensure_ascii=False)
+        os.replace(temp_path, record_path)
+
+    def get_or_extract(self, docx_file):
+        """
+        读取缓存的记录，不存在时解析docx并保存。
+        """
+        record = self.get(docx_file)
+        if record is None:
+            record = extract_record(docx_file)
+            self.put(docx_file, record)
+        return record
+
+
+def load_record(docx_file, record_cache=None):
+    """
+    获取docx的中间记录，有缓存时优先使用缓存。
+
+    参数:
+    docx_file (str): docx文件路径。
+    record_cache (DocxRecordCache): 记录缓存，默认为None。
+
+    返回:
+    record (dict): extract_record的结果。
+    """
+    if record_cache is None:
+        return extract_record(docx_file)
+    return record_cache.get_or_extract(docx_file)
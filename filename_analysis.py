@@ -0,0 +1,187 @@
+import os
+import re
+import csv
+import json
+import heapq
+import multiprocessing
+from collections import Counter
+
+
+# 缓存格式的版本，格式或者规范化规则变化时旧的缓存自动失效
+CACHE_VERSION = 1
+
+# 特殊字符
+SPECIAL_CHARACTER_PATTERN = re.compile(r'[^\w\s-]')
+
+
+def normalize_file_name(file_name):
+    """
+    去除文件名中的特殊字符和 "docx_math"、"docx"，统计词频和按关键字过滤都使用这个结果。
+    """
+    file_name = SPECIAL_CHARACTER_PATTERN.sub('', file_name)  # 去除特殊字符
+    return file_name.replace("docx_math", "").replace("docx", "")
+
+
+def read_rows(csv_file):
+    """
+    读取CSV中所有不为空的行。
+    """
+    with open(csv_file, 'r', encoding='utf-8') as file:
+        for row in csv.reader(file):
+            if row:  # 确保行不为空
+                yield row
+
+
+def iter_chunks(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def tokenize_chunk(rows):
+    """
+    规范化并分词一批行，返回 [row, 规范化的文件名, 分词结果] 列表。
+    """
+    import jieba
+
+    records = []
+    for row in rows:
+        normalized = normalize_file_name(row[0])
+        records.append([row, normalized, list(jieba.cut(normalized))])
+    return records
+
+
+def tokenize_rows(rows, workers=1, chunk_size=1000):
+    """
+    规范化并分词所有行，每个文件名只处理一次，workers大于1时在多个进程中分词，结果顺序和输入一致。
+
+    参数:
+    rows (iterable): CSV的行。
+    workers (int): 进程数量，默认为1即在当前进程中执行。
+    chunk_size (int): 每个进程一次处理的行数。
+
+    返回:
+    records (iterator): [row, 规范化的文件名, 分词结果]。
+    """
+    import jieba
+
+    # 先在主进程中加载词典，fork出来的子进程直接继承
+    jieba.initialize()
+    chunks = iter_chunks(rows, chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            yield from tokenize_chunk(chunk)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        for records in pool.imap(tokenize_chunk, chunks):
+            yield from records
+
+
+def cache_header(csv_file):
+    stat = os.stat(csv_file)
+    return {"version": CACHE_VERSION, "csv_file": os.path.abspath(csv_file), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def read_cache(csv_file, cache_file):
+    """
+    读取分词缓存，缓存不存在或者CSV已经变化时返回None。
+    """
+    try:
+        file = open(cache_file, 'r', encoding='utf-8')
+    except OSError:
+        return None
+    with file:
+        try:
+            valid = json.loads(file.readline()) == cache_header(csv_file)
+        except ValueError:
+            valid = False
+    if not valid:
+        return None
+    return iter_cache(cache_file)
+
+
+def iter_cache(cache_file):
+    with open(cache_file, 'r', encoding='utf-8') as file:
+        file.readline()
+        for line in file:
+            yield json.loads(line)
+
+
+def iter_file_names(csv_file, cache_file=None, workers=1, tokenize=True):
+    """
+    逐行返回每个文件名的规范化和分词结果。
+
+    给出cache_file时，CSV没有变化就直接读取缓存；否则分词后一边返回一边写入缓存（先写临时文件，完整读完后再替换，没有读完时删除临时文件）。
+    不需要分词并且没有可用的缓存时只做规范化，不加载jieba，也不写缓存。
+
+    参数:
+    csv_file (str): index_to_filename.csv 这样的CSV，第一列为原始文件名。
+    cache_file (str): 分词缓存（JSON lines）路径，默认不使用缓存。
+    workers (int): 分词的进程数量，默认为1。
+    tokenize (bool): 是否需要分词，为False并且没有可用的缓存时分词结果为None。
+
+    返回:
+    records (iterator): [row, 规范化的文件名, 分词结果]。
+    """
+    if cache_file:
+        cached = read_cache(csv_file, cache_file)
+        if cached is not None:
+            yield from cached
+            return
+    if not tokenize:
+        for row in read_rows(csv_file):
+            yield [row, normalize_file_name(row[0]), None]
+        return
+
+    records = tokenize_rows(read_rows(csv_file), workers)
+    if not cache_file:
+        yield from records
+        return
+
+    header = cache_header(csv_file)
+    temp_file = cache_file + ".tmp"
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            file.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                yield record
+        os.replace(temp_file, cache_file)
+    finally:
+        # 出错或者调用方没有读完（生成器被关闭）时缓存不完整，删除临时文件
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def count_tokens(token_lists):
+    """
+    逐个文件名累加词频，不需要先把所有词合并成一个列表。
+    """
+    counts = Counter()
+    for tokens in token_lists:
+        counts.update(tokens)
+    return counts
+
+
+def top_tokens(counts, top_k=None, min_count=1):
+    """
+    词频最高的top_k个词。给出top_k时用堆只选出需要的部分，不对所有词排序；top_k为None时对所有词排序。
+
+    参数:
+    counts (Counter): 词频。
+    top_k (int): 返回的数量，默认为None即返回所有词（按词频从高到低）。
+    min_count (int): 只返回词频不低于这个值的词。
+
+    返回:
+    result (list): (词, 词频) 列表，按词频从高到低排序。
+    """
+    items = [(word, count) for word, count in counts.items() if count >= min_count]
+    if top_k is None:
+        return sorted(items, key=lambda item: item[1], reverse=True)
+    return heapq.nlargest(top_k, items, key=lambda item: item[1])
@@ -0,0 +1,112 @@
+import os
+import glob
+import random
+import argparse
+
+import joblib
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import make_pipeline
+
+from tokenizer import chinese_tokenizer
+from paper_markdown_text_classifier import one_text_pre_process, iter_batches
+
+
+def make_model(n_features=2 ** 22, ngram_range=(1, 5), alpha=1e-6):
+    """
+    创建哈希特征的文本分类模型。HashingVectorizer没有词表，内存只和n_features有关，不随语料增长。
+
+    参数:
+    n_features (int): 哈希桶数量，默认为2**22。
+    ngram_range (tuple): n-gram范围，默认和原模型一样为(1, 5)。
+    alpha (float): SGDClassifier的正则化系数。
+
+    返回:
+    model (sklearn.pipeline.Pipeline): HashingVectorizer + SGDClassifier(log_loss)，支持predict_proba。
+    """
+    vectorizer = HashingVectorizer(
+        tokenizer=chinese_tokenizer,
+        token_pattern=None,
+        ngram_range=ngram_range,
+        n_features=n_features,
+        alternate_sign=False,
+    )
+    classifier = SGDClassifier(loss="log_loss", alpha=alpha)
+    return make_pipeline(vectorizer, classifier)
+
+
+def iter_labeled_markdown(positive_dir, negative_dir, seed=0):
+    """
+    按随机顺序读取两个目录下的markdown文件，只打乱文件路径，不把内容全部读入内存。
+
+    参数:
+    positive_dir (str): 试卷的markdown目录，标签为1。
+    negative_dir (str): 其他文档的markdown目录，标签为0。
+    seed (int): 随机种子。
+
+    返回:
+    generator: {"text": 文本, "label": 标签}。
+    """
+    file_paths = [(file_path, 1) for file_path in glob.glob(os.path.join(positive_dir, "*.md"))]
+    file_paths += [(file_path, 0) for file_path in glob.glob(os.path.join(negative_dir, "*.md"))]
+    random.Random(seed).shuffle(file_paths)
+
+    for file_path, label in file_paths:
+        with open(file_path, "r", encoding="utf-8") as f:
+            yield {"text": f.read(), "label": label}
+
+
+def iter_text_batches(rows, batch_size=1000):
+    """
+    把 {"text", "label"} 行切分成批，并对文本做预处理。
+
+    参数:
+    rows (iterable): 数据行，可以是datasets的streaming数据集。
+    batch_size (int): 每批的数量。
+
+    返回:
+    generator: (预处理后的文本列表, 标签列表)。
+    """
+    for batch in iter_batches(rows, batch_size):
+        yield [one_text_pre_process(row["text"]) for row in batch], [row["label"] for row in batch]
+
+
+def partial_fit_model(model, batches, classes=(0, 1)):
+    """
+    用partial_fit逐批训练模型，每次只有一批文档在内存中。
+
+    参数:
+    model (sklearn.pipeline.Pipeline): make_model创建的模型。
+    batches (iterable): (文本列表, 标签列表)。
+    classes (tuple): 所有类别。
+
+    返回:
+    model (sklearn.pipeline.Pipeline): 训练后的模型。
+    """
+    vectorizer = model.steps[0][1]
+    classifier = model.steps[-1][1]
+
+    for texts, labels in batches:
+        classifier.partial_fit(vectorizer.transform(texts), labels, classes=list(classes))
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用哈希特征和partial_fit逐批训练试卷分类模型")
+    parser.add_argument('--positive_dir', default="data/examination_paper_markdown", type=str, help="试卷的markdown目录")
+    parser.add_argument('--negative_dir', default="data/not_examination_paper_markdown", type=str, help="其他文档的markdown目录")
+    parser.add_argument('--n_features', default=2 ** 22, type=int, help="哈希桶数量")
+    parser.add_argument('--batch_size', default=1000, type=int, help="每批的文档数量")
+    parser.add_argument('--epochs', default=1, type=int, help="遍历数据的次数")
+    parser.add_argument('--output', default="TextClassifier-hashing.pkl", type=str, help="模型保存路径")
+
+    args = parser.parse_args()
+
+    model = make_model(n_features=args.n_features)
+    for epoch in range(args.epochs):
+        rows = iter_labeled_markdown(args.positive_dir, args.negative_dir, seed=epoch)
+        partial_fit_model(model, iter_text_batches(rows, args.batch_size))
+        print(f"epoch {epoch + 1}/{args.epochs} 完成")
+
+    joblib.dump(model, args.output)
+    print(f"模型已保存：{args.output}")
@@ -0,0 +1,144 @@
+import re
+from functools import lru_cache
+
+
+def trie_pattern(keywords):
+    """
+    把关键字列表编译为前缀树形式的正则表达式，例如 ['答', '答案', '解析'] => 答(?:案)?|解析。
+
+    每个位置只沿着前缀树向下匹配，不需要逐个尝试所有关键字，并且总是匹配最长的关键字。
+
+    参数:
+    keywords (iterable): 关键字列表。
+
+    返回:
+    pattern (str): 正则表达式。
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            pattern = "(?:" + pattern + ")?"
+        return pattern
+
+    branches = [re.escape(char) + build(child) for char, child in sorted(trie.items()) if char]
+    return "|".join(branches)
+
+
+class KeywordMatcher:
+    """
+    多关键字匹配器，整段文本只扫描一次。
+
+    contains_any 找到第一个关键字就停止；find_all 返回所有关键字出现的位置，包括互相重叠的关键字（例如 "解析" 中的 "解"）。
+    """
+
+    def __init__(self, keywords):
+        """
+        参数:
+        keywords (iterable): 关键字列表。
+        """
+        self.keywords = [keyword for keyword in dict.fromkeys(keywords) if keyword]
+        if not self.keywords:
+            raise ValueError('关键字列表不能为空')
+
+        pattern = trie_pattern(self.keywords)
+        self.search_pattern = re.compile(pattern)
+        # UTF-8编码后的关键字，可以直接在bytes或者mmap上查找，不需要先解码整个文件
+        byte_keywords = [keyword.encode("utf-8").decode("latin-1") for keyword in self.keywords]
+        self.bytes_search_pattern = re.compile(trie_pattern(byte_keywords).encode("latin-1"))
+        # 零宽的前瞻可以在每个位置都匹配，得到每个位置开始的最长关键字
+        self.overlapping_pattern = re.compile(f"(?=({pattern}))")
+
+        # 每个关键字中包含的其他关键字及其偏移，最长关键字命中时它们也一定命中
+        self.contained_keywords = {
+            keyword: [
+                (offset, other)
+                for other in self.keywords if other != keyword
+                for offset in range(len(keyword) - len(other) + 1)
+                if keyword.startswith(other, offset)
+            ]
+            for keyword in self.keywords
+        }
+
+    def contains_any(self, text):
+        """
+        判断文本中是否含有任意一个关键字，找到第一个就停止。
+
+        参数:
+        text (str): 文本。
+
+        返回:
+        bool: 是否含有关键字。
+        """
+        return self.search_pattern.search(text) is not None
+
+    def contains_any_bytes(self, buffer):
+        """
+        判断UTF-8编码的内容中是否含有任意一个关键字，找到第一个就停止。
+        UTF-8中一个字符的编码不会出现在其他字符的编码中间，所以按字节匹配和按字符匹配的结果相同。
+
+        参数:
+        buffer (bytes or mmap.mmap): UTF-8编码的内容。
+
+        返回:
+        bool: 是否含有关键字。
+        """
+        return self.bytes_search_pattern.search(buffer) is not None
+
+    def find_all(self, text):
+        """
+        查找文本中所有关键字出现的位置。
+
+        参数:
+        text (str): 文本。
+
+        返回:
+        matches (list): 按位置排序的 (位置, 关键字) 列表。
+        """
+        matches = set()
+        for match in self.overlapping_pattern.finditer(text):
+            start = match.start()
+            keyword = match.group(1)
+            matches.add((start, keyword))
+            for offset, other in self.contained_keywords[keyword]:
+                matches.add((start + offset, other))
+        return sorted(matches)
+
+    def matched_keywords(self, text):
+        """
+        返回文本中出现过的关键字。
+
+        参数:
+        text (str): 文本。
+
+        返回:
+        keywords (set): 出现过的关键字。
+        """
+        return {keyword for _, keyword in self.find_all(text)}
+
+
+@lru_cache(maxsize=None)
+def _compile_keywords(keywords):
+    return KeywordMatcher(keywords)
+
+
+def compile_keywords(keywords):
+    """
+    获取关键字列表对应的匹配器，相同的关键字列表只编译一次。
+
+    参数:
+    keywords (iterable): 关键字列表。
+
+    返回:
+    matcher (KeywordMatcher): 匹配器。
+    """
+    return _compile_keywords(tuple(keywords))
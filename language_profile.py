@@ -0,0 +1,127 @@
+import math
+
+import numpy as np
+
+
+# 字符类别
+OTHER, CJK, LATIN, DIGIT, FORMULA = range(5)
+CATEGORIES = ["other", "cjk", "latin", "digit", "formula"]
+
+# 每次统计的字符数，提前结束的判断也在每块之后进行
+CHUNK_SIZE = 4096
+
+
+def build_category_table():
+    """
+    基本多文种平面（U+0000 ~ U+FFFF）中每个码点的类别，超出的码点为OTHER。
+    """
+    table = np.zeros(0x10000, dtype=np.uint8)
+    # 中文：CJK统一汉字（和原来的判断相同）
+    table[0x4E00:0xA000] = CJK
+    # 英文字母
+    table[ord("a"):ord("z") + 1] = LATIN
+    table[ord("A"):ord("Z") + 1] = LATIN
+    # 数字，包括全角数字
+    table[ord("0"):ord("9") + 1] = DIGIT
+    table[0xFF10:0xFF1A] = DIGIT
+    # 公式：运算符、希腊字母、上下标、数学运算符号块，以及全角的运算符
+    for char in "+-*/=<>^_\\×÷±≈≠≤≥√∞∑∏∫πΔ＋－＝＜＞":
+        table[ord(char)] = FORMULA
+    table[0x0391:0x03CA] = FORMULA
+    table[0x2070:0x20A0] = FORMULA
+    table[0x2200:0x2300] = FORMULA
+    return table
+
+
+CATEGORY_TABLE = build_category_table()
+
+
+def count_scripts(text):
+    """
+    统计文本中中文、英文字母、数字、公式和其他字符的数量，整个计算在NumPy中完成。
+
+    参数:
+    text (str): 文本。
+
+    返回:
+    counts (numpy.ndarray): 按CATEGORIES顺序的数量。
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    # 超出基本平面的字符（少见的汉字扩展区、emoji等）算作其他
+    categories = CATEGORY_TABLE[np.minimum(codes, 0xFFFF)]
+    counts = np.bincount(categories, minlength=len(CATEGORIES))
+    counts[OTHER] += np.count_nonzero(codes > 0xFFFF)
+    return counts
+
+
+def chunk_order(chunk_count):
+    """
+    块的统计顺序：0、1/2、1/4、3/4……处的块依次交错，提前结束时统计过的部分分布在整篇文本中，而不只是开头。
+    """
+    bits = max(1, (chunk_count - 1).bit_length())
+    return sorted(range(chunk_count), key=lambda index: int(format(index, f"0{bits}b")[::-1], 2))
+
+
+def is_decided(cjk, latin, thresholds, z):
+    """
+    已经统计的字母数足够多，中文比例和每个阈值的距离都超过z个标准误差时，认为结果已经确定。
+    """
+    letters = cjk + latin
+    ratio = cjk / letters
+    error = z * math.sqrt(max(ratio * (1 - ratio), 1 / letters) / letters)
+    return all(abs(ratio - threshold) > error for threshold in thresholds)
+
+
+def profile_language(text, chinese_threshold=0.5, english_threshold=0.5, early_stop=True, min_letters=1000, z=4.0):
+    """
+    统计文本的字符组成并判断语言。
+
+    中文比例 = 中文字数 / (中文字数 + 英文字母数)，英文比例 = 1 - 中文比例。
+    中文比例大于chinese_threshold时为Chinese，英文比例大于english_threshold时为English（都满足时取比例大的），
+    否则为Unknown。默认阈值都是0.5，即和原来一样按中文和英文字母哪个多来判断。
+
+    early_stop时按块交错统计，统计过的字母数不少于min_letters、并且中文比例离两个阈值都足够远（z个标准误差）时提前结束。
+
+    参数:
+    text (str): 文本。
+    chinese_threshold (float): 判断为中文的中文比例。
+    english_threshold (float): 判断为英文的英文比例。
+    early_stop (bool): 是否允许提前结束，默认为True。
+    min_letters (int): 提前结束至少需要统计的字母数。
+    z (float): 提前结束需要的标准误差倍数，越大越保守。
+
+    返回:
+    profile (dict): language、cjk_ratio，以及已统计部分的 chars 和各类字符数（cjk、latin、digit、formula、other）。
+    """
+    chunk_count = max(1, -(-len(text) // CHUNK_SIZE))
+    if not early_stop or chunk_count == 1:
+        counts = count_scripts(text)
+        scanned_chars = len(text)
+    else:
+        # 1 - 阈值，即中文比例上的英文阈值
+        thresholds = (chinese_threshold, 1 - english_threshold)
+        counts = np.zeros(len(CATEGORIES), dtype=np.int64)
+        scanned_chars = 0
+        for index in chunk_order(chunk_count):
+            chunk = text[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]
+            counts += count_scripts(chunk)
+            scanned_chars += len(chunk)
+            if counts[CJK] + counts[LATIN] >= min_letters and is_decided(counts[CJK], counts[LATIN], thresholds, z):
+                break
+
+    cjk, latin = int(counts[CJK]), int(counts[LATIN])
+    letters = cjk + latin
+    cjk_ratio = cjk / letters if letters else 0.0
+
+    language = "Unknown"
+    if letters:
+        chinese = cjk_ratio > chinese_threshold
+        english = 1 - cjk_ratio > english_threshold
+        if chinese and (not english or cjk_ratio >= 0.5):
+            language = "Chinese"
+        elif english:
+            language = "English"
+
+    profile = {"language": language, "cjk_ratio": cjk_ratio, "chars": scanned_chars}
+    profile.update(zip(CATEGORIES, map(int, counts)))
+    return profile
@@ -0,0 +1,104 @@
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+
+
+class MediaStore:
+    """
+    按内容哈希保存图片，相同的图片只保存一次。
+
+    图片保存为 root/哈希前两位/哈希.扩展名。写入时先写临时文件再os.replace，
+    多个线程或进程同时保存同一张图片也不会得到不完整的文件。
+    """
+
+    def __init__(self, root):
+        """
+        参数:
+        root (str): 图片保存目录。
+        """
+        self.root = root
+        self.temp_root = os.path.join(root, ".tmp")
+
+    def media_path(self, digest, extension):
+        return os.path.join(self.root, digest[:2], digest + extension.lower())
+
+    def put_bytes(self, data, extension):
+        """
+        保存一张图片。
+
+        参数:
+        data (bytes): 图片内容。
+        extension (str): 扩展名，例如 ".png"。
+
+        返回:
+        media_path (str): 图片保存的路径。
+        """
+        media_path = self.media_path(hashlib.blake2b(data, digest_size=20).hexdigest(), extension)
+        if os.path.exists(media_path):
+            return media_path
+
+        os.makedirs(os.path.dirname(media_path), exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(media_path), suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, media_path)
+        return media_path
+
+    def put_file(self, path):
+        """
+        把一个文件移动到存储中，存储中已有相同内容时直接删除该文件。
+
+        参数:
+        path (str): 图片文件路径，需要和存储在同一个文件系统上。
+
+        返回:
+        media_path (str): 图片保存的路径。
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+
+        media_path = self.media_path(digest.hexdigest(), os.path.splitext(path)[1])
+        if os.path.exists(media_path):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(media_path), exist_ok=True)
+            os.replace(path, media_path)
+        return media_path
+
+    def extract_directory(self):
+        """
+        创建一个临时目录，给pandoc的--extract-media使用，每次转换各用一个，互不覆盖。
+
+        返回:
+        directory (str): 临时目录路径。
+        """
+        os.makedirs(self.temp_root, exist_ok=True)
+        return tempfile.mkdtemp(dir=self.temp_root)
+
+    def import_directory(self, directory, markdown):
+        """
+        把临时目录中的图片移动到存储中，并把markdown中的图片链接改为存储中的路径，最后删除临时目录。
+
+        参数:
+        directory (str): extract_directory创建的临时目录。
+        markdown (str): pandoc输出的markdown。
+
+        返回:
+        markdown (str): 链接替换后的markdown。
+        """
+        media_paths = {}
+        for root, _, files in os.walk(directory):
+            for file in files:
+                path = os.path.join(root, file)
+                media_paths[path] = self.put_file(path)
+        shutil.rmtree(directory, ignore_errors=True)
+
+        if not media_paths:
+            return markdown
+
+        pattern = re.compile("|".join(re.escape(path) for path in sorted(media_paths, key=len, reverse=True)))
+        return pattern.sub(lambda match: media_paths[match.group(0)], markdown)
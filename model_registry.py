@@ -0,0 +1,362 @@
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import contextlib
+from urllib.parse import urlparse
+
+
+# 默认的模型缓存目录，可以用环境变量修改，同一台机器上的所有任务共用
+DEFAULT_MODEL_DIR = os.environ.get("EXAM_PAPER_MODEL_DIR", os.path.join(os.path.expanduser("~"), ".cache", "exam_paper_models"))
+
+# 下载时每次读取和写入的大小
+CHUNK_SIZE = 1024 * 1024
+
+
+class ChecksumError(ValueError):
+    """
+    下载或者缓存的文件和期望的sha256不一致。
+    """
+
+
+@contextlib.contextmanager
+def file_lock(lock_path):
+    """
+    对lock_path加排他锁，同一时间只有一个进程可以进入。
+    Linux和macOS上用flock，Windows上没有fcntl，改用msvcrt.locking锁住文件的第一个字节。
+    """
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a+b") as lock_file:
+        try:
+            import fcntl
+        except ImportError:
+            import msvcrt
+
+            lock_file.seek(0)
+            # LK_LOCK最多重试10次（约10秒），下载可能更久，一直重试到拿到锁
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            return
+
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def file_sha256(path, digest=None):
+    """
+    计算文件的sha256，digest不为None时在它的基础上继续计算。
+    """
+    digest = digest or hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest
+
+
+def download_file(url, target, sha256=None, timeout=60, progress=True):
+    """
+    下载文件到target：先写入 target.part，完成并校验后用os.replace发布。
+    调用方需要持有锁，避免多个进程同时写同一个 .part 文件。
+
+    下载出错、被中断（包括Ctrl+C）或者校验失败时删除 .part，不留下不完整的文件；
+    只有进程被强制结束时才会留下 .part，再次运行时从断点继续。
+    服务器不支持Range（返回200）时从头下载；没有content-range和content-length时不显示总大小，也不检查大小。
+
+    参数:
+    url (str): 下载链接。
+    target (str): 保存路径。
+    sha256 (str): 期望的sha256，给出时校验，不一致时抛出ChecksumError。
+    timeout (float): 连接和读取的超时时间（秒）。
+    progress (bool): 是否显示进度条。
+
+    返回:
+    sha256 (str): 下载的文件的sha256。
+    """
+    part_path = target + ".part"
+    try:
+        actual_sha256 = download_part(url, part_path, timeout, progress)
+        if sha256 and actual_sha256 != sha256.lower():
+            raise ChecksumError(f"{url} 的sha256为{actual_sha256}，期望{sha256}")
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(part_path)
+        raise
+
+    os.replace(part_path, target)
+    return actual_sha256
+
+
+def download_part(url, part_path, timeout=60, progress=True):
+    """
+    把url下载到part_path，part_path已经存在时用Range从断点继续，返回完整文件的sha256。
+    """
+    import requests
+    from tqdm import tqdm
+
+    initial_position = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={initial_position}-"} if initial_position else {}
+
+    digest = None
+    with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        content_range = response.headers.get("content-range")
+        content_length = response.headers.get("content-length")
+        # content-range: bytes 100-199/200，416时为 bytes */200，总大小未知时为 */*
+        range_total = content_range.rsplit("/", 1)[1] if content_range and "/" in content_range else "*"
+
+        if response.status_code == 416:
+            # .part已经是完整的文件，服务器没有更多的内容
+            total_size = int(range_total) if range_total != "*" else None
+        else:
+            response.raise_for_status()
+            if response.status_code != 206:
+                # 服务器忽略了Range，从头开始
+                initial_position = 0
+
+            if range_total != "*":
+                total_size = int(range_total)
+            elif content_length:
+                total_size = initial_position + int(content_length)
+            else:
+                total_size = None
+
+            digest = file_sha256(part_path) if initial_position else hashlib.sha256()
+            progress_bar = tqdm(total=total_size, unit="iB", unit_scale=True, initial=initial_position, disable=not progress)
+            with open(part_path, "ab" if initial_position else "wb", buffering=CHUNK_SIZE) as file:
+                for data in response.iter_content(chunk_size=CHUNK_SIZE):
+                    file.write(data)
+                    digest.update(data)
+                    progress_bar.update(len(data))
+            progress_bar.close()
+
+    size = os.path.getsize(part_path)
+    if total_size is not None and size != total_size:
+        raise IOError(f"下载不完整：{size}/{total_size} 字节")
+
+    return digest.hexdigest() if digest is not None else file_sha256(part_path).hexdigest()
+
+
+def default_name(url):
+    return os.path.basename(urlparse(url).path) or "model"
+
+
+def default_version(url):
+    """
+    同一个文件名不同的下载链接（例如不同的分支或者仓库）放在不同的版本目录中。
+    """
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=6).hexdigest()
+
+
+class ModelRegistry:
+    """
+    本地模型缓存：每个模型保存在 root/名称/版本/ 下，meta.json 记录下载链接、大小和sha256。
+
+    meta.json 在模型文件发布之后才写入，有meta.json的版本就是完整的。sha256只在下载完成时校验一次，
+    meta.json同时记录文件的大小和修改时间；使用缓存时只比较大小和修改时间，不需要联网，也不用每次启动都读一遍模型，
+    需要时可以用verify重新计算sha256。下载时对每个版本加文件锁，多个进程同时请求同一个模型时只有一个进程下载，其余的等待后直接使用。
+    """
+
+    def __init__(self, root=DEFAULT_MODEL_DIR):
+        """
+        参数:
+        root (str): 缓存目录，默认为 ~/.cache/exam_paper_models（环境变量EXAM_PAPER_MODEL_DIR）。
+        """
+        self.root = root
+
+    def version_dir(self, name, version):
+        return os.path.join(self.root, name, version)
+
+    def lookup(self, name, version, sha256=None, verify=False):
+        """
+        查找缓存的模型，不存在、不完整或者校验失败时返回None。
+
+        参数:
+        name (str): 模型名称（文件名）。
+        version (str): 版本。
+        sha256 (str): 期望的sha256，默认使用meta.json中记录的值。
+        verify (bool): 是否重新计算文件的sha256，默认为False即只比较meta.json中记录的大小和修改时间。
+
+        返回:
+        path (str or None): 模型文件路径。
+        """
+        version_dir = self.version_dir(name, version)
+        try:
+            with open(os.path.join(version_dir, "meta.json"), "r", encoding="utf-8") as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        path = os.path.join(version_dir, name)
+        if sha256 and meta["sha256"] != sha256.lower():
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size != meta["size"]:
+            return None
+        # 旧的meta.json没有记录修改时间，只能重新计算sha256
+        if verify or stat.st_mtime_ns != meta.get("mtime_ns"):
+            if file_sha256(path).hexdigest() != meta["sha256"]:
+                return None
+            if stat.st_mtime_ns != meta.get("mtime_ns"):
+                # 内容没有变化（例如被touch过），记录新的修改时间，下次不用再计算sha256
+                meta["mtime_ns"] = stat.st_mtime_ns
+                self.write_meta_file(version_dir, meta)
+        return path
+
+    def write_meta(self, name, version, url, path, sha256):
+        """
+        模型文件发布之后写入meta.json，记录大小和修改时间，之后使用缓存时不再计算sha256。
+        """
+        stat = os.stat(path)
+        meta = {"name": name, "version": version, "url": url, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                "sha256": sha256, "downloaded": time.time()}
+        self.write_meta_file(self.version_dir(name, version), meta)
+
+    @staticmethod
+    def write_meta_file(version_dir, meta):
+        """
+        原子地写入meta.json：先写临时文件再替换，读取的进程不会看到写了一半的内容。
+        """
+        meta_path = os.path.join(version_dir, "meta.json")
+        temp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(meta, file, ensure_ascii=False, indent=2)
+        os.replace(temp_path, meta_path)
+
+    def install(self, local_file, url, name=None, version=None, sha256=None):
+        """
+        把已经下载好的模型文件复制到缓存中，作为url对应的版本，不联网。
+
+        参数:
+        local_file (str): 本地的模型文件。
+        url (str): 模型的下载链接。
+        name (str): 模型名称，默认为链接中的文件名。
+        version (str): 版本，默认由下载链接计算。
+        sha256 (str): 期望的sha256，给出时校验，不一致时抛出ChecksumError，不复制。
+
+        返回:
+        path (str): 缓存中的模型文件路径。
+        """
+        name = name or default_name(url)
+        version = version or default_version(url)
+        version_dir = self.version_dir(name, version)
+
+        actual_sha256 = file_sha256(local_file).hexdigest()
+        if sha256 and actual_sha256 != sha256.lower():
+            raise ChecksumError(f"{local_file} 的sha256为{actual_sha256}，期望{sha256}")
+
+        with file_lock(version_dir + ".lock"):
+            # 多个进程同时导入同一个文件时只复制一次
+            path = self.lookup(name, version, actual_sha256)
+            if path is not None:
+                return path
+
+            os.makedirs(version_dir, exist_ok=True)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(version_dir, "meta.json"))
+            path = os.path.join(version_dir, name)
+            shutil.copyfile(local_file, path + ".part")
+            os.replace(path + ".part", path)
+            self.write_meta(name, version, url, path, actual_sha256)
+        return path
+
+    def fetch(self, url, name=None, version=None, sha256=None, offline=False, progress=True, verify=False, local_file=None):
+        """
+        返回模型文件的本地路径，缓存中没有时下载。
+
+        参数:
+        url (str): 下载链接。
+        name (str): 模型名称，默认为链接中的文件名。
+        version (str): 版本，默认由下载链接计算。
+        sha256 (str): 期望的sha256，给出时下载和使用缓存都会校验。
+        offline (bool): 只使用缓存，缓存中没有时抛出FileNotFoundError，不联网。
+        progress (bool): 下载时是否显示进度条。
+        verify (bool): 使用缓存时是否重新计算sha256，默认只比较大小和修改时间。
+        local_file (str): 以前从url下载到本地的模型文件，缓存中没有时先用install导入，
+            给出sha256并且校验不一致时忽略它，重新下载。
+
+        返回:
+        path (str): 模型文件路径。
+        """
+        name = name or default_name(url)
+        version = version or default_version(url)
+
+        path = self.lookup(name, version, sha256, verify)
+        if path is not None:
+            return path
+
+        if local_file and os.path.exists(local_file):
+            try:
+                return self.install(local_file, url, name, version, sha256)
+            except ChecksumError as e:
+                print(f"不使用 {local_file}：{e}", file=sys.stderr)
+
+        if offline:
+            raise FileNotFoundError(f"模型缓存 {self.version_dir(name, version)} 中没有 {name}，离线模式不能下载")
+
+        version_dir = self.version_dir(name, version)
+        with file_lock(version_dir + ".lock"):
+            # 等待锁的时候其他进程可能已经下载完成
+            path = self.lookup(name, version, sha256, verify)
+            if path is not None:
+                return path
+
+            os.makedirs(version_dir, exist_ok=True)
+            # 校验失败的旧版本先标记为不完整，再重新下载
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(version_dir, "meta.json"))
+            path = os.path.join(version_dir, name)
+            actual_sha256 = download_file(url, path, sha256, progress=progress)
+            self.write_meta(name, version, url, path, actual_sha256)
+        return path
+
+    def list(self):
+        """
+        返回所有完整的模型版本的meta.json内容。
+        """
+        models = []
+        for meta_path in sorted(glob.glob(os.path.join(self.root, "*", "*", "meta.json"))):
+            with open(meta_path, "r", encoding="utf-8") as file:
+                models.append(json.load(file))
+        return models
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="下载模型到本地缓存，或者列出缓存中的模型")
+    parser.add_argument('--model_url', default=None, type=str, help="模型下载链接，不给出时列出缓存中的模型")
+    parser.add_argument('--model_dir', default=DEFAULT_MODEL_DIR, type=str, help="模型缓存目录")
+    parser.add_argument('--model_sha256', default=None, type=str, help="期望的sha256")
+    parser.add_argument('--model_version', default=None, type=str, help="版本，默认由下载链接计算")
+    parser.add_argument('--offline', action='store_true', help="只使用缓存，不联网")
+    parser.add_argument('--verify', action='store_true', help="重新计算缓存中模型的sha256，默认只比较大小和修改时间")
+    parser.add_argument('--install', default=None, type=str, help="已经下载好的模型文件，校验后导入缓存，作为--model_url的版本")
+
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.model_dir)
+    if args.install:
+        if not args.model_url:
+            parser.error('--install需要--model_url')
+        print(registry.install(args.install, args.model_url, version=args.model_version, sha256=args.model_sha256))
+    elif args.model_url:
+        print(registry.fetch(args.model_url, version=args.model_version, sha256=args.model_sha256, offline=args.offline, verify=args.verify))
+    else:
+        for meta in registry.list():
+            print(json.dumps(meta, ensure_ascii=False))
@@ -0,0 +1,368 @@
+import os
+import sys
+import glob
+import json
+import uuid
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+import numpy as np
+
+
+# 字符k-gram的长度，中文试卷按字切分比按词切分更能抵抗分词差异
+SHINGLE_SIZE = 5
+
+# 多项式滚动哈希的底数和splitmix64的常数（都是奇数，按2^64取模运算）
+SHINGLE_BASE = np.uint64(0x100000001B3)
+MIX_MULTIPLIER_1 = np.uint64(0xBF58476D1CE4E5B9)
+MIX_MULTIPLIER_2 = np.uint64(0x94D049BB133111EB)
+
+# 一次计算多少个shingle的MinHash，限制 num_perm × 块大小 的临时数组内存
+SIGNATURE_CHUNK_SIZE = 8192
+
+# 空文本的签名，每个位置都是最大值
+EMPTY_HASH = np.iinfo(np.uint32).max
+
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    """
+    计算文本所有字符k-gram的64位哈希值（去重），整个计算在NumPy中完成，不逐个生成子串。
+
+    参数:
+    text (str): 预处理后的文本。
+    size (int): k-gram的长度，文本比它短时整个文本作为一个k-gram。
+
+    返回:
+    hashes (numpy.ndarray): uint64数组。
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if len(codes) == 0:
+        return codes
+    size = min(size, len(codes))
+    count = len(codes) - size + 1
+
+    # h = c0 * B^(k-1) + c1 * B^(k-2) + ... + c(k-1)，溢出即按2^64取模
+    with np.errstate(over="ignore"):
+        hashes = np.zeros(count, dtype=np.uint64)
+        for offset in range(size):
+            hashes = hashes * SHINGLE_BASE + codes[offset:offset + count]
+
+        # splitmix64的最后一步，把相近的码点打散到所有位上
+        hashes ^= hashes >> np.uint64(30)
+        hashes *= MIX_MULTIPLIER_1
+        hashes ^= hashes >> np.uint64(27)
+        hashes *= MIX_MULTIPLIER_2
+        hashes ^= hashes >> np.uint64(31)
+    return np.unique(hashes)
+
+
+class MinHasher:
+    """
+    计算MinHash签名。每个排列是一个 (a * x + b) mod 2^64 的乘移位哈希，取结果的高32位，
+    所有排列和所有shingle一起用NumPy广播计算。
+    """
+
+    def __init__(self, num_perm=128, seed=1):
+        """
+        参数:
+        num_perm (int): 排列（签名长度）数量。
+        seed (int): 随机种子，相同的种子得到相同的签名，同一个索引中必须一致。
+        """
+        self.num_perm = num_perm
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # a为奇数
+        self.a = rng.integers(0, 2 ** 64, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 64, size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes):
+        """
+        参数:
+        hashes (numpy.ndarray): shingle_hashes的结果。
+
+        返回:
+        signature (numpy.ndarray): 长度为num_perm的uint32数组。
+        """
+        signature = np.full(self.num_perm, EMPTY_HASH, dtype=np.uint32)
+        a = self.a[:, None]
+        b = self.b[:, None]
+        with np.errstate(over="ignore"):
+            for start in range(0, len(hashes), SIGNATURE_CHUNK_SIZE):
+                chunk = hashes[None, start:start + SIGNATURE_CHUNK_SIZE]
+                values = ((a * chunk + b) >> np.uint64(32)).astype(np.uint32)
+                np.minimum(signature, values.min(axis=1), out=signature)
+        return signature
+
+    def text_signature(self, text, size=SHINGLE_SIZE):
+        return self.signature(shingle_hashes(text, size))
+
+
+def estimate_similarity(signature, other):
+    """
+    用两个签名相同位置相等的比例估计Jaccard相似度。
+    """
+    return float(np.count_nonzero(signature == other)) / len(signature)
+
+
+class NearDuplicateIndex:
+    """
+    基于SQLite的MinHash LSH索引：签名分成bands段，每段的哈希作为桶，同一个桶中的文档是候选，
+    再用签名估计相似度，不低于threshold的记为近似重复。
+
+    插入和查询只访问bands个桶，不和所有文档两两比较；索引保存在文件中，新增的文档直接插入，
+    已经插入的文档不需要重新计算。
+    """
+
+    # 每个桶最多取多少个候选。大量完全相同的文档落在同一个桶中时，只要和其中一部分连上就能合并成同一个簇
+    max_candidates = 100
+
+    def __init__(self, path, num_perm=128, bands=16, threshold=0.8, seed=1):
+        """
+        参数:
+        path (str): 索引文件路径。
+        num_perm (int): 签名长度，必须能被bands整除。
+        bands (int): LSH的段数，段数越多召回越高、候选越多。
+        threshold (float): 估计的Jaccard相似度不低于这个值时记为近似重复。
+        seed (int): MinHash的随机种子。
+
+        已有的索引文件使用创建时的num_perm、bands和seed，和参数不一致时抛出ValueError。
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm必须能被bands整除")
+        self.path = path
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "key TEXT PRIMARY KEY, signature BLOB NOT NULL, length INTEGER NOT NULL, stamp TEXT NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (band INTEGER NOT NULL, bucket INTEGER NOT NULL, key TEXT NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS buckets_band_bucket ON buckets (band, bucket)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS buckets_key ON buckets (key)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS duplicates (key TEXT NOT NULL, other TEXT NOT NULL, similarity REAL NOT NULL, "
+            "PRIMARY KEY (key, other))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS duplicates_other ON duplicates (other)")
+
+        settings = {"num_perm": str(num_perm), "bands": str(bands), "seed": str(seed), "index_id": uuid.uuid4().hex}
+        self.connection.executemany("INSERT OR IGNORE INTO meta (name, value) VALUES (?, ?)", settings.items())
+        self.connection.commit()
+        stored = dict(self.connection.execute("SELECT name, value FROM meta"))
+        for name in ("num_perm", "bands", "seed"):
+            if stored[name] != settings[name]:
+                raise ValueError(f"索引 {path} 的{name}为{stored[name]}，和参数{settings[name]}不一致")
+
+        # 索引文件删除重建后id会变，用它作为输入哈希的一部分，重建后所有文档重新插入
+        self.index_id = stored["index_id"]
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.minhasher = MinHasher(num_perm, seed)
+
+    def band_buckets(self, signature):
+        """
+        每一段签名的哈希（有符号64位整数，直接作为SQLite的INTEGER）。
+        """
+        buckets = []
+        for band in range(self.bands):
+            digest = hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8).digest()
+            buckets.append(int.from_bytes(digest, "big", signed=True))
+        return buckets
+
+    def _remove(self, key):
+        self.connection.execute("DELETE FROM documents WHERE key = ?", (key,))
+        self.connection.execute("DELETE FROM buckets WHERE key = ?", (key,))
+        self.connection.execute("DELETE FROM duplicates WHERE key = ? OR other = ?", (key, key))
+
+    def insert(self, key, text, stamp=""):
+        """
+        插入（或者更新）一个文档，并记录它和已有文档之间的近似重复关系。
+
+        参数:
+        key (str): 文档标识。
+        text (str): 预处理后的文本。
+        stamp (str): 文件的版本（例如大小和修改时间），用stamp判断文件是否需要重新插入，默认为空。
+
+        返回:
+        matches (list): 近似重复的 (key, similarity) 列表。
+        """
+        # 签名在锁外计算，多个线程可以同时计算
+        hashes = shingle_hashes(text)
+        signature = self.minhasher.signature(hashes)
+        # 空文本不放入任何桶，否则所有空文本都会互相重复
+        buckets = self.band_buckets(signature) if len(hashes) else []
+
+        with self.lock:
+            self._remove(key)
+            candidates = set()
+            for band, bucket in enumerate(buckets):
+                candidates.update(candidate for candidate, in self.connection.execute(
+                    "SELECT key FROM buckets WHERE band = ? AND bucket = ? LIMIT ?", (band, bucket, self.max_candidates)
+                ))
+
+            matches = []
+            for other in sorted(candidates):
+                row = self.connection.execute("SELECT signature FROM documents WHERE key = ?", (other,)).fetchone()
+                similarity = estimate_similarity(signature, np.frombuffer(row[0], dtype=np.uint32))
+                if similarity >= self.threshold:
+                    matches.append((other, similarity))
+
+            self.connection.execute(
+                "INSERT INTO documents (key, signature, length, stamp) VALUES (?, ?, ?, ?)",
+                (key, signature.tobytes(), len(text), stamp)
+            )
+            self.connection.executemany(
+                "INSERT INTO buckets (band, bucket, key) VALUES (?, ?, ?)",
+                [(band, bucket, key) for band, bucket in enumerate(buckets)],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO duplicates (key, other, similarity) VALUES (?, ?, ?)",
+                [(key, other, similarity) for other, similarity in matches],
+            )
+        return matches
+
+    def stamp(self, key):
+        """
+        返回插入时的stamp，文档不在索引中时返回None。
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT stamp FROM documents WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def clusters(self, keys=None):
+        """
+        用并查集把近似重复关系合并成簇。每个簇中文本最长的文档（例如带解析的版本）作为保留的文档，
+        长度相同时取标识最小的。
+
+        参数:
+        keys (iterable): 只考虑这些文档，默认为索引中的所有文档。
+
+        返回:
+        clusters (list): 至少有两个文档的簇，每个为 {"canonical", "duplicates": [{"key", "similarity"}]}，
+            similarity为和保留文档的估计相似度，按canonical排序。
+        """
+        with self.lock:
+            lengths = dict(self.connection.execute("SELECT key, length FROM documents"))
+            edges = self.connection.execute("SELECT key, other FROM duplicates").fetchall()
+        if keys is not None:
+            keys = set(keys)
+            lengths = {key: length for key, length in lengths.items() if key in keys}
+
+        parents = {}
+
+        def find(key):
+            root = key
+            while parents.get(root, root) != root:
+                root = parents[root]
+            while key != root:
+                parents[key], key = root, parents.get(key, key)
+            return root
+
+        for key, other in edges:
+            if key in lengths and other in lengths:
+                root, other_root = find(key), find(other)
+                if root != other_root:
+                    parents[max(root, other_root)] = min(root, other_root)
+
+        members = {}
+        for key in lengths:
+            members.setdefault(find(key), []).append(key)
+
+        clusters = []
+        for group in members.values():
+            if len(group) < 2:
+                continue
+            canonical = min(group, key=lambda key: (-lengths[key], key))
+            with self.lock:
+                canonical_signature = self._signature(canonical)
+                duplicates = [
+                    {"key": key, "similarity": round(estimate_similarity(canonical_signature, self._signature(key)), 4)}
+                    for key in sorted(group) if key != canonical
+                ]
+            clusters.append({"canonical": canonical, "duplicates": duplicates})
+        clusters.sort(key=lambda cluster: cluster["canonical"])
+        return clusters
+
+    def _signature(self, key):
+        row = self.connection.execute("SELECT signature FROM documents WHERE key = ?", (key,)).fetchone()
+        return np.frombuffer(row[0], dtype=np.uint32)
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
+def write_clusters(clusters, output_file):
+    """
+    把簇写入JSON lines清单，每行一个簇，先写临时文件再替换。
+    """
+    with open(output_file + ".tmp", "w", encoding="utf-8") as file:
+        for cluster in clusters:
+            file.write(json.dumps(cluster, ensure_ascii=False) + "\n")
+    os.replace(output_file + ".tmp", output_file)
+
+
+def load_duplicate_keys(cluster_file):
+    """
+    读取簇清单，返回需要跳过的文档（每个簇中除了保留文档以外的文档）。清单不存在时返回空集合。
+    """
+    duplicate_keys = set()
+    if not os.path.exists(cluster_file):
+        return duplicate_keys
+    with open(cluster_file, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                duplicate_keys.update(duplicate["key"] for duplicate in json.loads(line)["duplicates"])
+    return duplicate_keys
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用MinHash LSH找出近似重复的markdown试卷，输出簇清单")
+    parser.add_argument('--markdown_dir', required=True, type=str, help="markdown文件夹")
+    parser.add_argument('--index', default='near_duplicates.sqlite', type=str, help="索引文件路径，再次运行时只插入新增或修改过的文件")
+    parser.add_argument('--output', default='near_duplicates.jsonl', type=str, help="簇清单的保存路径")
+    parser.add_argument('--threshold', default=0.8, type=float, help="估计的Jaccard相似度不低于这个值时记为近似重复")
+    parser.add_argument('--num_perm', default=128, type=int, help="MinHash签名长度")
+    parser.add_argument('--bands', default=16, type=int, help="LSH的段数")
+
+    args = parser.parse_args()
+
+    from paper_markdown_text_classifier import one_text_pre_process
+
+    try:
+        index = NearDuplicateIndex(args.index, args.num_perm, args.bands, args.threshold)
+    except ValueError as e:
+        parser.error(str(e))
+
+    inserted_count = 0
+    keys = []
+    for markdown_path in sorted(glob.glob(os.path.join(args.markdown_dir, "*.md"))):
+        key = os.path.basename(markdown_path)
+        keys.append(key)
+        # 文件大小和修改时间都没变时不再重新插入
+        stat = os.stat(markdown_path)
+        stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+        if index.stamp(key) == stamp:
+            continue
+        with open(markdown_path, "r", encoding="utf-8") as file:
+            index.insert(key, one_text_pre_process(file.read()), stamp)
+        inserted_count += 1
+    index.commit()
+
+    clusters = index.clusters(keys)
+    index.close()
+    write_clusters(clusters, args.output)
+    print(f"插入 {inserted_count}，共 {len(keys)} 个文件，{len(clusters)} 个簇，"
+          f"{sum(len(cluster['duplicates']) for cluster in clusters)} 个重复文件", file=sys.stderr)
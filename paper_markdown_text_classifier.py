@@ -1,13 +1,52 @@
-import joblib
+# joblib、jieba、requests和tqdm导入都很慢，只在用到的函数中导入，参数错误时不用等待
 import re
-import jieba
+import sys
+import json
 import argparse
 import os   
 import glob
-import requests
-from tqdm import tqdm
+import time
 import shutil
-from docx import Document
+import hashlib
+import multiprocessing
+from token_cache import TokenCache
+# chinese_tokenizer从这里导出：notebook训练的模型按 __main__.chinese_tokenizer 保存分词函数
+from tokenizer import chinese_tokenizer, set_token_cache
+from docx_record import DocxRecordCache, load_record
+from profiling import profiler, add_profile_arguments, profile_from_args
+
+
+# 图片字符串，例如 ![](media/image1.png){width="1in" height="1in"}
+IMAGE_STRING_PATTERN = re.compile(r"!\[(.*?)\]\(.*?\)\{width=\".*?\" height=\".*?\"\}|!\[.*?\]\(.*?\)|\[.*?\]\{.*?\}")
+
+# 噪声字符
+NOISE_CHARACTER_PATTERN = re.compile(r"[>*|image|data|media|png]")
+
+# str.splitlines认为是换行的字符
+LINE_BREAK_CHARACTERS = "\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"
+
+# 和IMAGE_STRING_PATTERN相同，只是"."不跨越任何换行字符，可以直接作用于整篇文本
+DOCUMENT_IMAGE_STRING_PATTERN = re.compile(
+    IMAGE_STRING_PATTERN.pattern.replace(".", f"[^{LINE_BREAK_CHARACTERS}]")
+)
+
+# 把所有换行统一成"\n"
+LINE_BREAK_PATTERN = re.compile(f"\r\n|[{LINE_BREAK_CHARACTERS[1:]}]")
+
+# 空行或者只有">"的行（strip之后），连同后面的换行一起删除
+BLANK_LINE_PATTERN = re.compile(r"^[^\S\n]*>?[^\S\n]*(?:\n|\Z)", re.MULTILINE)
+
+# 删除噪声字符的转换表，和NOISE_CHARACTER_PATTERN的字符集相同
+NOISE_CHARACTER_TABLE = str.maketrans("", "", ">*|imagedtpn")
+
+# 预测为试卷的文件放到输出目录的方式，manifest只把路径记录到输出目录下的accepted.jsonl
+OUTPUT_MODES = ["copy", "hardlink", "symlink", "reflink", "auto", "manifest"]
+
+# Linux的FICLONE ioctl，用于reflink
+FICLONE = 0x40049409
+
+# 以前的版本把模型下载到当前目录下的这个文件，存在时导入模型缓存，不再重新下载
+LEGACY_MODEL_FILE = "TextClassifier.pkl"
 
 
 def remove_image_string(input_string):
@@ -20,8 +59,7 @@ def remove_image_string(input_string):
     返回:
     result (str): 移除图片字符串后的结果。
     """
-    pattern = r"!\[(.*?)\]\(.*?\)\{width=\".*?\" height=\".*?\"\}|!\[.*?\]\(.*?\)|\[.*?\]\{.*?\}"
-    result = re.sub(pattern, "", input_string)
+    result = IMAGE_STRING_PATTERN.sub("", input_string)
     return result
 
 
@@ -35,32 +73,32 @@ def remove_noise_character(input_string):
     返回:
     result (str): 移除噪声字符后的结果。
     """
-    pattern = r"[>*|image|data|media|png]"
-    return re.sub(pattern, "", input_string)
+    return NOISE_CHARACTER_PATTERN.sub("", input_string)
 
 
 def one_text_pre_process(text):
     """
-    对单个文本进行预处理。
+    对单个文本进行预处理。整篇文本一次处理，不再逐行调用re.sub，
+    结果和逐行执行remove_image_string、去掉空行、remove_noise_character完全一致。
     
     参数:
     text (str): 需要预处理的文本。
     
     返回:
-    precessed_text_split_lines (str): 预处理后的文本。
+    precessed_text (str): 预处理后的文本。
     """
-    precessed_text_split_lines = []
-    
-    for line in text.splitlines():
-        remove_image_line = remove_image_string(line)
+    if "[" in text:
+        text = DOCUMENT_IMAGE_STRING_PATTERN.sub("", text)
 
-        if remove_image_line.strip() in ["", ">"]:
-            continue
+    text = LINE_BREAK_PATTERN.sub("\n", text)
+    text = BLANK_LINE_PATTERN.sub("", text)
 
-        remove_image_line = remove_noise_character(remove_image_line)
-        precessed_text_split_lines.append(remove_image_line)
-        
-    return "\n".join(precessed_text_split_lines)
+    # 删除空行之后最多剩下一个结尾的换行
+    if text.endswith("\n"):
+        text = text[:-1]
+
+    precessed_text = text.translate(NOISE_CHARACTER_TABLE)
+    return precessed_text
 
 
 def pre_process(text_list):
@@ -91,20 +129,6 @@ def dataset_map_pre_process(row):
     return row
 
 
-def chinese_tokenizer(text):
-    """
-    对中文文本进行分词。
-    
-    参数:
-    text (str): 需要分词的文本。
-    
-    返回:
-    tokens (list): 分词后的词语列表。
-    """
-    tokens = jieba.cut(text)
-    return list(tokens)
-
-
 def predict_with_threshold(model, X, threshold=0.5):
     """
     对模型进行带阈值的预测。
@@ -117,7 +141,8 @@ def predict_with_threshold(model, X, threshold=0.5):
     返回:
     predictions (array-like): 预测结果。
     """
-    probabilities = model.predict_proba(X)
+    with profiler.timer("predict_proba"):
+        probabilities = model.predict_proba(X)
     positive_probabilities = probabilities[:, 1]
     predictions = (positive_probabilities > threshold).astype(int)
     return predictions
@@ -154,153 +179,701 @@ def get_file_content(file_local):
         return f.read()
 
 
-def download_model(*, model_name, download_url):
+# docx中间记录的缓存，由set_record_cache设置，为None时每次都解析docx
+_record_cache = None
+
+
+def set_record_cache(record_cache):
     """
-    从指定的URL下载模型并使用给定的模型名称保存。
+    设置extract_text_from_docx使用的docx记录缓存。
 
-    参数：
-        model_name (str): 要下载的模型的名称。
-        download_url (str): 要下载模型的URL。
+    参数:
+    record_cache (DocxRecordCache or None): 记录缓存，为None时关闭缓存。
     """
+    global _record_cache
+    _record_cache = record_cache
 
-    # 检查模型是否已存在
-    if os.path.exists(model_name):
-        return
 
-    temp_model_name = model_name + ".tmp"
+def extract_text_from_docx(file_path):
+    """
+    解析一个docx中的文字，没有图片标签等噪点。
+    使用docx_record流式解析，结果和python-docx逐段落拼接相同；设置了记录缓存时，转换阶段已经解析过的文件不再重复解析。
+    """
+    return load_record(file_path, _record_cache)["text"]
 
-    # 检查是否存在临时模型文件
-    if os.path.exists(temp_model_name):
-        initial_position = os.path.getsize(temp_model_name)
-    else:
-        initial_position = 0
 
+def detect_language(text, chinese_threshold=0.5, english_threshold=0.5):
+    """
+    解析一段文字是否为中文，返回 'Chinese'、'English' 或 'Unknown'。
+
+    用language_profile按块统计中文和英文字母的数量，比例已经确定时不再统计剩下的部分。
+    默认阈值和原来一样按中文和英文字母哪个多来判断，详见profile_language。
+    """
+    from language_profile import profile_language
+
+    return profile_language(text, chinese_threshold, english_threshold)["language"]
+
+
+def prepare_docx_text(file_path):
+    """
+    解析docx并做预处理，解析失败或者不是中文时返回None。
+
+    参数:
+    file_path (str): docx文件路径。
+
+    返回:
+    text (str or None): 预处理后的文本。
+    """
     try:
-        # 设置请求头部信息，用于断点续传
-        headers = {'Range': f'bytes={initial_position}-'}
-        response = requests.get(download_url, headers=headers, stream=True)
+        # 这个库大文件偶尔会报错/
+        with profiler.timer("docx-record", file_path):
+            docx_text = extract_text_from_docx(file_path)
+    except:
+        return None
 
-        # 检查响应的状态码
-        response.raise_for_status()
+    with profiler.timer("preprocess"):
+        # 如果不是中文
+        if detect_language(docx_text) != "Chinese":
+            return None
+        return one_text_pre_process(docx_text)
 
-        # 从响应头部信息获取总文件大小
-        total_size = int(response.headers.get('content-range').split('/')[1])
 
-        # 创建进度条并设置初始值为已下载的文件大小
-        progress_bar = tqdm(total=total_size, unit='iB', unit_scale=True, initial=initial_position)
+# 子进程中使用的模型和阈值，由init_predict_worker设置
+_worker_model = None
+_worker_threshold = 0.5
 
-        with open(temp_model_name, 'ab') as f:
-            for data in response.iter_content(chunk_size=1024):
-                progress_bar.update(len(data))
-                f.write(data)
 
-        progress_bar.close()
+def init_predict_worker(model, threshold, token_cache=None, profile=False, profile_files=None, record_cache=None):
+    """
+    初始化预测子进程。fork方式启动时模型直接继承自父进程，不会重新加载。
 
-        # 检查下载是否完成
-        if total_size != 0 and progress_bar.n != total_size:
-            print("错误：下载过程中出现问题。")
+    参数:
+    model (object): 需要预测的模型。
+    threshold (float): 预测阈值。
+    token_cache (TokenCache): 分词缓存，默认为None。每个进程各自打开数据库连接。
+    profile (bool): 是否在子进程中记录各阶段耗时，默认为False。
+    profile_files (str): 每个文件耗时的JSON lines文件，默认为None。
+    record_cache (DocxRecordCache): docx记录缓存，默认为None。
+    """
+    global _worker_model, _worker_threshold
+    _worker_model = model
+    _worker_threshold = threshold
+    set_token_cache(token_cache)
+    set_record_cache(record_cache)
+    if profile:
+        if not profiler.enabled:
+            profiler.enable(file_log_path=profile_files)
+        # fork时会继承主进程已有的统计，清空后只返回子进程自己的
+        profiler.drain()
+
+
+def predict_docx_batch(file_batch):
+    """
+    对一批docx文件进行解析、预处理和预测。docx解析、预处理和jieba分词都在子进程中完成，
+    predict_proba对整批文本只调用一次。
 
-        # 将临时模型文件重命名为指定的模型名称
-        os.rename(temp_model_name, model_name)
-    except:
-        # 如果出现异常，抛出异常并中断下载过程
-        raise
+    参数:
+    file_batch (list): (源文件, 目标文件) 元组列表。
 
+    返回:
+    accepted (list): 预测为试卷的 (源文件, 目标文件) 元组列表，顺序与输入一致。
+    """
+    texts = []
+    candidates = []
+    for relative_file, target_file in file_batch:
+        text = prepare_docx_text(relative_file)
+        if text is None:
+            continue
+        texts.append(text)
+        candidates.append((relative_file, target_file))
 
-def extract_text_from_docx(file_path):
+    if not texts:
+        return []
+
+    predictions = predict_with_threshold(_worker_model, texts, _worker_threshold)
+
+    # 0/1 => False/True
+    return [candidate for candidate, predict in zip(candidates, predictions) if predict]
+
+
+def predict_docx_batch_with_input(file_batch):
     """
-    解析一个docx中的文字，没有图片标签等噪点
+    和predict_docx_batch相同，同时返回输入的这一批文件，主进程不用保留所有的批次就能和结果对应。
     """
-    doc = Document(file_path)
-    text = ''
-    for paragraph in doc.paragraphs:
-        text += paragraph.text + ' '
-    return text
+    return file_batch, predict_docx_batch(file_batch)
 
 
-def detect_language(text):
+def profiled_predict_docx_batch(file_batch):
     """
-    解析一段文字是否为中文
+    和predict_docx_batch_with_input相同，同时返回子进程中记录的各阶段耗时，由主进程合并。
     """
-    chinese_count = 0
-    english_count = 0
-    
-    for char in text:
-        if '\u4e00' <= char <= '\u9fff':
-            chinese_count += 1
-        elif 'a' <= char.lower() <= 'z':
-            english_count += 1
-            
-    if chinese_count > english_count:
-        return 'Chinese'
-    elif english_count > chinese_count:
-        return 'English'
-    else:
-        return 'Unknown'
+    return predict_docx_batch_with_input(file_batch), profiler.drain()
 
 
-def move_files(input_dir, output_dir, threshold, model):
-    if os.path.exists(input_dir) == False:
-        raise ValueError('输入目录不存在')
-    if os.path.abspath(input_dir) == os.path.abspath(output_dir):
-        raise ValueError('输入目录和输出目录不能相同')
+def parse_shard(shard):
+    """
+    解析 "i/N" 形式的分片参数，i从0开始。
 
-    os.makedirs(output_dir, exist_ok=True)
-    
+    返回:
+    shard (tuple): (i, N)。
+    """
+    try:
+        index, count = (int(value) for value in shard.split("/"))
+    except ValueError:
+        raise ValueError(f'分片参数的格式应为i/N：{shard}')
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f'分片参数需要满足0 <= i < N：{shard}')
+    return index, count
+
+
+def shard_of(relative_path, shard_count):
+    """
+    根据相对路径的哈希值计算文件所属的分片。不依赖Python的hash随机种子，在不同机器上结果相同。
+
+    参数:
+    relative_path (str): 相对于输入目录的路径。
+    shard_count (int): 分片数量。
+
+    返回:
+    shard_index (int): 分片编号。
+    """
+    digest = hashlib.blake2b(relative_path.replace("\\", "/").encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+def iter_docx_files(input_dir, output_dir, shard=None, published_targets=None):
+    """
+    遍历输入目录下所有docx文件，跳过输出目录中已经存在的文件。
+
+    参数:
+    input_dir (str): 输入目录。
+    output_dir (str): 输出目录。
+    shard (tuple): (i, N)，只返回属于第i个分片的文件，默认为None即返回所有文件。
+    published_targets (set): 只记录清单（manifest输出方式）时已经记录过的目标路径，同样跳过。
+
+    返回:
+    generator: (源文件, 目标文件) 元组。
+    """
     # 文件名后缀
     file_pattern = ".docx"
 
     # 遍历一个文件夹下所有docx文件
     for root, _, files in (os.walk(input_dir)):
-        for file in tqdm(files):
+        for file in files:
 
             if not file.endswith(file_pattern):
                 continue
-            
+
             # 获取相对于输入目录的路径
             relative_file = os.path.join(root, file)
-           
+
             # widnwos下的目录和ubuntu不一样
             if "\\" in relative_file:
                 relative_file = relative_file.replace("\\","/")
 
+            if shard is not None and shard_of(os.path.relpath(relative_file, input_dir), shard[1]) != shard[0]:
+                continue
+
             target_file = os.path.join(output_dir, relative_file.split("/")[-1])
-            if os.path.exists(target_file):
+            if os.path.exists(target_file) or (published_targets is not None and target_file in published_targets):
                 continue
 
+            yield relative_file, target_file
+
+
+def iter_batches(items, batch_size):
+    """
+    将一个可迭代对象按batch_size切分成列表。
+
+    参数:
+    items (iterable): 需要切分的对象。
+    batch_size (int): 每批的数量。
+
+    返回:
+    generator: 每批的列表。
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def merge_profiles(results):
+    for result, stages in results:
+        profiler.merge(stages)
+        yield result
+
+
+def check_move_arguments(input_dir, output_dir, batch_size=1, workers=1):
+    """
+    检查move_files的参数，在加载模型之前调用，参数错误时马上退出。
+    """
+    if os.path.exists(input_dir) == False:
+        raise ValueError('输入目录不存在')
+    if os.path.abspath(input_dir) == os.path.abspath(output_dir):
+        raise ValueError('输入目录和输出目录不能相同')
+    if batch_size < 1:
+        raise ValueError('batch_size必须大于0')
+    if workers < 1:
+        raise ValueError('workers必须大于0')
+
+
+def reflink_file(source_file, target_file):
+    """
+    在支持的文件系统（btrfs、xfs等）上用FICLONE创建共享数据块的副本，不占用额外空间。
+    不支持时抛出OSError。
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError('当前系统不支持reflink')
+
+    with open(source_file, 'rb') as source, open(target_file, 'wb') as target:
+        fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+
+
+def link_file(source_file, target_file, mode):
+    """
+    创建硬链接或者符号链接，目标已经存在时抛出FileExistsError。
+    """
+    if mode == "hardlink":
+        os.link(source_file, target_file)
+    else:
+        os.symlink(os.path.abspath(source_file), target_file)
+
+
+def publish_file(source_file, target_file, mode="copy"):
+    """
+    把文件放到目标路径，目标已经存在时不覆盖。多个分片同时写同一个输出目录时，同名文件只有一个会成功，
+    也不会留下复制了一半的文件。
+
+    参数:
+    source_file (str): 源文件。
+    target_file (str): 目标路径。
+    mode (str): copy（复制）、hardlink（硬链接）、symlink（符号链接）、reflink（共享数据块的副本），
+        或者auto（依次尝试reflink、hardlink）。链接或reflink失败时（例如跨文件系统）退回到复制。
+
+    返回:
+    bool: 是否成功放到目标路径。
+    """
+    # 链接本身就是原子的，目标存在时失败
+    if mode in ("hardlink", "symlink"):
+        try:
+            link_file(source_file, target_file, mode)
+            return True
+        except FileExistsError:
+            return False
+        except OSError:
+            pass
+
+    # 其他方式先写临时文件再硬链接到目标路径
+    temp_file = f"{target_file}.{os.getpid()}.tmp"
+    try:
+        reflinked = False
+        if mode in ("reflink", "auto"):
             try:
-                # 这个库大文件偶尔会报错/
-                docx_text = extract_text_from_docx(relative_file)
-                # 如果不是中文
-                if detect_language(docx_text) != "Chinese":
+                reflink_file(source_file, temp_file)
+                reflinked = True
+            except OSError:
+                pass
+
+        if not reflinked:
+            if mode == "auto":
+                try:
+                    link_file(source_file, target_file, "hardlink")
+                    return True
+                except FileExistsError:
+                    return False
+                except OSError:
+                    pass
+            shutil.copy(source_file, temp_file)
+
+        try:
+            os.link(temp_file, target_file)
+        except FileExistsError:
+            return False
+        except OSError:
+            # 不支持硬链接的文件系统
+            if os.path.exists(target_file):
+                return False
+            os.replace(temp_file, target_file)
+        return True
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def shard_manifest_path(shard_dir, shard):
+    return os.path.join(shard_dir, f"manifest-{shard[0]}-of-{shard[1]}.jsonl")
+
+
+def merge_shard_manifests(shard_dir, output_file):
+    """
+    合并所有分片的结果清单。每个分片完成后会写一个.done文件，有分片没有完成时抛出异常。
+    同一个文件出现多次（分片重新运行过）时以最后一次为准，结果按源文件排序。
+
+    参数:
+    shard_dir (str): 分片清单所在的目录。
+    output_file (str): 合并后的清单路径（JSON lines）。
+
+    返回:
+    summary (dict): 分片数、文件数、试卷数和复制的文件数。
+    """
+    manifests = sorted(glob.glob(os.path.join(shard_dir, "manifest-*-of-*.jsonl")))
+    if not manifests:
+        raise ValueError(f'{shard_dir} 中没有分片清单')
+
+    shard_counts = {int(os.path.basename(path)[:-len(".jsonl")].rsplit("-", 1)[1]) for path in manifests}
+    if len(shard_counts) != 1:
+        raise ValueError(f'{shard_dir} 中有不同分片数量的清单：{sorted(shard_counts)}')
+    shard_count = shard_counts.pop()
+
+    missing = [index for index in range(shard_count)
+               if not os.path.exists(shard_manifest_path(shard_dir, (index, shard_count))[:-len(".jsonl")] + ".done")]
+    if missing:
+        raise ValueError(f'以下分片还没有完成：{missing}')
+
+    records = {}
+    for index in range(shard_count):
+        with open(shard_manifest_path(shard_dir, (index, shard_count)), "r", encoding="utf-8") as file:
+            for line in file:
+                record = json.loads(line)
+                records[record["source"]] = record
+
+    temp_file = output_file + ".tmp"
+    with open(temp_file, "w", encoding="utf-8") as file:
+        for source in sorted(records):
+            file.write(json.dumps(records[source], ensure_ascii=False) + "\n")
+    os.replace(temp_file, output_file)
+
+    return {
+        "shards": shard_count,
+        "files": len(records),
+        "papers": sum(record["is_paper"] for record in records.values()),
+        "copied": sum(record["copied"] for record in records.values()),
+    }
+
+
+def move_files(input_dir, output_dir, threshold, model, batch_size=1, workers=1, token_cache=None, shard=None, shard_dir=None, output_mode="copy", record_cache=None):
+    """
+    将输入目录中预测为试卷的docx文件复制（或者链接）到输出目录。
+
+    参数:
+    input_dir (str): 输入目录。
+    output_dir (str): 输出目录。
+    threshold (float): 预测阈值。
+    model (object): 需要预测的模型。
+    batch_size (int): 每批预测的文件数量，默认为1。
+    workers (int): 解析和预测的进程数量，默认为1即在当前进程中顺序执行。
+    token_cache (TokenCache): 分词缓存，默认为None。
+    shard (tuple): (i, N)，只处理第i个分片的文件，默认为None即处理所有文件。
+    shard_dir (str): 分片结果清单的目录，默认为输出目录下的.shards。
+    output_mode (str): 文件放到输出目录的方式，见OUTPUT_MODES，默认为copy。
+        manifest时不写任何docx，只把 {"source", "target"} 追加到输出目录下的accepted.jsonl（分片时为accepted-i-of-N.jsonl）。
+    record_cache (DocxRecordCache): docx记录缓存，默认为None。
+    """
+    from tqdm import tqdm
+
+    check_move_arguments(input_dir, output_dir, batch_size, workers)
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f'output_mode必须是{"/".join(OUTPUT_MODES)}之一')
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 只记录清单时，已经记录过的目标路径相当于已经存在的文件
+    accepted_list = None
+    published_targets = None
+    if output_mode == "manifest":
+        published_targets = set()
+        for path in glob.glob(os.path.join(output_dir, "accepted*.jsonl")):
+            with open(path, "r", encoding="utf-8") as file:
+                published_targets.update(json.loads(line)["target"] for line in file if line.strip())
+        accepted_name = "accepted.jsonl" if shard is None else f"accepted-{shard[0]}-of-{shard[1]}.jsonl"
+        accepted_list = open(os.path.join(output_dir, accepted_name), "a", encoding="utf-8")
+
+    # 分片时每个分片把处理过的文件记录到自己的清单中，最后用merge_shard_manifests合并
+    manifest = None
+    if shard is not None:
+        shard_dir = shard_dir or os.path.join(output_dir, ".shards")
+        os.makedirs(shard_dir, exist_ok=True)
+        manifest_path = shard_manifest_path(shard_dir, shard)
+        done_path = manifest_path[:-len(".jsonl")] + ".done"
+        if os.path.exists(done_path):
+            os.remove(done_path)
+        manifest = open(manifest_path, "a", encoding="utf-8")
+
+    batches = iter_batches(iter_docx_files(input_dir, output_dir, shard, published_targets), batch_size)
+    progress_bar = tqdm(unit='file')
+    file_count = 0
+    paper_count = 0
+
+    if workers == 1:
+        init_predict_worker(model, threshold, token_cache, record_cache=record_cache)
+        pool = None
+        results = map(predict_docx_batch_with_input, batches)
+    else:
+        pool = multiprocessing.Pool(workers, initializer=init_predict_worker, initargs=(model, threshold, token_cache, profiler.enabled, profiler.file_log_path, record_cache))
+        # 批次直接交给imap，一边遍历目录一边预测，不用等整个目录遍历完，结果中带有对应的批次
+        if profiler.enabled:
+            results = merge_profiles(pool.imap(profiled_predict_docx_batch, batches))
+        else:
+            results = pool.imap(predict_docx_batch_with_input, batches)
+
+    try:
+        # imap保持输入顺序，复制顺序和顺序执行时一致
+        for batch, accepted in results:
+            copied = set()
+            for relative_file, target_file in accepted:
+                # 不同目录下的同名文件只保留第一个
+                if os.path.exists(target_file):
                     continue
-            except:
-                continue
+                if accepted_list is not None:
+                    if target_file in published_targets:
+                        continue
+                    published_targets.add(target_file)
+                    accepted_list.write(json.dumps({"source": relative_file, "target": target_file}, ensure_ascii=False) + "\n")
+                    copied.add(relative_file)
+                elif publish_file(relative_file, target_file, output_mode):
+                    copied.add(relative_file)
+            if accepted_list is not None:
+                accepted_list.flush()
+
+            if manifest is not None:
+                accepted_files = {relative_file for relative_file, _ in accepted}
+                for relative_file, target_file in batch:
+                    manifest.write(json.dumps({
+                        "source": relative_file,
+                        "target": target_file,
+                        "is_paper": relative_file in accepted_files,
+                        "copied": relative_file in copied,
+                    }, ensure_ascii=False) + "\n")
+                manifest.flush()
+            file_count += len(batch)
+            paper_count += len(accepted)
+            progress_bar.update(len(batch))
+    finally:
+        progress_bar.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if manifest is not None:
+            manifest.close()
+        if accepted_list is not None:
+            accepted_list.close()
+
+    if manifest is not None:
+        with open(done_path, "w", encoding="utf-8") as file:
+            json.dump({"shard": shard[0], "count": shard[1], "files": file_count, "papers": paper_count, "finished": time.time()}, file)
+
+
+def preload_jieba(cache_file=None):
+    """
+    提前加载jieba词典。fork出来的子进程直接继承已经加载的词典，不用各自再加载一次。
+
+    参数:
+    cache_file (str): jieba词典缓存文件路径，默认在系统临时目录中。放在持久的路径下，
+        多个短任务可以共用同一个缓存，不用每次重新构建。
+    """
+    import jieba
+
+    if cache_file:
+        jieba.dt.cache_file = os.path.abspath(cache_file)
+    jieba.initialize()
+
+
+def load_model(model_url, model_path=None, compact_model=None, model_dir=None, model_sha256=None, offline=False, verify_model=False):
+    """
+    加载模型：紧凑模型目录、本地joblib模型文件，或者本地模型缓存（model_registry.py）中的模型，缓存中没有时下载。
+    当前目录下有以前下载的 TextClassifier.pkl 时先导入缓存（给出model_sha256时校验），不再重新下载。
+
+    参数:
+    model_url (str): 模型下载链接。
+    model_path (str): 本地的joblib模型文件，默认为None。
+    compact_model (str): compact_model.py导出的紧凑模型目录，默认为None。
+    model_dir (str): 模型缓存目录，默认为 ~/.cache/exam_paper_models。
+    model_sha256 (str): 模型的sha256，给出时下载和使用缓存都会校验。
+    offline (bool): 只使用缓存中的模型，不联网。
+    verify_model (bool): 重新计算缓存中模型的sha256，默认只比较下载时记录的大小和修改时间。
+
+    返回:
+    model (object): 模型。
+    """
+    if compact_model:
+        from compact_model import CompactTextClassifier
+        return CompactTextClassifier(compact_model, tokenizer=chinese_tokenizer)
+
+    import joblib
+
+    if model_path:
+        return joblib.load(model_path)
+
+    from model_registry import ModelRegistry, DEFAULT_MODEL_DIR
+
+    registry = ModelRegistry(model_dir or DEFAULT_MODEL_DIR)
+    return joblib.load(registry.fetch(model_url, sha256=model_sha256, offline=offline, verify=verify_model, local_file=LEGACY_MODEL_FILE))
+
+
+def predict_files(model, file_paths, threshold=0.5):
+    """
+    预测一组docx文件，返回每个文件的得分。
+
+    参数:
+    model (object): 需要预测的模型。
+    file_paths (list): docx文件路径列表。
+    threshold (float): 预测阈值。
 
-            # 一个和多个文件速度没差
-            predict = predict_with_threshold(model, [one_text_pre_process(docx_text)], threshold)[0]
+    返回:
+    results (list): {"file": 文件, "score": 试卷的概率, "is_paper": 是否为试卷}，
+        解析失败或者不是中文的文件score为None，顺序与输入一致。
+    """
+    results = [{"file": file_path, "score": None, "is_paper": False} for file_path in file_paths]
+    texts = []
+    indexes = []
+    for index, file_path in enumerate(file_paths):
+        text = prepare_docx_text(file_path)
+        if text is not None:
+            texts.append(text)
+            indexes.append(index)
+
+    if texts:
+        with profiler.timer("predict_proba"):
+            probabilities = model.predict_proba(texts)[:, 1]
+        for index, probability in zip(indexes, probabilities):
+            results[index]["score"] = float(probability)
+            results[index]["is_paper"] = bool(probability > threshold)
+    return results
+
+
+def handle_request(model, threshold, line):
+    """
+    处理服务模式下的一行请求。请求可以是一个docx路径，或者JSON：{"files": [路径, ...], "threshold": 阈值（可选）}。
+
+    返回:
+    response (str): 一行JSON：{"results": [...]}，出错时为 {"error": 错误信息}。
+    """
+    line = line.strip()
+    try:
+        if line.startswith("{"):
+            request = json.loads(line)
+            results = predict_files(model, request["files"], request.get("threshold", threshold))
+        else:
+            results = predict_files(model, [line], threshold)
+        response = {"results": results}
+    except Exception as e:
+        response = {"error": repr(e)}
+    return json.dumps(response, ensure_ascii=False)
+
+
+def serve_stream(model, threshold, input_stream=sys.stdin, output_stream=sys.stdout):
+    """
+    服务模式：从input_stream逐行读取请求，每个请求输出一行结果，模型和jieba词典只加载一次。
+    """
+    for line in input_stream:
+        if not line.strip():
+            continue
+        output_stream.write(handle_request(model, threshold, line) + "\n")
+        output_stream.flush()
+
+
+def serve_socket(model, threshold, socket_path):
+    """
+    服务模式：在本地unix socket上接受连接，协议和serve_stream相同。连接按顺序处理。
+    """
+    import socketserver
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                line = line.decode("utf-8")
+                if not line.strip():
+                    continue
+                self.wfile.write((handle_request(model, threshold, line) + "\n").encode("utf-8"))
+                self.wfile.flush()
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    with socketserver.UnixStreamServer(socket_path, RequestHandler) as server:
+        print(f"正在监听 {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
 
-            # 0/1 => False/True
-            if predict:
-                shutil.copy(relative_file, target_file)
-   
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument('--input_dir', type=str, required=True, help="输入目录")
-    parser.add_argument('--output_dir', type=str, required=True, help="输出目录")
+    parser.add_argument('--input_dir', type=str, default=None, help="输入目录")
+    parser.add_argument('--output_dir', type=str, default=None, help="输出目录")
     parser.add_argument('--model_url', default="https://huggingface.co/datasets/ranWang/test_paper_textClassifier/resolve/main/TextClassifier-13m.pkl", type=str, help='模型下载链接')
+    parser.add_argument('--model_dir', default=None, type=str, help='模型缓存目录，默认为~/.cache/exam_paper_models（环境变量EXAM_PAPER_MODEL_DIR）')
+    parser.add_argument('--model_sha256', default=None, type=str, help='模型的sha256，下载和使用缓存时校验')
+    parser.add_argument('--offline', action='store_true', help='只使用缓存中的模型，不联网')
+    parser.add_argument('--verify_model', action='store_true', help='重新计算缓存中模型的sha256，默认只比较大小和修改时间')
     parser.add_argument('--threshold', default=0.5, type=float, help='预测阈值')
-    
-    args = parser.parse_args()
-
-    model_file_name = "TextClassifier.pkl"
-    download_model(model_name=model_file_name, download_url=args.model_url)
-    model = joblib.load(model_file_name)
-    print(args.input_dir)
-    move_files(args.input_dir, args.output_dir, args.threshold, model)
-
+    parser.add_argument('--batch_size', '--batch-size', default=1, type=int, help='每批预测的文件数量')
+    parser.add_argument('--workers', default=1, type=int, help='解析和预测的进程数量')
+    parser.add_argument('--token_cache', default=None, type=str, help='分词缓存文件路径，相同文本不再重复分词')
+    parser.add_argument('--token_cache_size', default=2048, type=int, help='分词缓存的最大大小(MB)')
+    parser.add_argument('--record_cache', default=None, type=str, help='docx中间记录的缓存目录（和pipeline.py、docx2markdown2.py共用），已经解析过的docx不再重复解析')
+    parser.add_argument('--compact_model', default=None, type=str, help='compact_model.py导出的紧凑模型目录，设置后不再下载和加载pkl模型')
+    parser.add_argument('--model_path', default=None, type=str, help='本地的joblib模型文件，例如hashing_classifier.py训练的模型，设置后不再下载模型')
+    parser.add_argument('--jieba_cache', default=None, type=str, help='jieba词典缓存文件路径，默认在系统临时目录中')
+    parser.add_argument('--serve', action='store_true', help='服务模式：加载一次模型，从标准输入（或--socket）逐行读取docx路径或JSON请求并输出预测结果')
+    parser.add_argument('--socket', default=None, type=str, help='服务模式下监听的unix socket路径，默认使用标准输入输出')
+    parser.add_argument('--shard', default=None, type=str, help='i/N：按路径哈希只处理第i个分片（i从0开始），多台机器各运行一个分片')
+    parser.add_argument('--shard_dir', default=None, type=str, help='分片结果清单的目录，默认为输出目录下的.shards')
+    parser.add_argument('--output_mode', default='copy', choices=OUTPUT_MODES, help='试卷放到输出目录的方式：copy、hardlink、symlink、reflink、auto（reflink或hardlink，不支持时复制），manifest只记录路径不写文件')
+    parser.add_argument('--merge_shards', action='store_true', help='合并所有分片的结果清单到输出目录下的manifest.jsonl，不做预测')
+    add_profile_arguments(parser)
 
+    args = parser.parse_args()
 
-            
+    if args.merge_shards:
+        if not args.output_dir:
+            parser.error('--merge_shards需要--output_dir')
+        try:
+            summary = merge_shard_manifests(args.shard_dir or os.path.join(args.output_dir, ".shards"), os.path.join(args.output_dir, "manifest.jsonl"))
+        except ValueError as e:
+            parser.error(str(e))
+        print(json.dumps(summary, ensure_ascii=False))
+        sys.exit(0)
+
+    # 先检查参数，再加载模型
+    shard = None
+    if not args.serve:
+        if not args.input_dir or not args.output_dir:
+            parser.error('需要--input_dir和--output_dir（或者使用--serve）')
+        try:
+            check_move_arguments(args.input_dir, args.output_dir, args.batch_size, args.workers)
+            if args.shard:
+                shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+
+    token_cache = None
+    if args.token_cache:
+        token_cache = TokenCache(args.token_cache, max_bytes=args.token_cache_size * 1024 ** 2)
+    set_token_cache(token_cache)
+    record_cache = DocxRecordCache(args.record_cache) if args.record_cache else None
+    set_record_cache(record_cache)
 
+    try:
+        model = load_model(args.model_url, args.model_path, args.compact_model, args.model_dir, args.model_sha256, args.offline, args.verify_model)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    preload_jieba(args.jieba_cache)
+
+    with profile_from_args(args):
+        if args.serve:
+            if args.socket:
+                serve_socket(model, args.threshold, args.socket)
+            else:
+                serve_stream(model, args.threshold)
+        else:
+            print(args.input_dir)
+            move_files(args.input_dir, args.output_dir, args.threshold, model, batch_size=args.batch_size, workers=args.workers, token_cache=token_cache, shard=shard, shard_dir=args.shard_dir, output_mode=args.output_mode, record_cache=record_cache)
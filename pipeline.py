@@ -0,0 +1,489 @@
+import os
+import csv
+import json
+import time
+import sqlite3
+import hashlib
+import zipfile
+import argparse
+import threading
+import importlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import zip2
+from keyword_matcher import compile_keywords
+from filename_analysis import normalize_file_name
+import docx2markdown2
+from docx_record import DocxRecordCache
+from near_duplicate import NearDuplicateIndex, write_clusters, load_duplicate_keys
+from profiling import profiler, add_profile_arguments, profile_from_args
+
+# 各阶段的脚本，文件名不是合法的模块名，用importlib导入
+filter_papers = importlib.import_module("过滤试卷")
+check_answers = importlib.import_module("判断是否有答案")
+split_papers = importlib.import_module("有答案试卷切分-对齐")
+
+
+STAGES = ["unzip", "convert", "filter", "dedup", "answers", "split", "align", "store"]
+
+# 默认运行的阶段。store每次重写整个语料库，不是增量的，需要时用 --stages 显式指定
+DEFAULT_STAGES = [stage for stage in STAGES if stage != "store"]
+
+INDEX_HEADER = ['original_filename', 'new_filename']
+
+
+class Manifest:
+    """
+    记录每个文件在每个阶段的处理结果，保存在SQLite中。
+
+    每条记录包含输入内容的哈希值、状态（done/failed）、结果、错误信息和耗时。
+    输入哈希值不变并且状态为done的文件在重新运行时会被跳过。
+    """
+
+    # 每写入多少条记录提交一次
+    commit_interval = 500
+
+    def __init__(self, path):
+        """
+        参数:
+        path (str): manifest文件路径。
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "stage TEXT NOT NULL, key TEXT NOT NULL, input_hash TEXT NOT NULL, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, elapsed REAL, updated REAL, PRIMARY KEY (stage, key))"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS file_hashes ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, hash TEXT NOT NULL)"
+        )
+        self.lock = threading.Lock()
+        self.pending = 0
+
+    def get(self, stage, key):
+        """
+        读取一个文件在某个阶段的记录。
+
+        参数:
+        stage (str): 阶段名称。
+        key (str): 文件标识。
+
+        返回:
+        record (tuple or None): (input_hash, status, result)，不存在时返回None。
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT input_hash, status, result FROM files WHERE stage = ? AND key = ?", (stage, key)
+            ).fetchone()
+
+    def record(self, stage, key, input_hash, status, elapsed, result=None, error=None):
+        """
+        保存一个文件在某个阶段的处理结果。
+
+        参数:
+        stage (str): 阶段名称。
+        key (str): 文件标识。
+        input_hash (str): 输入内容的哈希值。
+        status (str): done 或 failed。
+        elapsed (float): 耗时（秒）。
+        result (str): 处理结果，默认为None。
+        error (str): 错误信息，默认为None。
+        """
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO files (stage, key, input_hash, status, result, error, elapsed, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (stage, key, input_hash, status, result, error, elapsed, time.time()),
+            )
+            self.pending += 1
+            if self.pending >= self.commit_interval:
+                self.connection.commit()
+                self.pending = 0
+
+    def file_hash(self, path):
+        """
+        计算文件内容的哈希值。文件大小和修改时间都没变时直接使用上次的结果，不再读取文件。
+
+        参数:
+        path (str): 文件路径。
+
+        返回:
+        hash (str): 文件内容的哈希值。
+        """
+        stat = os.stat(path)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT size, mtime_ns, hash FROM file_hashes WHERE path = ?", (path,)
+            ).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(chunk)
+        file_hash = digest.hexdigest()
+
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, hash) VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, file_hash),
+            )
+        return file_hash
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+            self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
+def text_hash(*parts):
+    """
+    计算若干字符串拼接后的哈希值，用于把配置（如关键字列表）加入输入哈希。
+    """
+    return hashlib.blake2b("\0".join(parts).encode("utf-8"), digest_size=20).hexdigest()
+
+
+def run_stage(manifest, stage, items, process, workers=1):
+    """
+    运行一个阶段。输入哈希值没变并且上次成功的文件直接使用上次的结果，其余文件交给process处理。
+
+    参数:
+    manifest (Manifest): 处理记录。
+    stage (str): 阶段名称。
+    items (iterable): (key, input_hash, payload) 元组。
+    process (callable): 处理函数，参数为payload，返回结果字符串，失败时抛出异常。
+    workers (int): 线程数量，默认为1。
+
+    返回:
+    results (list): 成功的 (key, result) 元组列表，顺序与items一致。
+    """
+    start_time = time.time()
+    keys = []
+    results = {}
+    skipped_count = 0
+    failed_count = 0
+
+    def timed_process(payload):
+        process_start_time = time.time()
+        try:
+            return process(payload), None, time.time() - process_start_time
+        except Exception as e:
+            return None, repr(e), time.time() - process_start_time
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for key, input_hash, payload in items:
+            keys.append(key)
+            previous = manifest.get(stage, key)
+            if previous is not None and previous[0] == input_hash and previous[1] == "done":
+                results[key] = previous[2]
+                skipped_count += 1
+                continue
+
+            future = executor.submit(timed_process, payload)
+            futures[future] = (key, input_hash)
+
+        pending_count = len(futures)
+        profiler.gauge(f"{stage}_pending", pending_count)
+        for future in as_completed(futures):
+            key, input_hash = futures[future]
+            result, error, elapsed = future.result()
+            pending_count -= 1
+            profiler.gauge(f"{stage}_pending", pending_count)
+            profiler.record(stage, elapsed, key, failed=error is not None)
+            if error is None:
+                manifest.record(stage, key, input_hash, "done", elapsed, result=result)
+                results[key] = result
+            else:
+                manifest.record(stage, key, input_hash, "failed", elapsed, error=error)
+                failed_count += 1
+
+    manifest.commit()
+    processed_count = len(futures) - failed_count
+    print(f"{stage}: 处理 {processed_count}，跳过 {skipped_count}，失败 {failed_count}，耗时 {time.time() - start_time:.1f}s")
+
+    return [(key, results[key]) for key in keys if key in results]
+
+
+def read_rows(csv_file):
+    """
+    读取CSV中的 (original_filename, new_filename) 行，跳过表头和空行。
+    """
+    with open(csv_file, 'r', encoding='utf-8') as file:
+        for row in csv.reader(file):
+            if row and row != INDEX_HEADER:
+                yield row
+
+
+def write_rows(csv_file, rows, header=None):
+    with open(csv_file, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        if header is not None:
+            writer.writerow(header)
+        writer.writerows(rows)
+
+
+def unzip_stage(manifest, args):
+    """
+    解压zip，每个成员解压为 {index}.docx，结果写入index_to_filename.csv。
+    """
+    os.makedirs(args.docx_dir, exist_ok=True)
+    lock = threading.Lock()
+
+    with zipfile.ZipFile(args.zip_file, 'r') as zf, zip2.ThreadLocalZipFile(args.zip_file) as zip_files:
+        def items():
+            for index, info in enumerate(zf.infolist()):
+                if info.is_dir():
+                    continue
+                decoded_filepath = zip2.decode_member_name(info, args.encoding)
+                input_hash = text_hash(decoded_filepath, f"{info.CRC:08x}", str(info.file_size))
+                yield f"{index}.docx", input_hash, (info, decoded_filepath, f"{index}.docx")
+
+        def process(payload):
+            info, decoded_filepath, target_filename = payload
+            zip2.extract_member(zip_files, info, os.path.join(args.docx_dir, target_filename), lock)
+            return decoded_filepath
+
+        # 每个线程各自打开zip文件
+        results = run_stage(manifest, "unzip", items(), process, workers=args.workers)
+
+    rows = [[original_filename, key] for key, original_filename in results]
+    write_rows(args.index_csv, rows, header=INDEX_HEADER)
+
+
+def convert_stage(manifest, args):
+    """
+    将docx转换为markdown，大文件先转换，同时运行的pandoc进程数量受PandocScheduler限制。
+    """
+    os.makedirs(args.markdown_dir, exist_ok=True)
+    scheduler = docx2markdown2.PandocScheduler(args.workers)
+    # docx的中间记录保存在work_dir/docx_records，转换时用来跳过python-docx不支持的文档，分类时直接使用其中的文字
+    record_cache = DocxRecordCache(args.record_cache or os.path.join(args.work_dir, 'docx_records'))
+
+    def items():
+        docx_paths = [os.path.join(args.docx_dir, docx_file) for docx_file in os.listdir(args.docx_dir) if docx_file.endswith(".docx")]
+        docx_paths.sort(key=os.path.getsize, reverse=True)
+        for docx_path in docx_paths:
+            yield os.path.basename(docx_path), manifest.file_hash(docx_path), docx_path
+
+    def process(docx_path):
+        markdown_file = docx2markdown2.convert_docx_to_markdown(
+            docx_path, args.markdown_dir, args.image_dir, native=args.native, scheduler=scheduler, timeout=args.timeout,
+            record_cache=record_cache
+        )
+        return os.path.basename(markdown_file)
+
+    run_stage(manifest, "convert", items(), process, workers=args.workers)
+
+
+def filter_stage(manifest, args):
+    """
+    按文件名中的关键字判断是否为试卷。
+    """
+    keywords = filter_papers.keywords
+    matcher = compile_keywords(keywords)
+    rows = list(read_rows(args.index_csv))
+
+    def items():
+        for row in rows:
+            yield row[1], text_hash(row[0], *keywords), row
+
+    def process(row):
+        file_path = normalize_file_name(row[0])
+        return "1" if matcher.contains_any(file_path) else "0"
+
+    results = dict(run_stage(manifest, "filter", items(), process))
+
+    write_rows(os.path.join(args.work_dir, 'rows_with_keywords.csv'), [row for row in rows if results.get(row[1]) == "1"])
+    write_rows(os.path.join(args.work_dir, 'rows_without_keywords.csv'), [row for row in rows if results.get(row[1]) == "0"])
+
+
+def dedup_stage(manifest, args):
+    """
+    用MinHash LSH找出试卷中的近似重复（原卷/解析版、不同版本的同一份试卷），簇清单写入 work_dir/near_duplicates.jsonl，
+    后面的阶段跳过每个簇中除了保留文档以外的文件。索引保存在 work_dir/near_duplicates.sqlite，只插入新增或修改过的文件。
+    """
+    from paper_markdown_text_classifier import one_text_pre_process
+
+    rows = list(read_rows(os.path.join(args.work_dir, 'rows_with_keywords.csv')))
+    index = NearDuplicateIndex(os.path.join(args.work_dir, 'near_duplicates.sqlite'), threshold=args.dedup_threshold)
+
+    def items():
+        for row in rows:
+            markdown_path = os.path.join(args.markdown_dir, row[1].replace(".docx", ".md"))
+            if not os.path.exists(markdown_path):
+                continue
+            # 索引重建或者阈值改变后所有文件重新插入
+            yield row[1], text_hash(manifest.file_hash(markdown_path), index.index_id, str(args.dedup_threshold)), (row[1], markdown_path)
+
+    def process(payload):
+        key, markdown_path = payload
+        with open(markdown_path, 'r', encoding='utf-8') as file:
+            text = one_text_pre_process(file.read())
+        return str(len(index.insert(key, text)))
+
+    try:
+        results = run_stage(manifest, "dedup", items(), process, workers=args.workers)
+        clusters = index.clusters(key for key, _ in results)
+    finally:
+        index.close()
+
+    write_clusters(clusters, os.path.join(args.work_dir, 'near_duplicates.jsonl'))
+    print(f"dedup: {len(clusters)} 个簇，跳过 {sum(len(cluster['duplicates']) for cluster in clusters)} 个重复文件")
+
+
+def answers_stage(manifest, args):
+    """
+    判断试卷中是否含有答案，先看文件名，再看markdown内容。dedup阶段找出的重复文件不再处理。
+    """
+    keywords = check_answers.keywords
+    duplicate_keys = load_duplicate_keys(os.path.join(args.work_dir, 'near_duplicates.jsonl'))
+    rows = [row for row in read_rows(os.path.join(args.work_dir, 'rows_with_keywords.csv')) if row[1] not in duplicate_keys]
+
+    def items():
+        for row in rows:
+            markdown_path = os.path.join(args.markdown_dir, row[1].replace(".docx", ".md"))
+            if os.path.exists(markdown_path):
+                content_hash = manifest.file_hash(markdown_path)
+            else:
+                content_hash = ""
+            yield row[1], text_hash(row[0], content_hash, *keywords), row
+
+    def process(row):
+        return "1" if check_answers.check_answers_in_row(row, keywords, args.markdown_dir) else "0"
+
+    results = dict(run_stage(manifest, "answers", items(), process, workers=args.workers))
+
+    write_rows(os.path.join(args.work_dir, 'rows_with_answers.csv'), [row for row in rows if results.get(row[1]) == "1"])
+    write_rows(os.path.join(args.work_dir, 'rows_without_answers.csv'), [row for row in rows if results.get(row[1]) == "0"])
+
+
+def split_stage(manifest, args):
+    """
+    切分含有答案的试卷，每个文件的结果单独保存为一个jsonl，重新处理一个文件时只覆盖它自己的结果。
+    """
+    split_dir = os.path.join(args.work_dir, 'split')
+    os.makedirs(split_dir, exist_ok=True)
+
+    def items():
+        for row in read_rows(os.path.join(args.work_dir, 'rows_with_answers.csv')):
+            markdown_file = row[1].replace(".docx", ".md")
+            markdown_path = os.path.join(args.markdown_dir, markdown_file)
+            if not os.path.exists(markdown_path):
+                continue
+            yield markdown_file, manifest.file_hash(markdown_path), (markdown_path, markdown_file)
+
+    def process(payload):
+        markdown_path, markdown_file = payload
+        json_path = os.path.join(split_dir, os.path.splitext(markdown_file)[0] + ".jsonl")
+        with open(markdown_path, 'r', encoding='utf-8') as file, open(json_path + ".tmp", 'w', encoding='utf-8') as json_file:
+            count = 0
+            for record in split_papers.split_questions(file, markdown_file):
+                json_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+        os.replace(json_path + ".tmp", json_path)
+        return str(count)
+
+    run_stage(manifest, "split", items(), process, workers=args.workers)
+
+
+def align_stage(manifest, args):
+    """
+    把每个文件切分出的题目和答案按题号配对，结果按文件保存在 work_dir/align/*.jsonl，只处理切分结果有变化的文件。
+    """
+    split_dir = os.path.join(args.work_dir, 'split')
+    align_dir = os.path.join(args.work_dir, 'align')
+    os.makedirs(align_dir, exist_ok=True)
+
+    def items():
+        for json_file in sorted(os.listdir(split_dir)):
+            if not json_file.endswith(".jsonl"):
+                continue
+            json_path = os.path.join(split_dir, json_file)
+            yield json_file, manifest.file_hash(json_path), json_file
+
+    def process(json_file):
+        with open(os.path.join(split_dir, json_file), 'r', encoding='utf-8') as file:
+            records = [json.loads(line) for line in file]
+
+        aligned_path = os.path.join(align_dir, json_file)
+        count = 0
+        with open(aligned_path + ".tmp", 'w', encoding='utf-8') as aligned_file:
+            for record in split_papers.align_questions(records):
+                aligned_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+        os.replace(aligned_path + ".tmp", aligned_path)
+        return str(count)
+
+    run_stage(manifest, "align", items(), process, workers=args.workers)
+
+
+def store_stage(manifest, args):
+    """
+    把所有markdown和各阶段的结果按row group写入 work_dir/corpus.parquet，后续处理和训练按列读取，不再打开大量小文件。
+    每次运行都重写整个语料库，所以不在默认的阶段中。
+    """
+    # pyarrow只有这个阶段需要
+    import corpus_store
+
+    start_time = time.time()
+    count = corpus_store.write_corpus(
+        os.path.join(args.work_dir, 'corpus.parquet'),
+        corpus_store.iter_pipeline_rows(args.index_csv, args.markdown_dir, args.work_dir, args.scores),
+    )
+    print(f"store: 写入 {count}，耗时 {time.time() - start_time:.1f}s")
+
+
+STAGE_FUNCTIONS = {
+    "unzip": unzip_stage,
+    "convert": convert_stage,
+    "filter": filter_stage,
+    "dedup": dedup_stage,
+    "answers": answers_stage,
+    "split": split_stage,
+    "align": align_stage,
+    "store": store_stage,
+}
+
+
+def run_pipeline(args):
+    os.makedirs(args.work_dir, exist_ok=True)
+    manifest = Manifest(args.manifest or os.path.join(args.work_dir, 'manifest.sqlite'))
+    try:
+        for stage in args.stages:
+            STAGE_FUNCTIONS[stage](manifest, args)
+    finally:
+        manifest.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="依次运行所有处理阶段，只处理新增、修改过或者上次失败的文件")
+    parser.add_argument('--stages', nargs='+', default=DEFAULT_STAGES, choices=STAGES, help="需要运行的阶段，默认不包括store")
+    parser.add_argument('--zip_file', default='../docx_math.zip', type=str, help="zip文件路径")
+    parser.add_argument('--encoding', default='gbk', type=str, help="zip中文件名的编码")
+    parser.add_argument('--docx_dir', default='/www/dataset/MNBVC/docx_math', type=str, help="docx文件夹")
+    parser.add_argument('--markdown_dir', default='/www/dataset/MNBVC/clear_data', type=str, help="markdown文件夹")
+    parser.add_argument('--image_dir', default='/www/dataset/MNBVC/image_folder', type=str, help="图片文件夹")
+    parser.add_argument('--index_csv', default='index_to_filename.csv', type=str, help="索引到文件名映射的CSV")
+    parser.add_argument('--work_dir', default='.', type=str, help="CSV和切分结果的输出目录")
+    parser.add_argument('--manifest', default=None, type=str, help="manifest文件路径，默认为work_dir/manifest.sqlite")
+    parser.add_argument('--record_cache', default=None, type=str, help="docx中间记录的缓存目录，默认为work_dir/docx_records")
+    parser.add_argument('--native', action='store_true', help="先用python-docx快速转换docx，不支持的再交给pandoc，默认只使用pandoc")
+    parser.add_argument('--timeout', default=docx2markdown2.DEFAULT_TIMEOUT, type=int, help="单个文件pandoc转换的超时时间（秒）")
+    parser.add_argument('--dedup_threshold', default=0.8, type=float, help="估计的Jaccard相似度不低于这个值时记为近似重复")
+    parser.add_argument('--scores', default=None, type=str, help="分类模型服务模式输出的预测结果，写入语料库的score列")
+    parser.add_argument('--workers', default=os.cpu_count(), type=int, help="线程数量")
+    add_profile_arguments(parser)
+
+    args = parser.parse_args()
+    with profile_from_args(args):
+        run_pipeline(args)
@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import heapq
+import threading
+import contextlib
+
+
+# 关闭时timer返回的上下文管理器，什么都不做
+NULL_TIMER = contextlib.nullcontext()
+
+
+class _Timer:
+    __slots__ = ("profiler", "stage", "key", "start_time")
+
+    def __init__(self, profiler, stage, key):
+        self.profiler = profiler
+        self.stage = stage
+        self.key = key
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.record(self.stage, time.perf_counter() - self.start_time, self.key, failed=exc_type is not None)
+        return False
+
+
+class Profiler:
+    """
+    记录每个阶段（pandoc、python-docx、jieba、predict_proba等）的次数、失败数和耗时，以及队列长度等数值。
+
+    默认关闭，关闭时timer只返回一个共享的空上下文管理器，几乎没有额外开销。
+    打开后可以定期把快照追加写入JSON lines文件，结束时输出汇总报告。
+    """
+
+    # 每个阶段保留最慢的文件数量
+    slowest_count = 10
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.gauges = {}
+        self.start_time = None
+        self.file_log = None
+        self.file_log_path = None
+        self.snapshot_thread = None
+        self.stop_event = threading.Event()
+
+    def reset_after_fork(self):
+        """
+        fork出来的子进程中调用：fork时快照线程或者其他线程可能正持有锁，子进程中没有线程会释放它，
+        所以重新创建锁；继承来的统计已经在父进程中记录过，清空，快照线程也不会被复制到子进程。
+        """
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.gauges = {}
+        self.snapshot_thread = None
+        self.stop_event = threading.Event()
+
+    def enable(self, snapshot_path=None, interval=10, file_log_path=None):
+        """
+        打开记录。
+
+        参数:
+        snapshot_path (str): 快照文件路径，每interval秒追加一行JSON，默认不写快照。
+        interval (float): 快照间隔（秒）。
+        file_log_path (str): 每个文件每个阶段的耗时追加写入这个JSON lines文件，默认不写。
+        """
+        self.enabled = True
+        self.start_time = time.time()
+        if file_log_path:
+            # 按行写入，多个进程追加同一个文件时行不会交错
+            self.file_log = open(file_log_path, "a", encoding="utf-8", buffering=1)
+            self.file_log_path = file_log_path
+        if snapshot_path:
+            self.stop_event.clear()
+            self.snapshot_thread = threading.Thread(target=self.write_snapshots, args=(snapshot_path, interval), daemon=True)
+            self.snapshot_thread.start()
+
+    def timer(self, stage, key=None):
+        """
+        计时一段代码，抛出异常时记为失败（异常继续向外抛出）。
+
+        参数:
+        stage (str): 阶段名称。
+        key (str): 文件名等标识，用于记录最慢的文件，默认为None。
+
+        返回:
+        上下文管理器。
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, stage, key)
+
+    def stage_stats(self, stage):
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = {"count": 0, "failures": 0, "seconds": 0.0, "max": 0.0, "slowest": []}
+        return stats
+
+    def record(self, stage, seconds, key=None, failed=False):
+        """
+        记录一次耗时。
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            stats = self.stage_stats(stage)
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            if failed:
+                stats["failures"] += 1
+            if seconds > stats["max"]:
+                stats["max"] = seconds
+            if key is not None:
+                entry = (seconds, str(key))
+                if len(stats["slowest"]) < self.slowest_count:
+                    heapq.heappush(stats["slowest"], entry)
+                elif entry > stats["slowest"][0]:
+                    heapq.heapreplace(stats["slowest"], entry)
+                if self.file_log is not None:
+                    self.file_log.write(json.dumps({"stage": stage, "key": str(key), "seconds": seconds, "failed": failed}, ensure_ascii=False) + "\n")
+
+    def failure(self, stage):
+        """
+        记录一次没有计时的失败。
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.stage_stats(stage)["failures"] += 1
+
+    def gauge(self, name, value):
+        """
+        记录一个数值（例如队列长度）的当前值，同时保留最大值。
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            current = self.gauges.get(name)
+            self.gauges[name] = {"value": value, "max": value if current is None else max(current["max"], value)}
+
+    def drain(self):
+        """
+        取出并清空当前的阶段统计，子进程用它把统计交给主进程合并。
+        """
+        with self.lock:
+            stages = self.stages
+            self.stages = {}
+        return stages
+
+    def merge(self, stages):
+        """
+        合并drain取出的阶段统计。
+        """
+        with self.lock:
+            for stage, other in stages.items():
+                stats = self.stages.get(stage)
+                if stats is None:
+                    self.stages[stage] = other
+                    continue
+                stats["count"] += other["count"]
+                stats["failures"] += other["failures"]
+                stats["seconds"] += other["seconds"]
+                stats["max"] = max(stats["max"], other["max"])
+                stats["slowest"] = heapq.nlargest(self.slowest_count, stats["slowest"] + other["slowest"])
+                heapq.heapify(stats["slowest"])
+
+    def snapshot(self):
+        """
+        返回当前的统计，不包括最慢的文件。
+        """
+        with self.lock:
+            return {
+                "time": time.time(),
+                "elapsed_seconds": round(time.time() - self.start_time, 3) if self.start_time else 0.0,
+                "stages": {
+                    stage: {"count": stats["count"], "failures": stats["failures"], "seconds": round(stats["seconds"], 6)}
+                    for stage, stats in self.stages.items()
+                },
+                "gauges": {name: dict(gauge) for name, gauge in self.gauges.items()},
+            }
+
+    def write_snapshots(self, snapshot_path, interval):
+        while not self.stop_event.wait(interval):
+            self.write_snapshot(snapshot_path)
+
+    def write_snapshot(self, snapshot_path):
+        with open(snapshot_path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(self.snapshot(), ensure_ascii=False) + "\n")
+
+    def report(self, report_path=None, snapshot_path=None):
+        """
+        停止写快照，打印汇总表，并把汇总报告写入report_path。
+
+        参数:
+        report_path (str): 报告文件路径，默认不写文件。
+        snapshot_path (str): 快照文件路径，给出时再追加最后一次快照。
+
+        返回:
+        report (dict): 汇总报告。
+        """
+        if not self.enabled:
+            return None
+
+        if self.snapshot_thread is not None:
+            self.stop_event.set()
+            self.snapshot_thread.join()
+            self.snapshot_thread = None
+        if snapshot_path:
+            self.write_snapshot(snapshot_path)
+        if self.file_log is not None:
+            self.file_log.close()
+            self.file_log = None
+
+        report = self.snapshot()
+        with self.lock:
+            for stage, stats in self.stages.items():
+                report["stages"][stage].update({
+                    "mean_seconds": stats["seconds"] / stats["count"] if stats["count"] else 0.0,
+                    "max_seconds": stats["max"],
+                    "slowest": [{"key": key, "seconds": seconds} for seconds, key in sorted(stats["slowest"], reverse=True)],
+                })
+
+        print(f"{'阶段':<16}{'次数':>10}{'失败':>8}{'总耗时(s)':>12}{'平均(ms)':>12}{'最大(s)':>10}")
+        for stage, stats in sorted(report["stages"].items(), key=lambda item: item[1]["seconds"], reverse=True):
+            print(f"{stage:<16}{stats['count']:>10}{stats['failures']:>8}{stats['seconds']:>12.1f}"
+                  f"{stats['mean_seconds'] * 1000:>12.1f}{stats['max_seconds']:>10.1f}")
+        for name, gauge in report["gauges"].items():
+            print(f"{name}: 当前 {gauge['value']}，最大 {gauge['max']}")
+
+        if report_path:
+            with open(report_path, "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        return report
+
+
+# 所有脚本共用的记录器
+profiler = Profiler()
+
+# multiprocessing.Pool等fork子进程时自动重置（Windows没有fork）
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=profiler.reset_after_fork)
+
+
+def add_profile_arguments(parser):
+    """
+    给命令行加上 --profile、--profile_report、--metrics_snapshot、--metrics_interval、--profile_files 参数。
+    """
+    parser.add_argument('--profile', action='store_true', help='记录各阶段耗时，结束时输出汇总报告')
+    parser.add_argument('--profile_report', default='profile_report.json', type=str, help='汇总报告的保存路径')
+    parser.add_argument('--metrics_snapshot', default=None, type=str, help='定期把统计快照追加写入这个JSON lines文件')
+    parser.add_argument('--metrics_interval', default=10, type=float, help='快照间隔（秒）')
+    parser.add_argument('--profile_files', default=None, type=str, help='把每个文件每个阶段的耗时写入这个JSON lines文件')
+
+
+@contextlib.contextmanager
+def profile_from_args(args):
+    """
+    按命令行参数打开记录，结束时输出汇总报告。没有 --profile 时什么都不做。
+    """
+    if not args.profile:
+        yield
+        return
+
+    profiler.enable(args.metrics_snapshot, args.metrics_interval, args.profile_files)
+    try:
+        yield
+    finally:
+        profiler.report(args.profile_report, args.metrics_snapshot)
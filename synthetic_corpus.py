@@ -0,0 +1,252 @@
+import os
+import io
+import csv
+import json
+import zlib
+import random
+import struct
+import zipfile
+import argparse
+
+from docx import Document
+from docx.shared import Inches
+
+
+SUBJECTS = ["数学", "语文", "英语", "物理", "化学", "生物", "历史", "地理", "政治"]
+GRADES = ["七年级", "八年级", "九年级", "高一", "高二", "高三"]
+EXAMS = ["期中考试试卷", "期末考试试题", "月考试卷", "单元测试卷", "模拟试题"]
+OTHER_TITLES = ["教学设计", "工作总结", "会议通知", "学习计划", "课堂笔记", "活动方案"]
+
+SECTIONS = [("选择题", "choice"), ("填空题", "blank"), ("解答题", "answer")]
+
+PHRASES = [
+    "已知函数f(x)=2x+3", "下列说法中正确的是", "根据材料回答问题", "如图所示", "在三角形ABC中",
+    "请计算下列各式的值", "阅读下面的短文", "某同学在实验中发现", "若a>0且b<0", "这首诗表达了作者的思想感情",
+    "物体在水平面上做匀速直线运动", "化学反应前后元素的种类不变", "细胞是生物体结构和功能的基本单位",
+    "我国古代四大发明", "地球自转产生了昼夜交替", "下列词语中加点字的读音完全正确的一项是",
+]
+
+OTHER_PHRASES = [
+    "本学期的主要工作如下", "为了进一步提高教学质量", "请各位老师按时参加", "本次活动的目的是",
+    "经过一段时间的学习", "现将有关事项通知如下", "教学目标与重难点分析", "学生的积极性明显提高",
+]
+
+ANSWER_HEADINGS = ["参考答案", "答案与解析", "答案"]
+
+# zip中文件名的编码，和中文Windows上压缩的真实数据一样
+ZIP_FILENAME_ENCODING = "gbk"
+
+
+class LegacyZipInfo(zipfile.ZipInfo):
+    """
+    按ZIP_FILENAME_ENCODING写入文件名、不设置UTF-8标志（flag_bits的0x800位）。
+    zipfile默认把非ASCII的文件名按UTF-8写入并设置标志，和仓库要处理的GBK压缩包不一样。
+    """
+
+    def _encodeFilenameFlags(self):
+        return self.filename.encode(ZIP_FILENAME_ENCODING), self.flag_bits & ~0x800
+
+
+def make_png(width, height, color):
+    """
+    生成一张纯色的PNG图片，不需要图像库。
+
+    参数:
+    width (int): 宽度。
+    height (int): 高度。
+    color (tuple): (r, g, b)。
+
+    返回:
+    data (bytes): PNG文件内容。
+    """
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    raw = b"".join(b"\x00" + bytes(color) * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw))
+            + chunk(b"IEND", b""))
+
+
+def sentence(rng, phrases, length):
+    return "，".join(rng.choice(phrases) for _ in range(length)) + "。"
+
+
+def generate_paper(rng, questions=20, images=2, tables=1, with_answers=True):
+    """
+    生成一份试卷的内容块。
+
+    参数:
+    rng (random.Random): 随机数生成器。
+    questions (int): 题目数量。
+    images (int): 图片数量。
+    tables (int): 表格数量。
+    with_answers (bool): 是否在最后加上答案部分。
+
+    返回:
+    title (str): 标题。
+    blocks (list): ("heading"|"paragraph"|"image"|"table", 内容) 列表。
+    """
+    title = f"{rng.choice(GRADES)}{rng.choice(SUBJECTS)}{rng.choice(EXAMS)}"
+    blocks = [("heading", title), ("paragraph", "（考试时间：90分钟 满分：100分）")]
+
+    image_positions = set(rng.sample(range(questions), min(images, questions)))
+    table_positions = set(rng.sample(range(questions), min(tables, questions)))
+    per_section = max(1, -(-questions // len(SECTIONS)))
+
+    number = 0
+    for section_index, (section_name, kind) in enumerate(SECTIONS):
+        if number >= questions:
+            break
+        blocks.append(("paragraph", f"{'一二三'[section_index]}、{section_name}"))
+        for _ in range(min(per_section, questions - number)):
+            blocks.append(("paragraph", f"{number + 1}．{sentence(rng, PHRASES, rng.randint(1, 3))}"))
+            if kind == "choice":
+                blocks.append(("paragraph", "  ".join(f"{option}．{rng.randint(1, 99)}" for option in "ABCD")))
+            elif kind == "blank":
+                blocks.append(("paragraph", "答：________"))
+            if number in image_positions:
+                blocks.append(("image", make_png(rng.randint(16, 64), rng.randint(16, 64), tuple(rng.randrange(256) for _ in range(3)))))
+            if number in table_positions:
+                blocks.append(("table", [["x", "1", "2", "3"], ["y"] + [str(rng.randint(1, 99)) for _ in range(3)]]))
+            number += 1
+
+    if with_answers:
+        blocks.append(("paragraph", rng.choice(ANSWER_HEADINGS)))
+        for index in range(number):
+            blocks.append(("paragraph", f"{index + 1}．{rng.choice('ABCD')} {sentence(rng, PHRASES, 1)}"))
+
+    return title, blocks
+
+
+def generate_other(rng, paragraphs=20, images=1):
+    """
+    生成一份不是试卷的文档的内容块。
+
+    返回:
+    title (str): 标题。
+    blocks (list): 内容块列表。
+    """
+    title = f"{rng.choice(GRADES)}{rng.choice(SUBJECTS)}{rng.choice(OTHER_TITLES)}"
+    blocks = [("heading", title)]
+    image_positions = set(rng.sample(range(paragraphs), min(images, paragraphs)))
+    for index in range(paragraphs):
+        blocks.append(("paragraph", sentence(rng, OTHER_PHRASES, rng.randint(2, 5))))
+        if index in image_positions:
+            blocks.append(("image", make_png(32, 32, (rng.randrange(256), 0, 0))))
+    return title, blocks
+
+
+def write_docx(blocks, file_path):
+    document = Document()
+    for kind, content in blocks:
+        if kind == "heading":
+            document.add_heading(content, level=1)
+        elif kind == "paragraph":
+            document.add_paragraph(content)
+        elif kind == "image":
+            document.add_picture(io.BytesIO(content), width=Inches(1))
+        elif kind == "table":
+            table = document.add_table(rows=len(content), cols=len(content[0]))
+            for row, values in zip(table.rows, content):
+                for cell, value in zip(row.cells, values):
+                    cell.text = value
+    document.save(file_path)
+
+
+def to_markdown(blocks):
+    """
+    把内容块转换为和pandoc输出相近的markdown。
+    """
+    lines = []
+    image_count = 0
+    for kind, content in blocks:
+        if kind == "heading":
+            lines.append(f"# {content}")
+        elif kind == "paragraph":
+            lines.append(content)
+        elif kind == "image":
+            image_count += 1
+            lines.append(f'![](media/image{image_count}.png){{width="1in" height="1in"}}')
+        elif kind == "table":
+            lines.append("| " + " | ".join(content[0]) + " |")
+            lines.append("|" + "---|" * len(content[0]))
+            for values in content[1:]:
+                lines.append("| " + " | ".join(values) + " |")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def generate_corpus(output_dir, files=100, seed=0, paper_ratio=0.7, answer_ratio=0.5, questions=20, images=2, tables=1):
+    """
+    生成合成的试卷语料：docx/ 和 markdown/ 目录、包含所有docx的corpus.zip（文件名为GBK编码），以及记录标签的index.csv。
+
+    参数:
+    output_dir (str): 输出目录。
+    files (int): 文件数量。
+    seed (int): 随机种子，相同的参数生成相同的语料。
+    paper_ratio (float): 试卷所占比例，其余为其他文档。
+    answer_ratio (float): 试卷中带答案部分的比例。
+    questions (int): 每份试卷的题目数量。
+    images (int): 每份试卷的图片数量。
+    tables (int): 每份试卷的表格数量。
+
+    返回:
+    index_csv (str): index.csv的路径。
+    """
+    rng = random.Random(seed)
+    docx_folder = os.path.join(output_dir, "docx")
+    markdown_folder = os.path.join(output_dir, "markdown")
+    os.makedirs(docx_folder, exist_ok=True)
+    os.makedirs(markdown_folder, exist_ok=True)
+
+    index_csv = os.path.join(output_dir, "index.csv")
+    with open(index_csv, "w", newline="", encoding="utf-8") as csv_file, \
+            zipfile.ZipFile(os.path.join(output_dir, "corpus.zip"), "w", zipfile.ZIP_DEFLATED) as zip_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["original_filename", "new_filename", "label", "has_answers"])
+
+        for index in range(files):
+            is_paper = rng.random() < paper_ratio
+            with_answers = is_paper and rng.random() < answer_ratio
+            if is_paper:
+                title, blocks = generate_paper(rng, questions, images, tables, with_answers)
+            else:
+                title, blocks = generate_other(rng)
+
+            new_filename = f"{index}.docx"
+            docx_file = os.path.join(docx_folder, new_filename)
+            write_docx(blocks, docx_file)
+            with open(os.path.join(markdown_folder, f"{index}.md"), "w", encoding="utf-8") as file:
+                file.write(to_markdown(blocks))
+
+            original_filename = f"{title}-{index}.docx"
+            info = LegacyZipInfo(original_filename, date_time=(2024, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(docx_file, "rb") as file:
+                zip_file.writestr(info, file.read())
+            writer.writerow([original_filename, new_filename, int(is_paper), int(with_answers)])
+
+    with open(os.path.join(output_dir, "corpus.json"), "w", encoding="utf-8") as file:
+        json.dump({"files": files, "seed": seed, "paper_ratio": paper_ratio, "answer_ratio": answer_ratio,
+                   "questions": questions, "images": images, "tables": tables}, file, ensure_ascii=False)
+    return index_csv
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成合成的中文试卷docx/markdown语料，用于离线测试和性能测试")
+    parser.add_argument('--output_dir', default="synthetic_corpus", type=str, help="输出目录")
+    parser.add_argument('--files', default=100, type=int, help="文件数量")
+    parser.add_argument('--seed', default=0, type=int, help="随机种子")
+    parser.add_argument('--paper_ratio', default=0.7, type=float, help="试卷所占比例")
+    parser.add_argument('--answer_ratio', default=0.5, type=float, help="试卷中带答案部分的比例")
+    parser.add_argument('--questions', default=20, type=int, help="每份试卷的题目数量")
+    parser.add_argument('--images', default=2, type=int, help="每份试卷的图片数量")
+    parser.add_argument('--tables', default=1, type=int, help="每份试卷的表格数量")
+
+    args = parser.parse_args()
+
+    index_csv = generate_corpus(args.output_dir, args.files, args.seed, args.paper_ratio, args.answer_ratio,
+                                args.questions, args.images, args.tables)
+    print(f"生成完成：{index_csv}")
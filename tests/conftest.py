@@ -0,0 +1,6 @@
+import os
+import sys
+
+# 脚本都在仓库根目录下，测试直接导入
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
@@ -0,0 +1,75 @@
+import zipfile
+
+import pytest
+
+import clear
+from docx_record import extract_record
+
+
+NAMESPACES = ('xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+              'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006" '
+              'xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape" '
+              'xmlns:v="urn:schemas-microsoft-com:vml"')
+
+RELS = ('<?xml version="1.0" encoding="UTF-8"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="word/document.xml"/></Relationships>')
+
+
+def paragraph(text):
+    return f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p>'
+
+
+# Word保存文本框时，mc:Choice（wps）和mc:Fallback（VML）中各有一份相同的内容
+TEXT_BOX = ('<w:p><w:r><mc:AlternateContent>'
+            '<mc:Choice Requires="wps"><w:drawing><wps:wsp><wps:txbx><w:txbxContent>'
+            + paragraph("文本框中的题目") +
+            '</w:txbxContent></wps:txbx></wps:wsp></w:drawing></mc:Choice>'
+            '<mc:Fallback><w:pict><v:shape><v:textbox><w:txbxContent>'
+            + paragraph("文本框中的题目") +
+            '</w:txbxContent></v:textbox></v:shape></w:pict></mc:Fallback>'
+            '</mc:AlternateContent></w:r></w:p>')
+
+
+def write_docx(docx_file):
+    with zipfile.ZipFile(docx_file, "w") as zf:
+        zf.writestr("_rels/.rels", RELS)
+        zf.writestr("word/header1.xml", f'<w:hdr {NAMESPACES}>{paragraph("2024年期中考试")}</w:hdr>')
+        zf.writestr("word/document.xml",
+                    f'<w:document {NAMESPACES}><w:body>'
+                    + paragraph("一、选择题") + TEXT_BOX + paragraph("1. 下列说法正确的是") +
+                    '</w:body></w:document>')
+        zf.writestr("word/footer1.xml", f'<w:ftr {NAMESPACES}>{paragraph("第1页")}</w:ftr>')
+
+
+def lines(text):
+    return [line for line in text.split("\n") if line.strip()]
+
+
+def test_record_skips_fallback_and_keeps_header_footer(tmp_path):
+    docx_file = str(tmp_path / "paper.docx")
+    write_docx(docx_file)
+
+    record = extract_record(docx_file)
+    assert [(paragraph["text"], paragraph["part"]) for paragraph in record["paragraphs"] if paragraph["text"]] == [
+        ("2024年期中考试", "header"),
+        ("一、选择题", "document"),
+        ("文本框中的题目", "document"),
+        ("1. 下列说法正确的是", "document"),
+        ("第1页", "footer"),
+    ]
+    # 纯文本仍然只有正文中的段落
+    assert record["text"] == "一、选择题  1. 下列说法正确的是 "
+
+
+def test_clear_matches_docx2txt(tmp_path):
+    docx2txt = pytest.importorskip("docx2txt")
+    docx_file = str(tmp_path / "paper.docx")
+    write_docx(docx_file)
+
+    old = lines(docx2txt.process(docx_file))
+    new = lines(clear.read_document(docx_file, ".docx"))
+    # docx2txt把mc:Choice和mc:Fallback中的文本框各输出了一次，其余的行相同
+    assert old == ["2024年期中考试", "一、选择题", "文本框中的题目", "文本框中的题目", "1. 下列说法正确的是", "第1页"]
+    assert new == ["2024年期中考试", "一、选择题", "文本框中的题目", "1. 下列说法正确的是", "第1页"]
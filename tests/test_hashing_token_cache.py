@@ -0,0 +1,49 @@
+import os
+import sys
+import json
+import sqlite3
+import subprocess
+
+import joblib
+import docx
+
+from conftest import ROOT_DIR
+from hashing_classifier import make_model
+
+
+def write_docx(path, paragraphs):
+    document = docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def serve(model_path, token_cache, docx_path):
+    """
+    把分类脚本作为 __main__ 运行（服务模式），返回docx的得分。
+    """
+    result = subprocess.run(
+        [sys.executable, "paper_markdown_text_classifier.py", "--serve", "--model_path", model_path, "--token_cache", token_cache],
+        input=docx_path + "\n", capture_output=True, text=True, cwd=ROOT_DIR, check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])["results"][0]["score"]
+
+
+def test_hashing_model_uses_token_cache(tmp_path):
+    model = make_model(n_features=2 ** 12)
+    model.fit(["一、选择题（每小题3分，共30分）下列说法正确的是", "会议纪要 本次会议讨论了明年的工作安排"], [1, 0])
+    model_path = str(tmp_path / "hashing.pkl")
+    joblib.dump(model, model_path)
+
+    docx_path = str(tmp_path / "paper.docx")
+    write_docx(docx_path, ["2023年七年级数学期末试卷", "一、选择题（每小题3分，共30分）", "1. 下列说法正确的是"])
+    token_cache = str(tmp_path / "tokens.db")
+
+    score = serve(model_path, token_cache, docx_path)
+    with sqlite3.connect(token_cache) as connection:
+        # 模型中的分词函数使用了 --token_cache 设置的缓存
+        assert connection.execute("SELECT COUNT(*) FROM tokens").fetchone()[0] == 1
+        # 把缓存的分词结果改为空列表，再次运行时如果命中缓存，特征全为0，得分会变化
+        connection.execute("UPDATE tokens SET value = '[]'")
+
+    assert serve(model_path, token_cache, docx_path) != score
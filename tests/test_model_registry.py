@@ -0,0 +1,184 @@
+import os
+import json
+import hashlib
+import threading
+import http.server
+import multiprocessing
+
+import pytest
+
+from model_registry import ModelRegistry, ChecksumError, default_version
+
+
+MODEL = os.urandom(3 * 1024 * 1024 + 123)
+MODEL_SHA256 = hashlib.sha256(MODEL).hexdigest()
+
+
+class ModelHandler(http.server.BaseHTTPRequestHandler):
+    """
+    /model.pkl 返回完整的模型，/truncated.pkl 声明完整的长度，只发送一半就断开连接。
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(MODEL)))
+        self.end_headers()
+        if self.path.startswith("/truncated"):
+            self.wfile.write(MODEL[:len(MODEL) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(MODEL)
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ModelHandler)
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def version_files(registry, model_url, name):
+    version_dir = registry.version_dir(name, default_version(model_url))
+    return sorted(os.listdir(version_dir)) if os.path.isdir(version_dir) else []
+
+
+def test_fetch_and_reuse(server, tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    model_url = url(server, "/model.pkl")
+
+    path = registry.fetch(model_url, sha256=MODEL_SHA256, progress=False)
+    with open(path, "rb") as file:
+        assert file.read() == MODEL
+    # 缓存命中时不联网
+    assert registry.fetch(model_url, sha256=MODEL_SHA256, offline=True) == path
+    assert len(server.requests) == 1
+
+
+def test_checksum_mismatch_rejects_download(server, tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    model_url = url(server, "/model.pkl")
+
+    with pytest.raises(ChecksumError):
+        registry.fetch(model_url, sha256="0" * 64, progress=False)
+    # 没有发布模型，也没有留下 .part 和 meta.json
+    assert version_files(registry, model_url, "model.pkl") == []
+    assert registry.lookup("model.pkl", default_version(model_url)) is None
+
+
+def fetch_in_process(root, model_url, queue):
+    queue.put(ModelRegistry(root).fetch(model_url, sha256=MODEL_SHA256, progress=False))
+
+
+def test_concurrent_fetch_downloads_once(server, tmp_path):
+    model_url = url(server, "/model.pkl")
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    processes = [context.Process(target=fetch_in_process, args=(str(tmp_path), model_url, queue)) for _ in range(6)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert all(process.exitcode == 0 for process in processes)
+    assert len({queue.get() for _ in processes}) == 1
+    assert len(server.requests) == 1
+
+
+def test_interrupted_download_leaves_no_partial_file(server, tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    model_url = url(server, "/truncated.pkl")
+
+    with pytest.raises(Exception):
+        registry.fetch(model_url, progress=False)
+    assert version_files(registry, model_url, "truncated.pkl") == []
+    assert registry.lookup("truncated.pkl", default_version(model_url)) is None
+
+
+def test_modified_cache_is_downloaded_again(server, tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    model_url = url(server, "/model.pkl")
+    path = registry.fetch(model_url, progress=False)
+
+    # 大小不变，修改时间变化，重新计算sha256后发现不一致
+    with open(path, "r+b") as file:
+        file.write(b"X")
+    assert registry.lookup("model.pkl", default_version(model_url)) is None
+    registry.fetch(model_url, progress=False)
+    assert len(server.requests) == 2
+
+
+def test_verify_keeps_intact_file(server, tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    model_url = url(server, "/model.pkl")
+    path = registry.fetch(model_url, progress=False)
+
+    # 重新计算sha256后一致，直接使用缓存，不再下载
+    assert registry.fetch(model_url, progress=False, verify=True) == path
+    assert registry.fetch(model_url, offline=True, verify=True) == path
+    assert len(server.requests) == 1
+
+
+def test_touched_file_is_used_offline(server, tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    model_url = url(server, "/model.pkl")
+    path = registry.fetch(model_url, progress=False)
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert registry.fetch(model_url, offline=True) == path
+
+    # 新的修改时间写回了meta.json
+    meta_path = os.path.join(os.path.dirname(path), "meta.json")
+    with open(meta_path, "r", encoding="utf-8") as file:
+        assert json.load(file)["mtime_ns"] == os.stat(path).st_mtime_ns
+
+
+def test_legacy_meta_without_mtime_is_used_offline(server, tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    model_url = url(server, "/model.pkl")
+    path = registry.fetch(model_url, progress=False)
+
+    meta_path = os.path.join(os.path.dirname(path), "meta.json")
+    with open(meta_path, "r", encoding="utf-8") as file:
+        meta = json.load(file)
+    del meta["mtime_ns"]
+    with open(meta_path, "w", encoding="utf-8") as file:
+        json.dump(meta, file)
+    assert registry.fetch(model_url, offline=True) == path
+
+
+def test_local_file_is_adopted(server, tmp_path):
+    registry = ModelRegistry(str(tmp_path / "models"))
+    model_url = url(server, "/model.pkl")
+    local_file = tmp_path / "TextClassifier.pkl"
+    local_file.write_bytes(MODEL)
+
+    path = registry.fetch(model_url, sha256=MODEL_SHA256, progress=False, local_file=str(local_file))
+    with open(path, "rb") as file:
+        assert file.read() == MODEL
+    assert server.requests == []
+
+
+def test_local_file_with_wrong_checksum_is_downloaded_again(server, tmp_path):
+    registry = ModelRegistry(str(tmp_path / "models"))
+    model_url = url(server, "/model.pkl")
+    local_file = tmp_path / "TextClassifier.pkl"
+    local_file.write_bytes(MODEL[:1000])
+
+    path = registry.fetch(model_url, sha256=MODEL_SHA256, progress=False, local_file=str(local_file))
+    with open(path, "rb") as file:
+        assert file.read() == MODEL
+    assert len(server.requests) == 1
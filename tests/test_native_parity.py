@@ -0,0 +1,40 @@
+import random
+
+import pypandoc
+import pytest
+
+from synthetic_corpus import generate_paper, generate_other, write_docx
+from docx2markdown_native import docx_to_markdown, UnsupportedDocxError
+from benchmark_docx2markdown import parity
+
+
+def pandoc_available():
+    try:
+        pypandoc.get_pandoc_path()
+    except OSError:
+        return False
+    return True
+
+
+def write_samples(directory, count=10, tables=0):
+    rng = random.Random(0)
+    docx_files = []
+    for index in range(count):
+        _, blocks = generate_paper(rng, tables=tables) if index % 2 == 0 else generate_other(rng)
+        docx_file = str(directory / f"{index}.docx")
+        write_docx(blocks, docx_file)
+        docx_files.append(docx_file)
+    return docx_files
+
+
+def test_tables_are_left_to_pandoc(tmp_path):
+    docx_file = write_samples(tmp_path, count=1, tables=1)[0]
+    with pytest.raises(UnsupportedDocxError):
+        docx_to_markdown(docx_file, str(tmp_path / "images"))
+
+
+@pytest.mark.skipif(not pandoc_available(), reason="没有安装pandoc")
+def test_native_output_matches_pandoc(tmp_path):
+    result = parity(write_samples(tmp_path))
+    assert result["compared"] == 10
+    assert result["different"] == [], "\n".join(result["different"][0]["diff"])
@@ -0,0 +1,30 @@
+import csv
+import zipfile
+import argparse
+
+import pipeline
+from synthetic_corpus import LegacyZipInfo
+
+
+def test_unzip_stage_decodes_flagged_and_gbk_names(tmp_path):
+    zip_file = str(tmp_path / "papers.zip")
+    with zipfile.ZipFile(zip_file, "w") as zf:
+        # 非ASCII的str文件名，zipfile按UTF-8写入并设置标志
+        zf.writestr("2023年数学期中试卷.docx", b"utf-8")
+        zf.writestr(LegacyZipInfo("2023年语文期末试卷.docx"), b"gbk")
+    with zipfile.ZipFile(zip_file) as zf:
+        assert [bool(info.flag_bits & 0x800) for info in zf.infolist()] == [True, False]
+
+    args = argparse.Namespace(zip_file=zip_file, docx_dir=str(tmp_path / "docx"), encoding="gbk",
+                              workers=2, index_csv=str(tmp_path / "index_to_filename.csv"))
+    manifest = pipeline.Manifest(str(tmp_path / "manifest.sqlite"))
+    try:
+        pipeline.unzip_stage(manifest, args)
+    finally:
+        manifest.close()
+
+    with open(args.index_csv, "r", encoding="utf-8") as file:
+        rows = list(csv.reader(file))
+    assert rows == [pipeline.INDEX_HEADER, ["2023年数学期中试卷.docx", "0.docx"], ["2023年语文期末试卷.docx", "1.docx"]]
+    assert (tmp_path / "docx" / "0.docx").read_bytes() == b"utf-8"
+    assert (tmp_path / "docx" / "1.docx").read_bytes() == b"gbk"
@@ -0,0 +1,52 @@
+"""
+one_text_pre_process的固定样例：preprocess_golden/名称.md 是输入，名称.expected 是期望的输出。
+期望的输出由最初逐行处理的实现（splitlines + 逐行re.sub）生成，改动预处理之后结果必须保持不变。
+
+可以用pytest运行，也可以在仓库根目录下直接运行：python -m tests.test_preprocess_golden
+"""
+import os
+import sys
+import glob
+
+from paper_markdown_text_classifier import one_text_pre_process
+
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "preprocess_golden")
+
+
+def read_exact(path):
+    # 不转换换行，"\r\n"、"\u2028" 等保持原样
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        return file.read()
+
+
+def golden_cases():
+    for input_path in sorted(glob.glob(os.path.join(GOLDEN_DIR, "*.md"))):
+        name = os.path.splitext(os.path.basename(input_path))[0]
+        yield name, read_exact(input_path), read_exact(os.path.join(GOLDEN_DIR, name + ".expected"))
+
+
+def check_golden():
+    """
+    返回:
+    failures (list): (名称, 期望的输出, 实际的输出)。
+    """
+    failures = []
+    for name, text, expected in golden_cases():
+        actual = one_text_pre_process(text)
+        if actual != expected:
+            failures.append((name, expected, actual))
+    return failures
+
+
+def test_preprocess_golden():
+    assert len(list(golden_cases())) >= 8
+    assert check_golden() == []
+
+
+if __name__ == "__main__":
+    failures = check_golden()
+    for name, expected, actual in failures:
+        print(f"{name}: 期望 {expected!r}，实际 {actual!r}")
+    print(f"{len(list(golden_cases())) - len(failures)} 个样例一致，{len(failures)} 个不一致")
+    sys.exit(1 if failures else 0)
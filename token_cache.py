@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+class TokenCache:
+    """
+    基于SQLite的分词结果缓存，键为预处理后文本的哈希值。
+
+    多个进程可以同时使用同一个缓存文件（WAL模式），每个进程各自打开连接。
+    缓存总大小超过max_bytes时按最近使用时间淘汰（近似LRU）：命中时不立即写数据库，
+    最近使用时间先记在内存中，攒够touch_batch_size条或者淘汰、关闭前再批量写入，
+    多个进程读缓存时不会每次命中都争抢写锁。没有写入的最近使用时间在进程退出时丢失，只影响淘汰的顺序。
+    """
+
+    # 每写入多少条记录检查一次缓存大小
+    evict_interval = 1000
+
+    # 命中多少次批量更新一次最近使用时间
+    touch_batch_size = 1000
+
+    def __init__(self, path, max_bytes=2 * 1024 ** 3):
+        """
+        参数:
+        path (str): 缓存文件路径。
+        max_bytes (int): 缓存的最大字节数，默认为2GB。
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._pid = None
+        self._puts = 0
+
+    def __getstate__(self):
+        # 连接不能跨进程使用，序列化时只保留配置
+        return {"path": self.path, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["max_bytes"])
+
+    def _connection(self):
+        """
+        获取当前进程、当前线程的数据库连接，fork之后重新打开。
+        """
+        if self._pid != os.getpid():
+            self._local = threading.local()
+            self._pid = os.getpid()
+
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # 每个线程各自记录命中的键和时间
+            self._local.touched = {}
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+
+            connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS tokens ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS tokens_last_used ON tokens (last_used)")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def text_key(text):
+        """
+        计算文本的哈希值。
+
+        参数:
+        text (str): 预处理后的文本。
+
+        返回:
+        key (str): 文本的哈希值。
+        """
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=20).hexdigest()
+
+    def get(self, text):
+        """
+        读取文本的分词结果。
+
+        参数:
+        text (str): 预处理后的文本。
+
+        返回:
+        tokens (list or None): 分词结果，不存在时返回None。
+        """
+        key = self.text_key(text)
+        connection = self._connection()
+        row = connection.execute("SELECT value FROM tokens WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        touched = self._local.touched
+        touched[key] = time.time()
+        if len(touched) >= self.touch_batch_size:
+            self.flush_touched()
+        return json.loads(row[0])
+
+    def flush_touched(self):
+        """
+        把当前线程缓冲的最近使用时间在一个事务中写入数据库。
+        """
+        touched = getattr(self._local, "touched", None)
+        if not touched or self._pid != os.getpid():
+            return
+        self._local.touched = {}
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany("UPDATE tokens SET last_used = ? WHERE key = ?", [(last_used, key) for key, last_used in touched.items()])
+            connection.execute("COMMIT")
+        except:
+            connection.execute("ROLLBACK")
+            raise
+
+    def put(self, text, tokens):
+        """
+        保存文本的分词结果。
+
+        参数:
+        text (str): 预处理后的文本。
+        tokens (list): 分词结果。
+        """
+        value = json.dumps(tokens, ensure_ascii=False)
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO tokens (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+            (self.text_key(text), value, len(value.encode("utf-8")), time.time()),
+        )
+
+        self._puts += 1
+        if self._puts % self.evict_interval == 0:
+            self.evict()
+
+    def get_or_tokenize(self, text, tokenizer):
+        """
+        读取文本的分词结果，不存在时调用tokenizer分词并保存。
+
+        参数:
+        text (str): 预处理后的文本。
+        tokenizer (callable): 分词函数。
+
+        返回:
+        tokens (list): 分词结果。
+        """
+        tokens = self.get(text)
+        if tokens is None:
+            tokens = list(tokenizer(text))
+            self.put(text, tokens)
+        return tokens
+
+    def evict(self):
+        """
+        缓存超过max_bytes时，删除最久未使用的记录直到低于max_bytes。
+        """
+        connection = self._connection()
+        self.flush_touched()
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM tokens").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = connection.execute("SELECT key, size FROM tokens ORDER BY last_used")
+            expired = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                expired.append((key,))
+                total -= size
+            connection.executemany("DELETE FROM tokens WHERE key = ?", expired)
+            connection.execute("COMMIT")
+        except:
+            connection.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        """
+        写入缓冲的最近使用时间，关闭当前线程的数据库连接。
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._pid == os.getpid():
+            self.flush_touched()
+            connection.close()
+        self._local = threading.local()
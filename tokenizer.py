@@ -0,0 +1,47 @@
+# 分词函数单独放在这个模块中：模型按 tokenizer.chinese_tokenizer 保存分词函数，
+# 无论分类脚本是作为 __main__ 运行还是被导入，反序列化得到的都是同一个函数，
+# set_token_cache 设置的缓存对所有模型都生效
+from profiling import profiler
+
+
+# 分词缓存，由set_token_cache设置，为None时不使用缓存
+_token_cache = None
+
+
+def set_token_cache(token_cache):
+    """
+    设置chinese_tokenizer使用的分词缓存。
+
+    参数:
+    token_cache (TokenCache or None): 分词缓存，为None时关闭缓存。
+    """
+    global _token_cache
+    _token_cache = token_cache
+
+
+def chinese_tokenizer(text):
+    """
+    对中文文本进行分词。设置了分词缓存时，相同的文本只会分词一次。
+
+    参数:
+    text (str): 需要分词的文本。
+
+    返回:
+    tokens (list): 分词后的词语列表。
+    """
+    import jieba
+
+    # 缓存的读写和jieba分词分开计时，命中缓存的文本不计入jieba
+    if _token_cache is not None:
+        with profiler.timer("token-cache"):
+            tokens = _token_cache.get(text)
+        if tokens is not None:
+            return tokens
+
+    with profiler.timer("jieba"):
+        tokens = list(jieba.cut(text))
+
+    if _token_cache is not None:
+        with profiler.timer("token-cache"):
+            _token_cache.put(text, tokens)
+    return tokens
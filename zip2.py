@@ -1,19 +1,65 @@
 import zipfile
 import os
 import csv
+import shutil
 import threading
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+# 每次从zip中读取的字节数，解压时内存占用不随文件大小增长
+CHUNK_SIZE = 1024 * 1024
+
+class ThreadLocalZipFile:
+    """
+    每个线程各自打开一个ZipFile，多线程解压时不共用同一个文件对象。
+    """
+    def __init__(self, zip_file_path):
+        self.zip_file_path = zip_file_path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.zip_files = []
+
+    def get(self):
+        zf = getattr(self.local, 'zf', None)
+        if zf is None:
+            zf = zipfile.ZipFile(self.zip_file_path, 'r')
+            self.local.zf = zf
+            with self.lock:
+                self.zip_files.append(zf)
+        return zf
+
+    def close(self):
+        with self.lock:
+            for zf in self.zip_files:
+                zf.close()
+            self.zip_files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def decode_member_name(info, encoding):
+    # 设置了UTF-8标志（flag_bits的0x800位）的文件名zipfile已经按UTF-8解码，直接使用；
+    # 没有标志的文件名zipfile按cp437解码，还原成原始字节后再按实际的编码（例如gbk）解码
+    if info.flag_bits & 0x800:
+        return info.filename
+    return info.filename.encode('cp437').decode(encoding)
+
 def extract_file(zf, info, target_path, lock):
+    # 按块复制，不把整个文件读入内存
     with zf.open(info, 'r') as file, open(target_path, 'wb') as target:
-        target.write(file.read())
+        shutil.copyfileobj(file, target, CHUNK_SIZE)
 
     with lock:
         print(f"解压完成: {target_path}")
 
+def extract_member(zip_files, info, target_path, lock):
+    extract_file(zip_files.get(), info, target_path, lock)
+
 def unzip_file_with_original_format(zip_file_path, dest_path, index_csv_path, encoding='cp437', max_workers=5):
-    with zipfile.ZipFile(zip_file_path, 'r') as zf:
+    with zipfile.ZipFile(zip_file_path, 'r') as zf, ThreadLocalZipFile(zip_file_path) as zip_files:
         # 创建 CSV 文件并写入文件名映射
         with open(index_csv_path, 'w', newline='', encoding='utf-8') as csvfile:
             fieldnames = ['original_filename', 'new_filename']
@@ -26,19 +72,19 @@ def unzip_file_with_original_format(zip_file_path, dest_path, index_csv_path, en
                 futures = []
 
                 for index, info in enumerate(zf.infolist()):
-                    decoded_filepath = info.filename.encode('cp437').decode(encoding)
+                    decoded_filepath = decode_member_name(info, encoding)
                     target_filename = f"{index}.docx"
                     target_path = os.path.join(dest_path, target_filename)
 
                     # 如果是目录，跳过创建文件
-                    if target_path.endswith('/'):
+                    if info.is_dir():
                         continue
 
                     # 如果是文件，先创建所在目录
                     os.makedirs(os.path.dirname(target_path), exist_ok=True)
 
                     # 提交解压任务到线程池
-                    future = executor.submit(extract_file, zf, info, target_path, lock)
+                    future = executor.submit(extract_member, zip_files, info, target_path, lock)
                     futures.append(future)
 
                     # 将原始文件名和新文件名写入 CSV 文件
@@ -1,58 +1,77 @@
 import csv
-import re
 import os
+import mmap
+import collections
+import concurrent.futures
+from keyword_matcher import compile_keywords
 
 def check_keywords_in_row(row, keywords):
     file_path = row[0]
-    if any(keyword in file_path for keyword in keywords):
+    if compile_keywords(keywords).contains_any(file_path):
         return True
     return False
 
 def check_keywords_in_file(file_path, keywords):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        file_text = file.read()
-        if any(keyword in file_text for keyword in keywords):
-            return True
+    # 通过mmap在UTF-8字节上直接查找，不把整个文件读入内存，找到第一个关键字就停止
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as file_buffer:
+            if compile_keywords(keywords).contains_any_bytes(file_buffer):
+                return True
     return False
 
-def process_rows_with_keywords(csv_file, keywords, output_csv_with_answers, output_csv_without_answers):
-    rows_with_answers = []
-    rows_without_answers = []
-
-    with open(csv_file, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if row:  # 确保行不为空
-                if check_keywords_in_row(row, keywords):
-                    rows_with_answers.append(row)
-                else:
-                    file_path = os.path.join('../clear_data/', row[1])
-                    if os.path.exists(file_path) and check_keywords_in_file(file_path, keywords):
-                        rows_with_answers.append(row)
-                    else:
-                        rows_without_answers.append(row)
-
-    with open(output_csv_with_answers, 'w', encoding='utf-8', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerows(rows_with_answers)
-
-    with open(output_csv_without_answers, 'w', encoding='utf-8', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerows(rows_without_answers)
+def check_answers_in_row(row, keywords, markdown_folder):
+    if check_keywords_in_row(row, keywords):
+        return True
+    file_path = os.path.join(markdown_folder, row[1].replace(".docx", ".md"))
+    return os.path.exists(file_path) and check_keywords_in_file(file_path, keywords)
+
+def iter_ordered_results(function, items, max_workers, max_pending):
+    # 和executor.map一样按输入顺序返回结果，但同时最多只有max_pending个任务在排队，不会一次读入所有行
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = collections.deque()
+        for item in items:
+            pending.append((item, executor.submit(function, item)))
+            if len(pending) >= max_pending:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+def process_rows_with_keywords(csv_file, keywords, output_csv_with_answers, output_csv_without_answers, markdown_folder='../clear_data/', max_workers=None):
+    max_workers = max_workers or os.cpu_count()
+
+    with open(csv_file, 'r', encoding='utf-8') as file, \
+            open(output_csv_with_answers, 'w', encoding='utf-8', newline='') as file_with_answers, \
+            open(output_csv_without_answers, 'w', encoding='utf-8', newline='') as file_without_answers:
+        writer_with_answers = csv.writer(file_with_answers)
+        writer_without_answers = csv.writer(file_without_answers)
+
+        rows = (row for row in csv.reader(file) if row)  # 确保行不为空
+        check = lambda row: check_answers_in_row(row, keywords, markdown_folder)
+
+        # 每个结果出来就写入，不在内存中保存所有行
+        for row, has_answers in iter_ordered_results(check, rows, max_workers, max_workers * 16):
+            if has_answers:
+                writer_with_answers.writerow(row)
+            else:
+                writer_without_answers.writerow(row)
 
     print(f"Rows with answers saved to '{output_csv_with_answers}' successfully.")
     print(f"Rows without answers saved to '{output_csv_without_answers}' successfully.")
 
-# CSV文件路径
-csv_file = 'rows_with_keywords.csv'
-
 # 关键字列表
 keywords = ['答', '解', '解析', '答案']
 
-# 输出CSV文件路径
-output_csv_with_answers = 'rows_with_answers.csv'
-output_csv_without_answers = 'rows_without_answers.csv'
+if __name__ == "__main__":
+    # CSV文件路径
+    csv_file = 'rows_with_keywords.csv'
 
-# 处理含有关键字的行
-process_rows_with_keywords(csv_file, keywords, output_csv_with_answers, output_csv_without_answers)
+    # 输出CSV文件路径
+    output_csv_with_answers = 'rows_with_answers.csv'
+    output_csv_without_answers = 'rows_without_answers.csv'
 
+    # 处理含有关键字的行
+    process_rows_with_keywords(csv_file, keywords, output_csv_with_answers, output_csv_without_answers)
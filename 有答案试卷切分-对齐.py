@@ -2,46 +2,139 @@ import csv
 import os
 import json
 import re
-import concurrent.futures
+import multiprocessing
 
-def split_file_contents(file_content):
-    # Define the splitting pattern
-    pattern = r'\d+\.|一|二|三|四|五|六|七|八|九|十|百|千|万|亿|\.'
-    
-    # Split the file content based on the pattern
-    elements = re.split(pattern, file_content)
-    
-    return elements
+# Section headings such as "一、选择题" or "**二．填空题**"
+SECTION_PATTERN = re.compile(r'^\s*(?:\*\*)?\s*([一二三四五六七八九十百]+)\s*[、.．]')
+
+# Question starts such as "1." "12．" "3、" and pandoc's escaped "1\.", but not decimals like "1.5"
+QUESTION_PATTERN = re.compile(r'^\s*(?:\*\*)?\s*(\d{1,3})\s*(?:\\\.|[.．、])(?!\d)\s*(.*)$')
+
+# Headings that start the answer part of a paper, e.g. "参考答案" or "**答案与解析：**"
+ANSWER_PART_PATTERN = re.compile(r'^\s*[#\s]*(?:\*\*)?\s*(?:参考答案|答案与解析|答案解析|试题解析|答案|解析)\s*(?:\*\*)?\s*[:：]?\s*(?:\*\*)?\s*$')
+
+# Answers written right after a question, e.g. "【答案】B" or "答案：B"
+INLINE_ANSWER_PATTERN = re.compile(r'【(?:答案|解析|详解|解答)】|(?:答案|解析)\s*[:：]')
+
+# Buffer size of the result file
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+def has_text(lines):
+    return any(line.strip() for line in lines)
+
+def split_questions(lines, source):
+    # Yield one record per question, reading the document line by line.
+    # start_line/end_line give the span of the record in the document (0-based, end exclusive).
+    part = 'question'
+    section = None
+    number = None
+    buffer = []
+    start_line = 0
+
+    def make_record(end_line):
+        return {'source': source, 'part': part, 'section': section, 'number': number, 'text': '\n'.join(buffer).strip(),
+                'start_line': start_line, 'end_line': end_line}
+
+    line_number = -1
+    for line_number, line in enumerate(lines):
+        line = line.rstrip('\r\n')
+
+        if ANSWER_PART_PATTERN.match(line):
+            if has_text(buffer):
+                yield make_record(line_number)
+            part, section, number, buffer, start_line = 'answer', None, None, [], line_number + 1
+            continue
+
+        if SECTION_PATTERN.match(line):
+            if has_text(buffer):
+                yield make_record(line_number)
+            section, number, buffer, start_line = line.strip(), None, [], line_number + 1
+            continue
+
+        match = QUESTION_PATTERN.match(line)
+        if match:
+            if has_text(buffer):
+                yield make_record(line_number)
+            number, buffer, start_line = match.group(1), [match.group(2)], line_number
+            continue
+
+        buffer.append(line)
+
+    if has_text(buffer):
+        yield make_record(line_number + 1)
+
+def align_questions(records):
+    # Pair every numbered question with its answer in one pass over the records of a document.
+    # The n-th question numbered k is paired with the n-th answer numbered k, so numbering that
+    # restarts in every section still lines up. Questions whose own text contains 【答案】/答案：
+    # (papers with inline solutions) are split at that marker when the answer part has no match.
+    questions = []
+    answer_index = {}
+    for record in records:
+        if record['number'] is None:
+            continue
+        if record['part'] == 'answer':
+            answer_index.setdefault(record['number'], []).append(record)
+        else:
+            questions.append(record)
+
+    occurrences = {}
+    for question in questions:
+        number = question['number']
+        occurrence = occurrences.get(number, 0)
+        occurrences[number] = occurrence + 1
+
+        question_text = question['text']
+        question_span = [question['start_line'], question['end_line']]
+        answers = answer_index.get(number, [])
+        if occurrence < len(answers):
+            answer = answers[occurrence]
+            answer_text = answer['text']
+            answer_span = [answer['start_line'], answer['end_line']]
+        else:
+            match = INLINE_ANSWER_PATTERN.search(question_text)
+            if match is None:
+                continue
+            answer_text = question_text[match.start():].strip()
+            question_text = question_text[:match.start()].strip()
+            answer_span = question_span
+
+        yield {'source': question['source'], 'section': question['section'], 'number': number,
+               'question': question_text, 'answer': answer_text,
+               'question_span': question_span, 'answer_span': answer_span}
+
+def to_json_lines(records):
+    return ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
 
 def process_file(file_path):
+    # Runs in a worker process and returns the split and the aligned JSON lines of one document
     if not os.path.exists(file_path):
-        print(f"File not found: {file_path}")
-        return
-    
+        return None
+
     with open(file_path, 'r', encoding='utf-8') as file:
-        file_content = file.read()
-        
-        # Split the file content into elements
-        elements = split_file_contents(file_content)
-        
-        # Save the elements as JSON lines
-        with open("结果.json", 'a', encoding='utf-8') as json_file:
-            for element in elements:
-                json_object = {'element': element}
-                json_line = json.dumps(json_object, ensure_ascii=False)
-                json_file.write(json_line + '\n')
-
-def process_rows_with_keywords(csv_file):
+        records = list(split_questions(file, os.path.basename(file_path)))
+    return to_json_lines(records), to_json_lines(align_questions(records))
+
+def process_rows_with_keywords(csv_file, output_file='结果.json', aligned_output_file='对齐.json', markdown_folder='../clear_data/', workers=None):
     with open(csv_file, 'r', encoding='utf-8') as file:
         reader = csv.reader(file)
-        file_paths = [os.path.join('../clear_data/', row[1].replace(".docx",".md")) for row in reader if row]
-        
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            executor.map(process_file, file_paths)
+        file_paths = [os.path.join(markdown_folder, row[1].replace(".docx",".md")) for row in reader if row]
 
-# CSV file path
-csv_file = 'rows_with_keywords.csv'
+    # Documents are split in worker processes; only this process writes, so lines never interleave
+    with multiprocessing.Pool(workers) as pool, \
+            open(output_file, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as json_file, \
+            open(aligned_output_file, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as aligned_json_file:
+        for file_path, result in zip(file_paths, pool.imap(process_file, file_paths, chunksize=16)):
+            if result is None:
+                print(f"File not found: {file_path}")
+                continue
+            json_lines, aligned_json_lines = result
+            json_file.write(json_lines)
+            aligned_json_file.write(aligned_json_lines)
 
-# Process the rows with keywords
-process_rows_with_keywords(csv_file)
+if __name__ == "__main__":
+    # CSV file path
+    csv_file = 'rows_with_answers.csv'
 
+    # Process the rows with keywords
+    process_rows_with_keywords(csv_file)
@@ -1,62 +1,30 @@
-import csv
-import re
-from collections import Counter
-import jieba
+import argparse
+from filename_analysis import iter_file_names, count_tokens, top_tokens
 
-def count_word_frequency(words_list):
-    # 创建一个空字典用于存储词频统计结果
-    word_frequency = {}
-
-    # 将所有分词结果合并为一个列表
-    all_words = [word for words in words_list for word in words]
-
-    # 统计词频
-    word_counts = Counter(all_words)
-
-    # 更新词频统计结果
-    word_frequency.update(word_counts)
+def count_word_frequency(words_list, top_k=None, min_count=1):
+    # 逐个文件名累加词频；给出top_k时只选出词频最高的top_k个，不对所有词排序，默认仍然对所有词排序
+    word_counts = count_tokens(words_list)
 
     # 按照词频从高到低排序
-    sorted_result = sorted(word_frequency.items(), key=lambda x: x[1], reverse=True)
-
-    return sorted_result
-
-
-def extract_first_element_from_csv(csv_file):
-    file_paths = []
-
-    with open(csv_file, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if row:  # 确保行不为空
-                file_path = re.sub(r'[^\w\s-]', '', row[0])  # 去除特殊字符
-                file_paths.append(file_path.replace("docx_math", "").replace("docx", ""))
-
-    return file_paths
-
-
-# CSV文件路径
-csv_file = 'index_to_filename.csv'
-
-# 提取每行的第一个元素
-file_paths = extract_first_element_from_csv(csv_file)
+    return top_tokens(word_counts, top_k, min_count)
 
-# 添加自定义词典
 
-# 存储所有分词结果的列表
-words_list = []
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="统计文件名的词频分布")
+    parser.add_argument('--csv_file', default='index_to_filename.csv', type=str, help="CSV文件路径")
+    parser.add_argument('--cache', default='filename_tokens.jsonl', type=str, help="文件名分词缓存，和过滤试卷.py共用，CSV没变时不再重新分词")
+    parser.add_argument('--workers', default=1, type=int, help="分词的进程数量")
+    parser.add_argument('--top_k', default=None, type=int, help="只输出词频最高的前k个词，默认输出全部")
+    parser.add_argument('--min_count', default=2, type=int, help="只输出词频不低于这个值的词")
 
-# 对每个元素进行分词处理，并保存到列表中
-for file_path in file_paths:
-    words = jieba.cut(file_path)
-    words_list.append(list(words))
+    args = parser.parse_args()
 
-# 统计词频并按照词频从高到低排序
-result = count_word_frequency(words_list)
+    # 每个文件名只规范化、分词一次
+    records = iter_file_names(args.csv_file, args.cache, args.workers)
 
-# 输出词频统计结果
-for word, count in result:
-    if count <= 1:
-        continue
-    print(f"{word}: {count}")
+    # 统计词频并按照词频从高到低排序
+    result = count_word_frequency((tokens for _, _, tokens in records), args.top_k, args.min_count)
 
+    # 输出词频统计结果
+    for word, count in result:
+        print(f"{word}: {count}")
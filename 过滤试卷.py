@@ -1,45 +1,47 @@
 import csv
-import re
+import argparse
+from keyword_matcher import compile_keywords
+from filename_analysis import iter_file_names
 
-def extract_rows_with_keywords(csv_file, keywords):
+def extract_rows_with_keywords(csv_file, keywords, cache_file=None):
+    # cache_file: 统计是否为试卷.py 写入的文件名分词缓存，存在时直接使用其中规范化后的文件名
     rows_with_keywords = []
     rows_without_keywords = []
+    matcher = compile_keywords(keywords)
 
-    with open(csv_file, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if row:  # 确保行不为空
-                file_path = re.sub(r'[^\w\s-]', '', row[0])  # 去除特殊字符
-                file_path = file_path.replace("docx_math", "").replace("docx", "")
-                if any(keyword in file_path for keyword in keywords):
-                    rows_with_keywords.append(row)
-                else:
-                    rows_without_keywords.append(row)
+    for row, file_path, _ in iter_file_names(csv_file, cache_file, tokenize=False):
+        if matcher.contains_any(file_path):
+            rows_with_keywords.append(row)
+        else:
+            rows_without_keywords.append(row)
 
     return rows_with_keywords, rows_without_keywords
 
-# CSV文件路径
-csv_file = 'index_to_filename.csv'
-
 # 关键字列表
 keywords = ['考试', '试卷', '卷', '试题', '试']
 
-# 提取含有关键字和不含关键字的行
-rows_with_keywords, rows_without_keywords = extract_rows_with_keywords(csv_file, keywords)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按文件名中的关键字过滤试卷")
+    parser.add_argument('--csv_file', default='index_to_filename.csv', type=str, help="CSV文件路径")
+    parser.add_argument('--cache', default='filename_tokens.jsonl', type=str, help="文件名分词缓存，和统计是否为试卷.py共用")
+
+    args = parser.parse_args()
 
-# 保存含有关键字的行到新的CSV文件
-output_csv_with_keywords = 'rows_with_keywords.csv'
-with open(output_csv_with_keywords, 'w', encoding='utf-8', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerows(rows_with_keywords)
+    # 提取含有关键字和不含关键字的行
+    rows_with_keywords, rows_without_keywords = extract_rows_with_keywords(args.csv_file, keywords, args.cache)
 
-print(f"Rows with keywords saved to '{output_csv_with_keywords}' successfully.")
+    # 保存含有关键字的行到新的CSV文件
+    output_csv_with_keywords = 'rows_with_keywords.csv'
+    with open(output_csv_with_keywords, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerows(rows_with_keywords)
 
-# 保存不含关键字的行到新的CSV文件
-output_csv_without_keywords = 'rows_without_keywords.csv'
-with open(output_csv_without_keywords, 'w', encoding='utf-8', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerows(rows_without_keywords)
+    print(f"Rows with keywords saved to '{output_csv_with_keywords}' successfully.")
 
-print(f"Rows without keywords saved to '{output_csv_without_keywords}' successfully.")
+    # 保存不含关键字的行到新的CSV文件
+    output_csv_without_keywords = 'rows_without_keywords.csv'
+    with open(output_csv_without_keywords, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerows(rows_without_keywords)
 
+    print(f"Rows without keywords saved to '{output_csv_without_keywords}' successfully.")